@@ -0,0 +1,351 @@
+# Perceptual Simultaneity Task - benchmark and timing-regression suite of the trial pipeline
+###################################################################################
+# Times the parts of the trial pipeline without a display, with the simulated window,
+# keyboard and clocks of pst.simulation (data and logging are PsychoPy's, so PsychoPy
+# must be installed as for a session):
+#   conditionTableMs     compile the timeline, build the condition table and its trial dictionaries
+#   scheduleMs           build the trial schedule of a session
+#   frameUs              one stimulus frame as runTrial presents it: colour update and draw, flip,
+#                        flip check, frame-series record and response poll (with the trial's share
+#                        of its fixation flip, startTrial and endTrial)
+#   drawUs               colour update and draw of one frame (StimulusEngine.drawFrame)
+#   responseUs           one ResponseCollector.poll without a key press
+#   recordTrialUs        data of one trial: addData to a TrialHandler, ExperimentHandler.nextEntry
+#                        and the journal record
+#   frameSeriesTrialUs   frame series of one trial: startTrial, a log per frame, endTrial and flush
+#   sessionCpuPerFlipUs  CPU time of the practice and experimental blocks of a whole simulated
+#                        session (with its writer threads) per window flip
+#   sessionPeakMB        peak memory allocated by Python during a whole simulated session (tracemalloc)
+# Each micro-benchmark reports the fastest of --repeat runs, per operation, with the
+# garbage collector off (as timeit does).
+#
+# The results are compared with benchmarks/baseline.json: a metric more than `tolerance`
+# (a fraction) above its baseline is a regression, and frameUs, sessionCpuPerFlipUs and
+# sessionPeakMB must also stay under the fixed `limits`. Any failure gives exit status 1.
+# The baseline numbers are machine-specific; --update-baseline stores the numbers of
+# this machine (limits and tolerance are kept), --json writes the results with the
+# environment they were measured in, to track them over releases.
+#
+#   python benchmarks/pipeline.py [--json results.json] [--update-baseline] [--tolerance 0.5]
+###################################################################################
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoDir)
+
+from pst.cli import runParser  # noqa: E402
+from pst.conditions import buildConditionTable, compileTimeline, conditionDicts  # noqa: E402
+from pst.frameseries import FrameSeriesLogger  # noqa: E402
+from pst.journal import TrialJournal  # noqa: E402
+from pst.responses import ResponseCollector  # noqa: E402
+from pst.schedule import buildSchedule  # noqa: E402
+from pst.session import Session  # noqa: E402
+from pst.simulation import Simulation  # noqa: E402
+from pst.stimuli import StimulusEngine  # noqa: E402
+from pst.timing import FlipMonitor  # noqa: E402
+
+baselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+metricNames = ('conditionTableMs', 'scheduleMs', 'frameUs', 'drawUs', 'responseUs', 'recordTrialUs',
+               'frameSeriesTrialUs', 'sessionCpuPerFlipUs', 'sessionPeakMB')
+
+
+# ------------------------------------------
+# fastest of `repeat` runs of function (which returns the number of operations it did), in s per operation
+def bestOf(function, repeat, reset=None):
+    best = float('inf')
+    gcWasEnabled = gc.isenabled()
+    try:
+        for r in range(repeat):
+            if reset is not None:
+                reset()
+            gc.disable()
+            start = time.perf_counter()
+            n = function()
+            best = min(best, (time.perf_counter() - start) / n)
+            if gcWasEnabled:
+                gc.enable()
+    finally:
+        if gcWasEnabled:
+            gc.enable()
+    return best
+
+
+def conditions(refreshRate):
+    timeline = compileTimeline(refreshRate)
+    table = buildConditionTable(soas=timeline['soaFrames'], ramp=timeline['ramp'])
+    return table, conditionDicts(table)
+
+
+# the objects runTrial works with, on a simulated display
+def pipeline(workDir, refreshRate):
+    sim = Simulation(refreshRate=refreshRate, seed=1)
+    win = sim.visual.Window()
+    table, trials = conditions(refreshRate)
+    return types.SimpleNamespace(sim=sim, win=win, table=table, trials=trials,
+                                 engine=StimulusEngine(win, trials, sim.visual),
+                                 flipMonitor=FlipMonitor(refreshRate),
+                                 frameSeries=FrameSeriesLogger(os.path.join(workDir, 'bench_frames.bin')),
+                                 responses=ResponseCollector(win, keyList=['c', 'm'], keyboard=sim.keyboard))
+
+
+# the stimulus part of runTrial (fixation flip, bar frames); returns the number of stimulus frames and the timing
+def presentTrial(p, trial, block, number):
+    lumSeqL, lumSeqR = trial['lumSeqL'], trial['lumSeqR']
+    p.engine.prepare(trial)
+    p.engine.drawFixation()
+    t = p.win.flip()
+    p.flipMonitor.startTrial(t)
+    p.frameSeries.startTrial(block, number, trial['SOA'], trial['L_R'], len(lumSeqL))
+    p.responses.start()
+    nFrame = 0
+    for colorL, colorR in p.engine.frames(trial):
+        p.engine.drawFrame(colorL, colorR)
+        t = p.win.flip()
+        p.flipMonitor.record(t)
+        nFrame = nFrame + 1
+        p.frameSeries.log(nFrame, t, lumSeqL[nFrame - 1], lumSeqR[nFrame - 1])
+        p.responses.poll()
+    timing = p.flipMonitor.endTrial('block %d trial %d' % (block, number))
+    p.frameSeries.endTrial()
+    return nFrame, timing
+
+
+# ------------------------------------------
+def benchConditionTable(refreshRate, repeat):
+    def build():
+        conditions(refreshRate)
+        return 1
+    return bestOf(build, repeat) * 1e3
+
+
+def benchSchedule(refreshRate, repeat):
+    table, trials = conditions(refreshRate)
+
+    def build():
+        buildSchedule(table, 1)
+        return 1
+    return bestOf(build, repeat) * 1e3
+
+
+def benchFrames(p, repeat):
+    def present():
+        nFrames = 0
+        for number, trial in enumerate(p.trials, 1):
+            nFrames = nFrames + presentTrial(p, trial, 1, number)[0]
+        return nFrames
+    return bestOf(present, repeat, reset=p.frameSeries.size) * 1e6
+
+
+def benchDraw(p, repeat):
+    frames = [frame for trial in p.trials for frame in p.engine.frames(trial)]
+
+    def draw():
+        for colorL, colorR in frames:
+            p.engine.drawFrame(colorL, colorR)
+        return len(frames)
+    return bestOf(draw, repeat, reset=p.win.flip) * 1e6  # the flip empties the simulated draw list
+
+
+def benchResponse(p, repeat, nPolls=1000):
+    p.responses.start()
+
+    def poll():
+        for n in range(nPolls):
+            p.responses.poll()
+        return nPolls
+    return bestOf(poll, repeat) * 1e6
+
+
+def benchRecordTrial(p, workDir, repeat):
+    from psychopy import data
+    thisExp = data.ExperimentHandler(name='benchmark', savePickle=False, saveWideText=False,
+                                     dataFileName=os.path.join(workDir, 'bench'))
+    journal = TrialJournal(os.path.join(workDir, 'bench_journal.jsonl'))
+    timing = presentTrial(p, p.trials[0], 1, 1)[1]
+    blockTrials = p.trials * 2
+
+    def record():
+        trials = data.TrialHandler(trialList=blockTrials, nReps=1, method='sequential')
+        thisExp.addLoop(trials)
+        for counter, trial in enumerate(trials, 1):
+            trials.addData('Trial Number', counter)
+            trials.addData('subjResp', 'c')
+            trials.addData('respRT', 0.5)
+            trials.addData('respDuringStimulus', 0)
+            trials.addData('Trial Start', 0)
+            trials.addData('Trial End', 1.0)
+            trials.addData('Trial Duration', 1.0)
+            for name, value in timing.items():
+                trials.addData(name, value)
+            trials.addData('Requeued', 0)
+            thisExp.nextEntry()
+            journal.write({'record': 'entry', 'phase': 'exp', 'block': 1, 'entry': thisExp.entries[-1]})
+        return len(blockTrials)
+    try:
+        return bestOf(record, repeat) * 1e6
+    finally:
+        journal.close()
+        thisExp.abort()  # nothing to save
+
+
+def benchFrameSeries(p, repeat):
+    def log():
+        for number, trial in enumerate(p.trials, 1):
+            lumSeqL, lumSeqR = trial['lumSeqL'], trial['lumSeqR']
+            p.frameSeries.startTrial(1, number, trial['SOA'], trial['L_R'], len(lumSeqL))
+            for nFrame in range(1, len(lumSeqL) + 1):
+                p.frameSeries.log(nFrame, nFrame / 120.0, lumSeqL[nFrame - 1], lumSeqR[nFrame - 1])
+            p.frameSeries.endTrial()
+            p.frameSeries.flush()
+        return len(p.trials)
+    return bestOf(log, repeat, reset=p.frameSeries.size) * 1e6
+
+
+# ------------------------------------------
+# a whole simulated session (--simulate --seed 1); returns the CPU time per flip of its blocks (us)
+# and, with trace, the peak of the memory allocated by Python (MB)
+def runSession(workDir, trace=False):
+    options = runParser().parse_args(['--simulate', '--seed', '1', '--data-dir', workDir, '--echo', 'none'])
+    if trace:
+        tracemalloc.start()
+    try:
+        session = Session(options)
+        session.setup()
+        session.runInstructionsBlock()
+        win = session.experiment_window
+        nFlips = win.nFlips
+        cpu = time.process_time()
+        session.runPractice()
+        session.runBlocks()
+        cpu = time.process_time() - cpu
+        nFlips = win.nFlips - nFlips
+        session.finish()
+        session.thisExp.close()  # the data file, written at exit in a session
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return cpu / nFlips * 1e6, peak
+
+
+def measure(refreshRate=120.0, repeat=20):
+    metrics = {}
+    with tempfile.TemporaryDirectory(prefix='pst-bench-') as workDir:
+        metrics['conditionTableMs'] = benchConditionTable(refreshRate, repeat)
+        metrics['scheduleMs'] = benchSchedule(refreshRate, max(repeat // 4, 1))
+        p = pipeline(workDir, refreshRate)
+        try:
+            presentTrial(p, p.trials[0], 0, 1)  # first use of the stimuli and the writer thread
+            metrics['frameUs'] = benchFrames(p, repeat)
+            metrics['drawUs'] = benchDraw(p, repeat)
+            metrics['frameSeriesTrialUs'] = benchFrameSeries(p, repeat)
+            metrics['recordTrialUs'] = benchRecordTrial(p, workDir, repeat)
+        finally:
+            p.frameSeries.close()
+        metrics['responseUs'] = benchResponse(pipeline(workDir, refreshRate), repeat)  # no stimulus shown yet
+        metrics['sessionCpuPerFlipUs'] = runSession(os.path.join(workDir, 'session'))[0]
+        metrics['sessionPeakMB'] = runSession(os.path.join(workDir, 'sessionTraced'), trace=True)[1]
+    return {name: metrics[name] for name in metricNames}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repoDir, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        from psychopy import __version__ as psychopyVersion
+    except ImportError:
+        psychopyVersion = None
+    return {'commit': commit, 'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'psychopy': psychopyVersion,
+            'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': os.cpu_count()}
+
+
+# ------------------------------------------
+# failures of metrics against a baseline: [(name, value, allowed, reason)]
+def check(metrics, baseline, tolerance=None):
+    tolerance = baseline.get('tolerance', 1.0) if tolerance is None else tolerance
+    failures = []
+    for name, reference in baseline.get('metrics', {}).items():
+        if name in metrics and metrics[name] > reference * (1 + tolerance):
+            failures.append((name, metrics[name], reference * (1 + tolerance),
+                             '+%.0f%% over the baseline' % ((metrics[name] / reference - 1) * 100)))
+    for name, limit in baseline.get('limits', {}).items():
+        if name in metrics and metrics[name] > limit:
+            failures.append((name, metrics[name], limit, 'over the limit'))
+    return failures
+
+
+def loadBaseline(fileName=baselineFile):
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pipeline', description='benchmark and timing-regression suite '
+                                                                  'of the trial pipeline')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of each micro-benchmark (the fastest counts)')
+    parser.add_argument('--refresh-rate', type=float, default=120.0)
+    parser.add_argument('--baseline', default=baselineFile)
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='allowed increase over the baseline as a fraction (default: from the baseline file)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store the numbers of this run as the baseline (keeps its limits and tolerance)')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    metrics = measure(args.refresh_rate, args.repeat)
+    baseline = loadBaseline(args.baseline)
+    results = {'metrics': metrics, 'environment': environment(), 'settings': vars(args).copy()}
+
+    print('%-20s %12s %12s %12s' % ('metric', 'value', 'baseline', 'limit'))
+    for name in metricNames:
+        reference = baseline['metrics'].get(name) if baseline is not None else None
+        limit = baseline.get('limits', {}).get(name) if baseline is not None else None
+        print('%-20s %12.3f %12s %12s' % (name, metrics[name], '-' if reference is None else '%.3f' % reference,
+                                          '-' if limit is None else '%g' % limit))
+
+    failures = []
+    if args.update_baseline:
+        baseline = dict(baseline or {'tolerance': 1.0, 'limits': {}},
+                        metrics={name: round(value, 3) for name, value in metrics.items()},
+                        environment=results['environment'])
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1)
+            f.write('\n')
+        print('baseline written to %s' % args.baseline)
+    elif baseline is not None:
+        failures = check(metrics, baseline, args.tolerance)
+        for name, value, allowed, reason in failures:
+            print('FAIL %s: %.3f > %.3f (%s)' % (name, value, allowed, reason))
+        if not failures:
+            print('all metrics within the baseline and limits')
+    results['failures'] = [{'metric': name, 'value': value, 'allowed': allowed, 'reason': reason}
+                           for name, value, allowed, reason in failures]
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
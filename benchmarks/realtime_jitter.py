@@ -0,0 +1,158 @@
+# Perceptual Simultaneity Task - flip jitter benchmark of the real-time mode
+###################################################################################
+# Runs trials (fixation through pst.intertrial, then the bar frames) headless against
+# a window that paces its flips with the wall clock: it sleeps until shortly before the
+# next vsync of the nominal refresh rate and spins for the rest, and a frame whose work
+# runs past a vsync waits for the following one, like a missed vsync. The stimulus
+# flip intervals are compared without and with pst.realtime.RealtimeMode.
+#
+# The load is made to look like a session: every stimulus frame allocates reference
+# cycles (drawing and logging create short-lived objects), and every trial keeps a few
+# thousand objects alive (data entries, events), so the automatic collections of the
+# older generations get slower as the session goes on. --load N adds N busy processes
+# competing for the CPUs (to see the effect of the priority and of --cpus).
+#
+#   python benchmarks/realtime_jitter.py [--trials 150] [--load 2] [--cpus 0] [--json results.json]
+###################################################################################
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import types
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pst.intertrial import InterTrialScheduler  # noqa: E402
+from pst.realtime import RealtimeMode  # noqa: E402
+
+
+class PacedWindow:
+
+    def __init__(self, refreshRate):
+        self.period = 1.0 / refreshRate
+        self.start = time.perf_counter()
+
+    def flip(self):
+        now = time.perf_counter()
+        vsync = self.start + (int((now - self.start) / self.period) + 1) * self.period
+        if vsync - now > 0.002:
+            time.sleep(vsync - now - 0.002)
+        while time.perf_counter() < vsync:
+            pass
+        return time.perf_counter()
+
+
+class Node:
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+
+# short-lived reference cycles, as the drawing and logging of one frame leave behind
+def frameGarbage(nObjects):
+    root = Node()
+    for i in range(nObjects):
+        Node(root)
+
+
+# objects that stay alive for the rest of the session
+def trialRecords(nObjects):
+    return [{'n': i, 'values': [i, float(i)], 'name': 'x%d' % i} for i in range(nObjects)]
+
+
+def busy():
+    while True:
+        pass
+
+
+def coreStub():
+    try:
+        from psychopy import core
+        return core
+    except ImportError:
+        return types.SimpleNamespace(rush=lambda value=True, realtime=False: False)
+
+
+# ------------------------------------------
+# stimulus flip intervals (s) of nTrials trials of nFrames frames
+def runTrials(nTrials, refreshRate, nFrames, itiMs, garbagePerFrame, keptPerTrial):
+    win = PacedWindow(refreshRate)
+    iti = InterTrialScheduler(win, refreshRate, durationMs=itiMs)
+    kept = []
+    intervals = []
+    for trial in range(nTrials):
+        t, itiFrames = iti.run(lambda: None)
+        for frame in range(nFrames):
+            frameGarbage(garbagePerFrame)
+            flipT = win.flip()
+            intervals.append(flipT - t)
+            t = flipT
+        kept.append(trialRecords(keptPerTrial))
+        iti.defer(kept[-1].reverse)  # some deferred work, as in a session
+    iti.close()
+    return np.array(intervals)
+
+
+def summary(intervals, refreshRate):
+    period = 1.0 / refreshRate
+    return {'nFlips': len(intervals),
+            'meanMs': float(intervals.mean() * 1000),
+            'sdMs': float(intervals.std() * 1000),
+            'p99Ms': float(np.percentile(intervals, 99) * 1000),
+            'maxMs': float(intervals.max() * 1000),
+            'dropped': int((intervals >= 1.5 * period).sum())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='realtime_jitter', description='flip jitter with and without the real-time mode')
+    parser.add_argument('--trials', type=int, default=150)
+    parser.add_argument('--refresh-rate', type=float, default=120.0)
+    parser.add_argument('--frames', type=int, default=17, help='stimulus frames per trial')
+    parser.add_argument('--iti', type=float, default=100.0, help='fixation (ms)')
+    parser.add_argument('--garbage', type=int, default=300, help='objects in reference cycles per frame')
+    parser.add_argument('--kept', type=int, default=3000, help='objects kept alive per trial')
+    parser.add_argument('--load', type=int, default=0, help='busy processes running alongside')
+    parser.add_argument('--cpus', type=lambda text: [int(value) for value in text.split(',')], default=None)
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    load = [multiprocessing.Process(target=busy, daemon=True) for i in range(args.load)]
+    for process in load:
+        process.start()
+    results = {'settings': vars(args).copy()}
+    try:
+        for mode in ('default', 'realtime'):
+            realtime = RealtimeMode(coreStub(), cpus=args.cpus) if mode == 'realtime' else None
+            if realtime is not None:
+                results['applied'] = realtime.apply()
+            try:
+                intervals = runTrials(args.trials, args.refresh_rate, args.frames, args.iti, args.garbage, args.kept)
+            finally:
+                if realtime is not None:
+                    realtime.restore()
+            results[mode] = summary(intervals, args.refresh_rate)
+    finally:
+        for process in load:
+            process.terminate()
+
+    print('%-9s %7s %8s %8s %8s %8s %8s' % ('mode', 'flips', 'mean ms', 'SD ms', 'p99 ms', 'max ms', 'dropped'))
+    for mode in ('default', 'realtime'):
+        row = results[mode]
+        print('%-9s %7d %8.3f %8.3f %8.3f %8.3f %8d' % (mode, row['nFlips'], row['meanMs'], row['sdMs'],
+                                                        row['p99Ms'], row['maxMs'], row['dropped']))
+    print('applied: %s' % results['applied'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Perceptual Simultaneity Task - the task (pst.session), its command line (pst.cli) and analysis tools
@@ -0,0 +1,3 @@
+from pst.cli import main
+
+main()
@@ -0,0 +1,121 @@
+# Perceptual Simultaneity Task - adaptive SOA selection
+###################################################################################
+# Psi method (Kontsevich & Tyler, 1999) for the simultaneity window. The posterior
+# over the window's bias (PSS, in frames) and width is kept on a grid. Before every
+# trial the signed SOA (SOA x L_R) with the lowest expected posterior entropy is
+# chosen; after the response the posterior is multiplied by the likelihood of that
+# response. Both steps are a few NumPy operations on small arrays (well under a
+# millisecond), so they fit in the inter-trial fixation interval.
+###################################################################################
+
+import random
+
+import numpy as np
+
+from pst.models import windowProbability
+
+
+def _entropy(p, axis):
+    return -(p * np.log(np.where(p > 0, p, 1))).sum(axis=axis)
+
+
+class PsiModel:
+
+    def __init__(self, stimuli, biasGrid=None, widthGrid=None, lapse=0.02):
+        if biasGrid is None:
+            biasGrid = np.linspace(-6, 6, 49)
+        if widthGrid is None:
+            widthGrid = np.geomspace(0.5, 12, 40)
+        self.stimuli = np.asarray(stimuli, dtype=float)  # signed SOAs in frames (negative = L first)
+        self.biasGrid = np.asarray(biasGrid, dtype=float)
+        self.widthGrid = np.asarray(widthGrid, dtype=float)
+        self.lapse = lapse
+        bias, width = np.meshgrid(self.biasGrid, self.widthGrid, indexing='ij')
+        # P("c") for every stimulus and grid point, shape (nStimuli, nBias, nWidth)
+        self.pC = windowProbability(self.stimuli[:, np.newaxis, np.newaxis], width, bias, lapse)
+        self.posterior = np.full(bias.shape, 1.0 / bias.size)
+        self.nUpdates = 0
+
+    # index into stimuli of the most informative next signed SOA
+    def nextStimulus(self):
+        joint = self.pC * self.posterior
+        pC = joint.sum(axis=(1, 2))
+        postC = joint / pC[:, np.newaxis, np.newaxis]
+        postM = (self.posterior - joint) / (1 - pC)[:, np.newaxis, np.newaxis]
+        expectedEntropy = pC * _entropy(postC, (1, 2)) + (1 - pC) * _entropy(postM, (1, 2))
+        return int(np.argmin(expectedEntropy))
+
+    def update(self, signedSOA, simultaneous):
+        index = int(np.argmin(np.abs(self.stimuli - signedSOA)))
+        likelihood = self.pC[index] if simultaneous else 1 - self.pC[index]
+        self.posterior = self.posterior * likelihood
+        self.posterior = self.posterior / self.posterior.sum()
+        self.nUpdates = self.nUpdates + 1
+
+    # posterior means and SDs of bias and width
+    def estimate(self):
+        pBias = self.posterior.sum(axis=1)
+        pWidth = self.posterior.sum(axis=0)
+        bias = (pBias * self.biasGrid).sum()
+        width = (pWidth * self.widthGrid).sum()
+        biasSD = np.sqrt((pBias * (self.biasGrid - bias) ** 2).sum())
+        widthSD = np.sqrt((pWidth * (self.widthGrid - width) ** 2).sum())
+        return {'psiBias': float(bias), 'psiBiasSD': float(biasSD),
+                'psiWidth': float(width), 'psiWidthSD': float(widthSD)}
+
+
+# ------------------------------------------
+# Loop handler for thisExp.addLoop: iterating it yields the condition dictionary of the
+# signed SOA chosen by the Psi model (one of the two simultaneous conditions, at random,
+# for SOA 0). The posterior itself is updated by the caller through psi.update(), so a
+# PsiModel can be shared by the handlers of all blocks.
+class PsiHandler:
+
+    def __init__(self, psi, conditions, nTrials, name='adaptiveTrials', seed=None):
+        self.psi = psi
+        self.conditions = conditions
+        self.nTrials = nTrials
+        self.name = name
+        self.rng = random.Random(seed)
+        self.conditionsByStimulus = [[n for n, condition in enumerate(conditions)
+                                      if condition['L_R'] * condition['SOA'] == stimulus]
+                                     for stimulus in psi.stimuli]
+        self.thisRepN = 0
+        self.thisTrialN = -1
+        self.thisN = -1
+        self.thisIndex = None
+        self.thisTrial = None
+        self.finished = False
+        self._exp = None
+
+    def setExp(self, exp):
+        self._exp = exp
+
+    def getExp(self):
+        return self._exp
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.thisN + 1 >= self.nTrials:
+            self.finished = True
+            self.thisTrial = None
+            if self._exp is not None:
+                self._exp.loopEnded(self)
+            raise StopIteration
+        self.thisN = self.thisN + 1
+        self.thisTrialN = self.thisN
+        self.thisIndex = self.rng.choice(self.conditionsByStimulus[self.psi.nextStimulus()])
+        self.thisTrial = dict(self.conditions[self.thisIndex])
+        return self.thisTrial
+
+    next = __next__
+
+    def addData(self, thisType, value):
+        if self._exp is not None:
+            self._exp.addData(thisType, value)
+
+
+def signedSOAs(conditions):
+    return sorted(set(condition['L_R'] * condition['SOA'] for condition in conditions))
@@ -0,0 +1,116 @@
+# Perceptual Simultaneity Task - online aggregates and stopping rules
+###################################################################################
+# Per block (0 = practice) and per condition (signed SOA = SOA x L_R, so SOA 0 is one
+# condition) the session keeps trial counts, hits (correct responses), "c" responses
+# and the running mean and variance of the RT (Welford), each updated in O(1) per
+# trial. The easiest SOAs (the nEasiest largest) serve as catch trials: their error
+# rate is the lapse rate.
+#
+# Stopping rules, checked at the end of each block:
+#   catchAccuracy  stop when the catch-trial accuracy was below this for the last
+#                  catchBlocks blocks (the participant is not doing the task)
+#   settledWidth   stop when the 95% bootstrap CI of the window width (frames) is
+#                  narrower than this (the estimate has settled), after minBlocks blocks
+###################################################################################
+
+import math
+
+import numpy as np
+
+
+class TrialAggregates:
+
+    def __init__(self, conditions, nBlocks, nEasiest=3):
+        self.signedSOAs = sorted(set(condition['L_R'] * condition['SOA'] for condition in conditions))
+        self.index = {signedSOA: n for n, signedSOA in enumerate(self.signedSOAs)}
+        shape = (nBlocks + 1, len(self.signedSOAs))
+        self.n = np.zeros(shape, dtype=np.int64)
+        self.hits = np.zeros(shape, dtype=np.int64)
+        self.simultaneous = np.zeros(shape, dtype=np.int64)
+        self.rtN = np.zeros(shape, dtype=np.int64)
+        self.rtMean = np.zeros(shape)
+        self.rtM2 = np.zeros(shape)
+        easiest = sorted(set(condition['SOA'] for condition in conditions))[-nEasiest:]
+        self.catch = np.array([abs(signedSOA) in easiest and signedSOA != 0 for signedSOA in self.signedSOAs])
+
+    def update(self, block, SOA, L_R, correct, simultaneous, rt):
+        key = (block, self.index[L_R * SOA])
+        self.n[key] += 1
+        self.hits[key] += bool(correct)
+        self.simultaneous[key] += bool(simultaneous)
+        if rt is not None and not math.isnan(rt):
+            # Welford: running mean and sum of squared deviations
+            self.rtN[key] += 1
+            delta = rt - self.rtMean[key]
+            self.rtMean[key] += delta / self.rtN[key]
+            self.rtM2[key] += delta * (rt - self.rtMean[key])
+
+    # ------------------------------------------
+    # pooled statistics over the conditions of selected blocks (Chan et al.'s combination of Welford states)
+    def _pooled(self, blocks, columns=slice(None)):
+        n = self.n[blocks][..., columns].sum()
+        rtN, rtMean, rtM2 = self.rtN[blocks][..., columns], self.rtMean[blocks][..., columns], self.rtM2[blocks][..., columns]
+        totalRT = rtN.sum()
+        mean = (rtN * rtMean).sum() / totalRT if totalRT else math.nan
+        m2 = (rtM2 + rtN * (rtMean - mean) ** 2).sum() if totalRT else math.nan
+        return {'n': int(n), 'hits': int(self.hits[blocks][..., columns].sum()),
+                'simultaneous': int(self.simultaneous[blocks][..., columns].sum()),
+                'rtMean': mean, 'rtSD': math.sqrt(m2 / (totalRT - 1)) if totalRT > 1 else math.nan}
+
+    def catchAccuracy(self, block):
+        pooled = self._pooled(block, self.catch)
+        return pooled['hits'] / pooled['n'] if pooled['n'] else math.nan
+
+    # ------------------------------------------
+    # columns for blocks.addData at the end of a block: block totals and, as dictionaries keyed
+    # by signed SOA as a string (negative = L first; strings survive the journal), the per-condition values
+    def blockData(self, block):
+        pooled = self._pooled(block)
+        n = pooled['n']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hitRate = self.hits[block] / self.n[block]
+            rtSD = np.sqrt(self.rtM2[block] / (self.rtN[block] - 1))
+        rtSD[self.rtN[block] < 2] = np.nan
+        rtMean = np.where(self.rtN[block] > 0, self.rtMean[block], np.nan)
+
+        def bySOA(values, digits=None):
+            return {str(signedSOA): round(value.item(), digits) for signedSOA, value in zip(self.signedSOAs, values)
+                    if self.n[block][self.index[signedSOA]]}
+
+        return {'Hit Rate': pooled['hits'] / n if n else math.nan,
+                'C Rate': pooled['simultaneous'] / n if n else math.nan,
+                'RT Mean': pooled['rtMean'],
+                'RT SD': pooled['rtSD'],
+                'Lapse Rate': 1 - self.catchAccuracy(block),
+                'N by SOA': bySOA(self.n[block]),
+                'Hit Rate by SOA': bySOA(hitRate, 3),
+                'RT Mean by SOA': bySOA(rtMean, 4),
+                'RT SD by SOA': bySOA(rtSD, 4)}
+
+
+class StoppingRules:
+
+    def __init__(self, catchAccuracy=None, catchBlocks=2, settledWidth=None, minBlocks=2):
+        self.catchAccuracy = catchAccuracy
+        self.catchBlocks = catchBlocks
+        self.settledWidth = settledWidth
+        self.minBlocks = minBlocks
+
+    @property
+    def needsFit(self):
+        return self.settledWidth is not None
+
+    # reason to stop after the given block (1-based), or None; windowFit is the fitWindow result
+    # of all experimental trials so far (only needed for settledWidth)
+    def check(self, aggregates, block, windowFit=None):
+        if self.catchAccuracy is not None and block >= self.catchBlocks:
+            accuracies = [aggregates.catchAccuracy(n) for n in range(block - self.catchBlocks + 1, block + 1)]
+            if all(accuracy < self.catchAccuracy for accuracy in accuracies):
+                return 'catch-trial accuracy %s below %g in the last %d blocks' % (
+                    ', '.join('%.2f' % accuracy for accuracy in accuracies), self.catchAccuracy, self.catchBlocks)
+        if self.settledWidth is not None and block >= self.minBlocks and windowFit is not None:
+            low, high = windowFit['ci']['width']
+            if high - low < self.settledWidth:
+                return 'window width settled at %.2f frames (95%% CI %.2f-%.2f)' % (
+                    windowFit['estimates']['width'], low, high)
+        return None
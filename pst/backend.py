@@ -0,0 +1,29 @@
+# Perceptual Simultaneity Task - backend selection
+###################################################################################
+# PsychoPy is only imported here, when a session is about to run, so that analysis and
+# validation commands start without paying for it. With options.simulate the display,
+# clocks, dialog and keyboard come from pst.simulation; data and logging are always
+# PsychoPy's.
+###################################################################################
+
+import types
+
+
+def loadBackend(options):
+    simulation = None
+    if options.simulate:
+        from pst.simulation import Simulation, ObserverResponder, ScriptedResponder
+        if options.responder == 'scripted':
+            responder = ScriptedResponder(options.keys)
+        else:
+            responder = ObserverResponder(seed=options.seed)
+        simulation = Simulation(refreshRate=options.refresh_rate, responder=responder,
+                                dropRate=options.drop_rate, seed=options.seed)
+        visual, core, event, gui = simulation.visual, simulation.core, simulation.event, simulation.gui
+        keyboard = simulation.keyboard
+    else:
+        from psychopy import visual, core, event, gui
+        from psychopy.hardware import keyboard
+    from psychopy import data, logging
+    return types.SimpleNamespace(visual=visual, core=core, event=event, gui=gui, keyboard=keyboard,
+                                 data=data, logging=logging, simulation=simulation)
@@ -0,0 +1,184 @@
+# Perceptual Simultaneity Task - command line
+###################################################################################
+#   pst run [--simulate] [--adaptive] ...   run a session (PsychoPy is imported here only)
+#   pst analyze data/<datafile>.csv         fit the simultaneity window (pst.fitting)
+#   pst ingest data store                   build the trials / frames / sessions tables (pst.ingest)
+#   pst groups store                        compare TD and ASD with permutation and bootstrap tests (pst.groups)
+#   pst video check <video> ...             measure the SOAs on a recording of the screen (pst.videotiming)
+#   pst frames show|convert ...             read frame series, convert csv frame series (pst.frameseries)
+#   pst coordinator --store store ...       hand out IDs and seeds, collect the journals of all stations (pst.coordinator)
+#   pst design --reps 1,2 --blocks 3,5 ...  simulate how well designs recover the window (pst.designsim)
+#   pst validate [--session-seed N]         check the conditions (and the schedule of a seed)
+#
+# Every command imports its modules inside its handler, so `pst analyze` and
+# `pst validate` start without importing PsychoPy. `python -m pst` works the same way.
+###################################################################################
+
+import argparse
+import sys
+
+
+def _msList(text):
+    return [float(value) for value in text.split(',')]
+
+
+def _intList(text):
+    return [int(value) for value in text.split(',')]
+
+
+# ------------------------------------------
+# Options of `pst run` (all optional; a normal session needs none of them)
+def runParser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(prog='pst run', description='Perceptual Simultaneity Task')
+    parser.add_argument('--data-dir', default='data',
+                        help='directory for the data, log and frameseries files (default: ./data)')
+    parser.add_argument('--resume', metavar='SESSION',
+                        help='continue an interrupted session (its name or journal file in the data directory) '
+                             'after its last completed block')
+    parser.add_argument('--session-seed', type=int, default=None,
+                        help='seed of the trial order (default: random; recorded in ExpInfo as randomSeed)')
+    parser.add_argument('--soas', type=_msList, default=None, metavar='MS,MS,...',
+                        help='SOA conditions in ms (default: 0-100 ms in 8.333 ms steps, 0-12 frames at 120 Hz)')
+    parser.add_argument('--soa-tolerance', type=float, default=1.0,
+                        help='largest difference (ms) between an SOA and the whole frames that show it')
+    parser.add_argument('--skip-unshowable', action='store_true',
+                        help='leave out SOAs the display cannot show instead of stopping')
+    parser.add_argument('--iti', type=float, default=500.0, metavar='MS',
+                        help='fixation before every stimulus (ms, shown as whole frames)')
+    parser.add_argument('--iti-jitter', type=float, default=0.0, metavar='MS',
+                        help='uniform jitter of the fixation (+- ms, whole frames, from the session seed)')
+    parser.add_argument('--stop-catch-accuracy', type=float, default=None, metavar='X',
+                        help='end the session when the accuracy on the 3 largest SOAs is below X (0-1) '
+                             'in --stop-catch-blocks blocks in a row')
+    parser.add_argument('--stop-catch-blocks', type=int, default=2, metavar='N')
+    parser.add_argument('--stop-settled-width', type=float, default=None, metavar='FRAMES',
+                        help='end the session once the 95%% CI of the window width is narrower than FRAMES '
+                             '(from block 2 on)')
+    parser.add_argument('--realtime', action='store_true',
+                        help='no automatic garbage collection during the trials (collected in the fixation instead), '
+                             'raised process priority (core.rush); recorded in ExpInfo as realtime')
+    parser.add_argument('--cpus', type=_intList, default=None, metavar='N,N,...',
+                        help='with --realtime, pin the process to these CPUs (Linux only)')
+    parser.add_argument('--verbosity', choices=['block', 'trial', 'frame'], default='trial',
+                        help='events written to <session>_events.jsonl (frame: also every stimulus flip)')
+    parser.add_argument('--echo', choices=['none', 'block', 'trial', 'frame'], default='block',
+                        help='events also printed to the console (by the event log thread)')
+    parser.add_argument('--coordinator', default=None, metavar='HOST[:PORT]',
+                        help='get the subject ID and seed from a pst coordinator and send it the journal records '
+                             '(the session goes on without it)')
+    parser.add_argument('--station', default=None,
+                        help='name of this station at the coordinator (default: the host name)')
+    parser.add_argument('--monitor-port', type=int, default=None, metavar='PORT',
+                        help='serve a live session monitor on http://127.0.0.1:PORT/ (0: any free port)')
+    parser.add_argument('--simulate', action='store_true',
+                        help='run headless with a simulated window, clock, dialog and participant')
+    parser.add_argument('--refresh-rate', type=float, default=120.0, help='simulated refresh rate (Hz)')
+    parser.add_argument('--responder', choices=['observer', 'scripted'], default='observer',
+                        help='simulated participant: model observer or a scripted key sequence')
+    parser.add_argument('--keys', default='cm', help="key sequence for the scripted responder, e.g. 'ccm'")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='probability of a simulated missed vsync')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the simulated participant and clock')
+    parser.add_argument('--requeue-dropped', action='store_true',
+                        help='present trials with dropped frames once more at the end of their block')
+    parser.add_argument('--responses', choices=['keyboard', 'waitKeys'], default='waitKeys',
+                        help='waitKeys: wait for the key after the last stimulus frame, RT measured when '
+                             'waitKeys returns (default, as before); keyboard: poll timestamped key presses '
+                             'from the stimulus onset, RT from the onset flip')
+    parser.add_argument('--end-on-response', action='store_true',
+                        help='stop presenting the stimulus as soon as a response arrives (keyboard responses only)')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='choose the SOA and side of every experimental trial with the Psi method')
+    parser.add_argument('--adaptive-trials', type=int, default=20, help='trials per block in adaptive mode')
+    return parser
+
+
+def run(args):
+    from pst.session import Session
+    session = Session(args)
+    session.run()
+    session.core.quit()
+
+
+def analyze(argv):
+    from pst import fitting
+    fitting.main(argv, prog='pst analyze')
+
+
+def ingest(argv):
+    from pst import ingest
+    ingest.main(argv, prog='pst ingest')
+
+
+def groups(argv):
+    from pst import groups
+    groups.main(argv, prog='pst groups')
+
+
+def video(argv):
+    from pst import videotiming
+    videotiming.main(argv, prog='pst video')
+
+
+def frames(argv):
+    from pst import frameseries
+    frameseries.main(argv, prog='pst frames')
+
+
+def coordinator(argv):
+    from pst import coordinator
+    coordinator.main(argv, prog='pst coordinator')
+
+
+def design(argv):
+    from pst import designsim
+    designsim.main(argv, prog='pst design')
+
+
+# commands that hand their arguments to the main() of an analysis module
+passThrough = {'analyze': (analyze, 'fit the simultaneity window of data files (see pst analyze -h)'),
+               'ingest': (ingest, 'ingest the data directory into a columnar store (see pst ingest -h)'),
+               'groups': (groups, 'compare diagnosis groups on an ingested store (see pst groups -h)'),
+               'video': (video, 'check the SOAs on a high-speed recording of the screen (see pst video -h)'),
+               'frames': (frames, 'read a frame series or convert a csv one (see pst frames -h)'),
+               'coordinator': (coordinator, 'serve subject IDs, seeds and a merged store to several stations '
+                                            '(see pst coordinator -h)'),
+               'design': (design, 'compare designs by simulated window recovery and session length '
+                                  '(see pst design -h)')}
+
+
+def validate(args):
+    from pst.conditions import buildConditionTable, conditionDicts, checkLegacyConditions
+    from pst.schedule import buildSchedule, checkSchedule
+    table = buildConditionTable()
+    conditions = conditionDicts(table)
+    checkLegacyConditions(conditions)
+    print('%d conditions match the original design' % len(conditions))
+    if args.session_seed is not None:
+        schedule = buildSchedule(table, args.session_seed)
+        checkSchedule(table, schedule)
+        print('schedule of seed %d: practice %s, %d blocks of %d trials'
+              % (args.session_seed, schedule['practice'].tolist(), *schedule['blocks'].shape))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in passThrough:
+        return passThrough[argv[0]][0](argv[1:])
+
+    parser = argparse.ArgumentParser(prog='pst', description='Perceptual Simultaneity Task')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    runParser(commands.add_parser('run', help='run a session')).set_defaults(handler=run)
+    for name, (handler, help) in passThrough.items():
+        commands.add_parser(name, help=help)
+    command = commands.add_parser('validate', help='check the condition table against the original design')
+    command.add_argument('--session-seed', type=int, default=None, help='also build and check the schedule of this seed')
+    command.set_defaults(handler=validate)
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
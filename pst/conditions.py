@@ -0,0 +1,169 @@
+# Perceptual Simultaneity Task - condition table
+###################################################################################
+# Builds the table of stimulus conditions (SOA, bar order, correct response and the
+# per-frame luminance of both bars) from the SOA set, the luminance ramp, the padding
+# levels and the order of the sides. The table is a NumPy structured array; the list
+# of dictionaries used by data.TrialHandler is a view built from it.
+###################################################################################
+
+import numpy as np
+
+rampLevels = (25.5, 51.0, 76.5, 102.0, 127.5)  # luminance increments (rgb255) of the bar onset ramp
+defaultSOAs = tuple(range(0, 13))  # SOA conditions in frames
+defaultSides = (-1, 1)  # -1 is L first, 1 is R first (0 is simultaneous)
+
+# the original design was made for a 120 Hz display: SOAs of 0-12 frames and one ramp level per frame
+designRefreshRate = 120.0
+defaultSOAsMs = tuple(round(soa * 1000 / designRefreshRate, 3) for soa in defaultSOAs)
+rampDurationMs = round(len(rampLevels) * 1000 / designRefreshRate, 3)
+
+
+def conditionDtype(maxFrames):
+    return np.dtype([('SOA', np.int16), ('L_R', np.int8), ('corrResp', 'U1'), ('nFrames', np.int16),
+                     ('lumL', np.float32, (maxFrames,)), ('lumR', np.float32, (maxFrames,))])
+
+
+# ------------------------------------------
+# Generate the condition table.
+# Every side in 'sides' gets one condition per SOA, with SOA 0 being the simultaneous
+# condition of that side. The leading bar runs through the ramp and then holds padAfter
+# (default: the last ramp level); the lagging bar holds padBefore for SOA frames and then
+# runs through the ramp, so both bars end on the same frame. Frames past nFrames are NaN.
+def buildConditionTable(soas=defaultSOAs, ramp=rampLevels, padBefore=0.0, padAfter=None, sides=defaultSides):
+    soas = np.asarray(soas, dtype=np.int16)
+    ramp = np.asarray(ramp, dtype=np.float32)
+    if soas.ndim != 1 or soas.size == 0 or (soas < 0).any():
+        raise ValueError('soas must be a non-empty sequence of non-negative frame counts')
+    if ramp.ndim != 1 or ramp.size == 0:
+        raise ValueError('ramp must be a non-empty sequence of luminance levels')
+    if padAfter is None:
+        padAfter = ramp[-1]
+
+    nRamp = ramp.size
+    soa = np.tile(soas, len(sides))
+    L_R = np.where(soa == 0, 0, np.repeat(np.asarray(sides, dtype=np.int8), soas.size)).astype(np.int8)
+    nFrames = (soa + nRamp).astype(np.int16)
+    frame = np.arange(int(nFrames.max()))
+
+    lead = np.where(frame < nRamp, ramp[np.minimum(frame, nRamp - 1)], padAfter)[np.newaxis, :]
+    lagIndex = frame[np.newaxis, :] - soa[:, np.newaxis]
+    lag = np.where(lagIndex < 0, padBefore, ramp[np.clip(lagIndex, 0, nRamp - 1)])
+    outside = frame[np.newaxis, :] >= nFrames[:, np.newaxis]
+
+    table = np.empty(soa.size, dtype=conditionDtype(frame.size))
+    table['SOA'] = soa
+    table['L_R'] = L_R
+    table['corrResp'] = np.where(soa == 0, 'c', 'm')  # c = gleich ; m = anderes
+    table['nFrames'] = nFrames
+    table['lumL'] = np.where((L_R == 1)[:, np.newaxis], lag, lead)
+    table['lumR'] = np.where((L_R == -1)[:, np.newaxis], lag, lead)
+    table['lumL'][outside] = np.nan
+    table['lumR'][outside] = np.nan
+    return table
+
+
+# ------------------------------------------
+# Compile SOAs in milliseconds to whole frames of a display with the given refresh rate.
+# An SOA is rejected when the nearest whole number of frames is more than maxError ms
+# away from it, or when it lands on the same number of frames as an earlier SOA.
+# returns the frame counts of the accepted SOAs, the accepted and the rejected SOAs (ms)
+def compileSOAs(soasMs, refreshRate, maxError=1.0):
+    soasMs = np.asarray(soasMs, dtype=float)
+    frames = np.rint(soasMs * refreshRate / 1000).astype(np.int16)
+    showable = np.abs(frames * 1000 / refreshRate - soasMs) <= maxError
+    accepted = np.zeros_like(showable)
+    shown = np.flatnonzero(showable)
+    accepted[shown[np.unique(frames[shown], return_index=True)[1]]] = True
+    return frames[accepted], soasMs[accepted], soasMs[~accepted]
+
+
+# ------------------------------------------
+# Resample the luminance ramp to nFrames frames
+def resampleRamp(nFrames, ramp=rampLevels):
+    ramp = np.asarray(ramp, dtype=np.float32)
+    if nFrames == ramp.size:
+        return ramp
+    return np.interp(np.linspace(0, ramp.size - 1, nFrames), np.arange(ramp.size), ramp).astype(np.float32)
+
+
+# ------------------------------------------
+# Resample the luminance ramp to the whole number of frames closest to durationMs
+def compileRamp(refreshRate, ramp=rampLevels, durationMs=rampDurationMs):
+    return resampleRamp(max(1, int(np.rint(durationMs * refreshRate / 1000))), ramp)
+
+
+# ------------------------------------------
+# The design compiled for a display: SOA frames, the SOAs it cannot show and the ramp
+# (pass soaFrames and ramp to buildConditionTable)
+def compileTimeline(refreshRate, soasMs=defaultSOAsMs, rampMs=rampDurationMs, ramp=rampLevels, maxError=1.0):
+    soaFrames, shownMs, rejectedMs = compileSOAs(soasMs, refreshRate, maxError)
+    ramp = compileRamp(refreshRate, ramp, rampMs)
+    return {'refreshRate': float(refreshRate), 'framePeriodMs': 1000 / float(refreshRate),
+            'soasMs': shownMs.tolist(), 'soaFrames': soaFrames.tolist(), 'rejectedSOAsMs': rejectedMs.tolist(),
+            'rampFrames': int(ramp.size), 'ramp': [round(level, 3) for level in ramp.tolist()]}
+
+
+# ------------------------------------------
+# List of dictionaries of condition specs (SOA, bar appearance, luminance setting) for data.TrialHandler
+def conditionDicts(table):
+    conditions = []
+    for row in table:
+        nFrames = int(row['nFrames'])
+        conditions.append({'SOA': int(row['SOA']), 'L_R': int(row['L_R']), 'corrResp': str(row['corrResp']),
+                           'lumSeqL': row['lumL'][:nFrames].tolist(),
+                           'lumSeqR': row['lumR'][:nFrames].tolist()})
+    return conditions
+
+
+# -----------------------------------------------
+# The original design: a list of luminance increments padded by black [0] and brightest
+# grey [127.5], and the 26 conditions of the hand-written if/elif chain as
+# (SOA, L_R, corrResp, lumSeqL slice, lumSeqR slice) of that list.
+legacyLuminanceList = [0] * 12 + [25.5, 51.0, 76.5, 102.0, 127.5] + [127.5] * 12
+
+legacyConditionSlices = [
+    (0, 0, 'c', (12, 17), (12, 17)),
+    (1, -1, 'm', (12, 18), (11, 17)),
+    (2, -1, 'm', (12, 19), (10, 17)),
+    (3, -1, 'm', (12, 20), (9, 17)),
+    (4, -1, 'm', (12, 21), (8, 17)),
+    (5, -1, 'm', (12, 22), (7, 17)),
+    (6, -1, 'm', (12, 23), (6, 17)),
+    (7, -1, 'm', (12, 24), (5, 17)),
+    (8, -1, 'm', (12, 25), (4, 17)),
+    (9, -1, 'm', (12, 26), (3, 17)),
+    (10, -1, 'm', (12, 27), (2, 17)),
+    (11, -1, 'm', (12, 28), (1, 17)),
+    (12, -1, 'm', (12, 29), (0, 17)),
+    (0, 0, 'c', (12, 17), (12, 17)),
+    (1, 1, 'm', (11, 17), (12, 18)),
+    (2, 1, 'm', (10, 17), (12, 19)),
+    (3, 1, 'm', (9, 17), (12, 20)),
+    (4, 1, 'm', (8, 17), (12, 21)),
+    (5, 1, 'm', (7, 17), (12, 22)),
+    (6, 1, 'm', (6, 17), (12, 23)),
+    (7, 1, 'm', (5, 17), (12, 24)),
+    (8, 1, 'm', (4, 17), (12, 25)),
+    (9, 1, 'm', (3, 17), (12, 26)),
+    (10, 1, 'm', (2, 17), (12, 27)),
+    (11, 1, 'm', (1, 17), (12, 28)),
+    (12, 1, 'm', (0, 17), (12, 29)),
+]
+
+
+def legacyConditions():
+    ll = legacyLuminanceList
+    return [{'SOA': SOA, 'L_R': L_R, 'corrResp': corrResp,
+             'lumSeqL': ll[sliceL[0]:sliceL[1]], 'lumSeqR': ll[sliceR[0]:sliceR[1]]}
+            for SOA, L_R, corrResp, sliceL, sliceR in legacyConditionSlices]
+
+
+# ------------------------------------------
+# Check a list of condition dictionaries against the 26 conditions of the original design
+def checkLegacyConditions(conditions):
+    legacy = legacyConditions()
+    if len(conditions) != len(legacy):
+        raise ValueError('expected %d conditions, got %d' % (len(legacy), len(conditions)))
+    for n, (condition, expected) in enumerate(zip(conditions, legacy), 1):
+        if condition != expected:
+            raise ValueError('condition %d differs from the original design: %r != %r' % (n, condition, expected))
@@ -0,0 +1,320 @@
+# Perceptual Simultaneity Task - multi-station coordinator
+###################################################################################
+# One coordinator (asyncio, local or on the LAN) for the stations of a lab:
+#   - it hands out subject IDs (prefix + running number, never given out twice) and
+#     session seeds, and stores every assignment in <store>/assignments.jsonl
+#   - it receives the journal records of every station (session, trial and block
+#     entries, see pst.journal) and merges them into <store>/<session>_journal.jsonl,
+#     the same format as a station's own journal
+#
+#   pst coordinator --store store [--host 0.0.0.0] [--port 8790] [--id-prefix P]
+#   pst run --coordinator labpc:8790 [--station booth1]
+#
+# The protocol is one JSON object per line and one reply line per request:
+#   {'op': 'assign', 'station'}                     -> {'subjectID', 'seed'}
+#   {'op': 'records', 'station', 'session', 'run', 'records': [[seq, record], ...]}
+#                                                   -> {'ack': last seq stored}
+# A station (CoordinatorClient) only appends records to a queue; a thread running its
+# own event loop sends them in batches and drops them once acknowledged. When the
+# coordinator cannot be reached the records stay queued and are sent after it comes
+# back; the station never waits for it (except up to `timeout` for the assignment at
+# start-up) and its local files are written as before. Records are numbered per run of
+# a station, so a batch that is sent again after a lost reply is not stored twice.
+###################################################################################
+
+import argparse
+import asyncio
+import collections
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from pst.journal import journalSuffix, jsonValue, readJournal
+
+defaultPort = 8790
+lineLimit = 2 ** 24  # longest request line (a batch of records) the coordinator reads
+assignmentsName = 'assignments.jsonl'
+
+
+# host:port (the port is optional)
+def parseAddress(text):
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, defaultPort
+    return host, int(port)
+
+
+class Coordinator:
+
+    def __init__(self, storeDir, idPrefix='P', idDigits=3):
+        os.makedirs(storeDir, exist_ok=True)
+        self.storeDir = storeDir
+        self.idPrefix = idPrefix
+        self.idDigits = idDigits
+        self._rng = random.Random()
+        self._assignmentsFile = os.path.join(storeDir, assignmentsName)
+        self.assignments = readJournal(self._assignmentsFile) if os.path.exists(self._assignmentsFile) else []
+        self._lastSeq = {}  # (session, run) -> last stored seq
+        self._files = {}
+        for fileName in glob.glob(os.path.join(storeDir, '*' + journalSuffix)):
+            session = os.path.basename(fileName)[:-len(journalSuffix)]
+            for record in readJournal(fileName):
+                key = (session, record.get('run'))
+                self._lastSeq[key] = max(self._lastSeq.get(key, 0), record.get('seq', 0))
+
+    # ------------------------------------------
+    # next subject ID (one more than the highest given out with this prefix) and an unused seed
+    def assign(self, station):
+        numbers = [int(assignment['subjectID'][len(self.idPrefix):]) for assignment in self.assignments
+                   if assignment['subjectID'].startswith(self.idPrefix)
+                   and assignment['subjectID'][len(self.idPrefix):].isdigit()]
+        seeds = {assignment['seed'] for assignment in self.assignments}
+        seed = self._rng.randrange(2 ** 31)
+        while seed in seeds:
+            seed = self._rng.randrange(2 ** 31)
+        assignment = {'subjectID': '%s%0*d' % (self.idPrefix, self.idDigits, max(numbers, default=0) + 1),
+                      'seed': seed, 'station': station, 'time': time.time()}
+        with open(self._assignmentsFile, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(assignment) + '\n')
+        self.assignments.append(assignment)
+        return {'subjectID': assignment['subjectID'], 'seed': seed}
+
+    # ------------------------------------------
+    # append the records not stored yet to the session's journal in the store; returns the last seq stored
+    def store(self, station, session, run, records):
+        session = os.path.basename(session)
+        key = (session, run)
+        lastSeq = self._lastSeq.get(key, 0)
+        if session not in self._files:
+            self._files[session] = open(os.path.join(self.storeDir, session + journalSuffix), 'a', encoding='utf-8')
+        f = self._files[session]
+        for seq, record in records:
+            if seq > lastSeq:
+                f.write(json.dumps(dict(record, station=station, run=run, seq=seq)) + '\n')
+                lastSeq = seq
+        f.flush()
+        self._lastSeq[key] = lastSeq
+        return lastSeq
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if request['op'] == 'assign':
+                        reply = self.assign(request.get('station'))
+                    elif request['op'] == 'records':
+                        reply = {'ack': self.store(request.get('station'), request['session'], request['run'],
+                                                   request['records'])}
+                    else:
+                        reply = {'error': 'unknown op %r' % request['op']}
+                except (ValueError, KeyError, TypeError) as error:
+                    reply = {'error': repr(error)}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):  # ValueError: a line over lineLimit
+            pass
+        except asyncio.CancelledError:  # the coordinator stops; end the handler quietly
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=defaultPort, started=None):
+        server = await asyncio.start_server(self._handle, host, port, limit=lineLimit)
+        self.address = server.sockets[0].getsockname()[:2]
+        if started is not None:
+            started(self.address)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+async def _cancelTasks():
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# ------------------------------------------
+# Run a coordinator on a daemon thread (e.g. a loopback instance for testing); returns it with its address
+def startCoordinator(storeDir, host='127.0.0.1', port=0, **kwargs):
+    coordinator = Coordinator(storeDir, **kwargs)
+    started = threading.Event()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(coordinator.serve(host, port, started=lambda address: started.set()))
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(_cancelTasks())  # the connections still open
+            loop.close()
+            coordinator.close()
+
+    thread = threading.Thread(target=run, name='coordinator', daemon=True)
+    thread.start()
+    if not started.wait(5):
+        raise OSError('the coordinator did not start on %s:%d' % (host, port))
+
+    def stop():
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+    coordinator.stop = stop
+    return coordinator
+
+
+class CoordinatorClient:
+
+    # address: (host, port); station: name of this station in the store
+    def __init__(self, address, station, timeout=2.0, interval=0.5, maxBatch=200):
+        self.address = address
+        self.station = station
+        self.timeout = timeout
+        self.interval = interval
+        self.maxBatch = maxBatch
+        self.run = uuid.uuid4().hex
+        self.connected = False
+        self.lastError = None
+        self._pending = collections.deque()  # (seq, session, record); appended by the session thread only
+        self._seq = 0
+        self._stopping = False
+        self._streams = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='coordinator-client', daemon=True)
+        self._thread.start()
+        self._sender = asyncio.run_coroutine_threadsafe(self._sendLoop(), self._loop)
+
+    @property
+    def unsent(self):
+        return len(self._pending)
+
+    # ------------------------------------------
+    # subject ID and seed from the coordinator, or None when it does not answer within timeout
+    def assign(self):
+        future = asyncio.run_coroutine_threadsafe(self._request({'op': 'assign', 'station': self.station}), self._loop)
+        try:
+            return future.result(self.timeout)
+        except Exception as error:
+            future.cancel()
+            self.lastError = repr(error)
+            return None
+
+    # queue a journal record of a session for the coordinator; returns at once
+    def send(self, session, record):
+        self._seq = self._seq + 1
+        self._pending.append((self._seq, session, record))
+
+    async def _request(self, request):
+        if self._streams is None:
+            self._streams = await asyncio.wait_for(asyncio.open_connection(*self.address), self.timeout)
+        reader, writer = self._streams
+        try:
+            writer.write(json.dumps(request, default=jsonValue).encode() + b'\n')
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError('coordinator closed the connection')
+            reply = json.loads(line)
+            if 'error' in reply:
+                raise ValueError('coordinator: %s' % reply['error'])
+            self.connected = True
+            return reply
+        except BaseException:
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        self.connected = False
+        if self._streams is not None:
+            self._streams[1].close()
+            self._streams = None
+
+    # send the oldest queued records of one session; drop them when acknowledged
+    async def _sendBatch(self):
+        session = self._pending[0][1]
+        batch = []
+        for n in range(min(len(self._pending), self.maxBatch)):  # indexing, the session thread may append meanwhile
+            seq, recordSession, record = self._pending[n]
+            if recordSession != session:
+                break
+            batch.append([seq, record])
+        reply = await self._request({'op': 'records', 'station': self.station, 'session': session,
+                                     'run': self.run, 'records': batch})
+        while self._pending and self._pending[0][0] <= reply['ack']:
+            self._pending.popleft()
+
+    async def _sendLoop(self):
+        retryDelay = self.interval
+        while True:
+            try:
+                while self._pending:
+                    await self._sendBatch()
+                retryDelay = self.interval
+            except (OSError, ValueError, asyncio.TimeoutError) as error:
+                self.lastError = repr(error)
+                retryDelay = min(retryDelay * 2, 10.0)  # back off while the coordinator is away
+            if self._stopping:
+                return
+            await asyncio.sleep(retryDelay)
+
+    # ------------------------------------------
+    # try for up to timeout to send what is still queued, then stop; returns the number of unsent records
+    def close(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline and not self._sender.done():
+            time.sleep(0.05)
+        self._stopping = True
+        try:
+            asyncio.run_coroutine_threadsafe(_cancelTasks(), self._loop).result(1.0)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._disconnect)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(1.0)
+        return len(self._pending)
+
+
+# ------------------------------------------
+# Merged journals in a store: {session: records}
+def readStore(storeDir):
+    return {os.path.basename(fileName)[:-len(journalSuffix)]: readJournal(fileName)
+            for fileName in sorted(glob.glob(os.path.join(storeDir, '*' + journalSuffix)))}
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Coordinator for several PST stations: '
+                                                            'subject IDs, seeds and one store of all journals')
+    parser.add_argument('--store', default='store', help='directory of the merged journals (default: ./store)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (0.0.0.0: the whole LAN)')
+    parser.add_argument('--port', type=int, default=defaultPort)
+    parser.add_argument('--id-prefix', default='P', help='subject IDs are the prefix and a running number')
+    args = parser.parse_args(argv)
+
+    coordinator = Coordinator(args.store, idPrefix=args.id_prefix)
+    started = lambda address: print('coordinator on %s:%d, store %s' % (address[0], address[1], args.store))
+    try:
+        asyncio.run(coordinator.serve(args.host, args.port, started=started))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# Perceptual Simultaneity Task - Monte-Carlo design simulator
+###################################################################################
+# How well does a design recover the simultaneity window, and how long does it take?
+# Every simulated session uses the real condition table (pst.conditions) and its own
+# schedule (pst.schedule, one seed per session) and is answered by synthetic observers
+# with the window of pst.models (Gaussian width in frames, bias, lapse rate). All
+# sessions of a chunk are answered at once (one uniform matrix against the P("c") of
+# every trial, the same matrix for every observer) and fitted at once: the counts of
+# all sessions are the rows of the count matrix that pst.fitting fits in one batch, as
+# it does for bootstrap resamples. Chunks of (design, seeds) run in a process pool; the
+# schedules of a chunk are built once for all observers.
+#
+# The true window of an observer is its full width at P("c") = 0.5, 2 sqrt(2 ln 2) x
+# width (independent of the lapse rate), centred on the bias (the PSS). The recovery
+# error is the fitted minus the true value; per design the RMSE, the mean error (bias of
+# the estimate), the median absolute error and the share of failed fits are reported
+# with the session length (trials and estimated minutes).
+#
+#   python -m pst.designsim --reps 1,2 --blocks 3,5 --soas 0-12 0-12/2 --sessions 2000
+#   pst design ... --target-width-rmse 1.0 --json results.json
+###################################################################################
+
+import argparse
+import itertools
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pst.conditions import buildConditionTable, defaultSOAs, rampLevels
+from pst.fitting import aggregate, fitCounts
+from pst.models import windowProbability
+from pst.schedule import buildSchedule
+
+halfWidthFactor = 2 * math.sqrt(2 * math.log(2))  # full width at P("c") = 0.5 per unit of window width
+
+
+# ------------------------------------------
+# SOA set in frames from the command line: '0-12' (every frame), '0-12/2' (every other frame) or '0,1,2,4,8'
+def parseSOAs(text):
+    if '-' in text:
+        bounds, _, step = text.partition('/')
+        first, last = (int(value) for value in bounds.split('-'))
+        return tuple(range(first, last + 1, int(step or 1)))
+    return tuple(int(value) for value in text.split(','))
+
+
+def design(soas=defaultSOAs, nReps=2, nBlocks=5, nPractice=10):
+    return {'soas': tuple(soas), 'nReps': nReps, 'nBlocks': nBlocks, 'nPractice': nPractice}
+
+
+def observer(width=3.0, bias=0.0, lapse=0.02):
+    return {'width': width, 'bias': bias, 'lapse': lapse}
+
+
+# ------------------------------------------
+# Trials and estimated duration (minutes) of a session of a design: every trial takes the ITI,
+# its stimulus frames and the RT; every block ends with a message of blockPause seconds
+def sessionLength(design, refreshRate=120.0, itiMs=500.0, rtMean=0.55, blockPause=8.0):
+    table = buildConditionTable(soas=design['soas'], ramp=rampLevels)
+    nTrials = design['nBlocks'] * design['nReps'] * len(table)
+    trialSeconds = itiMs / 1000 + table['nFrames'].mean() / refreshRate + rtMean
+    seconds = (nTrials + design['nPractice']) * trialSeconds + (design['nBlocks'] + 1) * blockPause
+    return {'trials': nTrials, 'practiceTrials': design['nPractice'], 'minutes': seconds / 60}
+
+
+# ------------------------------------------
+# Simulate the sessions of the given seeds for every observer; returns per observer the fitted
+# window parameters, one array (one value per session) each
+def simulateSessions(design, observers, seeds, model='dualLogistic'):
+    table = buildConditionTable(soas=design['soas'], ramp=rampLevels)
+    signed = (table['SOA'] * table['L_R']).astype(int)
+    orders = np.stack([buildSchedule(table, seed, nBlocks=design['nBlocks'], nReps=design['nReps'],
+                                     nPractice=min(design['nPractice'], len(table)))['blocks'].ravel()
+                       for seed in seeds])
+    trials = signed[orders]  # (nSessions, nTrials) signed SOA of every experimental trial in session order
+    uniform = np.random.default_rng([int(seeds[0]), len(seeds)]).random(trials.shape)
+
+    # every session presents every condition equally often, so the trial counts per level are shared
+    levels, n, k = aggregate(trials[0], np.ones_like(trials[0]), np.zeros(trials.shape[1]))
+    index = (np.arange(len(seeds))[:, np.newaxis] * levels.size + np.searchsorted(levels, trials)).ravel()
+    estimates = []
+    for observer in observers:
+        simultaneous = uniform < windowProbability(trials, observer['width'], observer['bias'], observer['lapse'])
+        k = np.bincount(index, weights=simultaneous.ravel(), minlength=len(seeds) * levels.size)
+        with np.errstate(all='ignore'):
+            estimates.append(fitCounts(model, levels, n, k.reshape(len(seeds), levels.size)))
+    return estimates
+
+
+def _runChunk(job):
+    design, observers, seeds, model = job
+    return [{'width': estimates['width'], 'PSS': estimates['PSS']}
+            for estimates in simulateSessions(design, observers, seeds, model=model)]
+
+
+# ------------------------------------------
+# Recovery error of one (design, observer) cell from its fitted widths and PSSs
+def recovery(estimates, observer):
+    truth = {'width': halfWidthFactor * observer['width'], 'PSS': observer['bias']}
+    result = {}
+    for name, values in estimates.items():
+        error = values - truth[name]
+        finite = np.isfinite(error)
+        error = error[finite]
+        result[name] = {'true': truth[name],
+                        'rmse': float(np.sqrt(np.mean(error ** 2))) if error.size else math.nan,
+                        'bias': float(error.mean()) if error.size else math.nan,
+                        'medianAbsError': float(np.median(np.abs(error))) if error.size else math.nan,
+                        'failed': float(1 - finite.mean())}
+    return result
+
+
+# ------------------------------------------
+# Simulate nSessions sessions for every design x observer; chunks run in a process pool of
+# `workers` processes (1: in this process). Seeds are firstSeed, firstSeed + 1, ... per cell.
+def simulateDesigns(designs, observers, nSessions=1000, model='dualLogistic', workers=None, chunkSize=250,
+                    firstSeed=0):
+    cells = list(itertools.product(range(len(designs)), range(len(observers))))
+    jobs, owners = [], []
+    for designIndex, design in enumerate(designs):
+        for start in range(0, nSessions, chunkSize):
+            seeds = np.arange(firstSeed + start, firstSeed + min(nSessions, start + chunkSize))
+            jobs.append((design, observers, seeds, model))
+            owners.append(designIndex)
+    collected = {cell: {'width': [], 'PSS': []} for cell in cells}
+
+    def collect(chunks):
+        for designIndex, chunk in zip(owners, chunks):
+            for observerIndex, estimates in enumerate(chunk):
+                for name, values in estimates.items():
+                    collected[(designIndex, observerIndex)][name].append(values)
+    if workers == 1:
+        collect(map(_runChunk, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                collect(pool.map(_runChunk, jobs))
+            except BaseException:  # a failed chunk or Ctrl-C: drop the queued chunks instead of running them
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    results = []
+    for designIndex, observerIndex in cells:
+        estimates = {name: np.concatenate(values) for name, values in collected[(designIndex, observerIndex)].items()}
+        results.append({'design': designs[designIndex], 'observer': observers[observerIndex],
+                        'length': sessionLength(designs[designIndex]), 'nSessions': nSessions,
+                        'recovery': recovery(estimates, observers[observerIndex])})
+    return results
+
+
+# ------------------------------------------
+# Per design: session length and the worst recovery over the observers
+def summarizeDesigns(results):
+    summary = {}
+    for result in results:
+        key = json.dumps(result['design'])
+        row = summary.setdefault(key, {'design': result['design'], 'length': result['length'],
+                                       'widthRMSE': 0.0, 'PSSRMSE': 0.0, 'failed': 0.0})
+        row['widthRMSE'] = max(row['widthRMSE'], result['recovery']['width']['rmse'])
+        row['PSSRMSE'] = max(row['PSSRMSE'], result['recovery']['PSS']['rmse'])
+        row['failed'] = max(row['failed'], result['recovery']['width']['failed'])
+    return sorted(summary.values(), key=lambda row: row['length']['trials'])
+
+
+def formatSOAs(soas):
+    soas = list(soas)
+    step = soas[1] - soas[0] if len(soas) > 1 else 1
+    if len(soas) > 2 and soas == list(range(soas[0], soas[-1] + 1, step)):
+        return '%d-%d' % (soas[0], soas[-1]) + ('/%d' % step if step != 1 else '')
+    return ','.join(str(soa) for soa in soas)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Recovery of the simultaneity window by different '
+                                                            'designs, simulated with synthetic observers')
+    parser.add_argument('--soas', nargs='+', type=parseSOAs, default=[defaultSOAs], metavar='SET',
+                        help="SOA sets in frames: '0-12', '0-12/2' (every other frame) or '0,1,2,4,8' (default 0-12)")
+    parser.add_argument('--reps', type=lambda text: [int(value) for value in text.split(',')], default=[2],
+                        help='repetitions of every condition per block, e.g. 1,2')
+    parser.add_argument('--blocks', type=lambda text: [int(value) for value in text.split(',')], default=[5],
+                        help='numbers of blocks, e.g. 3,4,5')
+    parser.add_argument('--widths', type=lambda text: [float(value) for value in text.split(',')],
+                        default=[2.0, 3.0, 4.0], help='window widths (frames, Gaussian SD) of the observers')
+    parser.add_argument('--biases', type=lambda text: [float(value) for value in text.split(',')],
+                        default=[0.0, 1.0], help='window centres (frames, positive = R first) of the observers')
+    parser.add_argument('--lapses', type=lambda text: [float(value) for value in text.split(',')],
+                        default=[0.02], help='lapse rates of the observers')
+    parser.add_argument('--sessions', type=int, default=1000, help='simulated sessions per design and observer')
+    parser.add_argument('--model', choices=('dualLogistic', 'gaussian'), default='dualLogistic')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first session')
+    parser.add_argument('--target-width-rmse', type=float, default=None, metavar='FRAMES',
+                        help='report the shortest design whose width RMSE is at most FRAMES for every observer')
+    parser.add_argument('--json', default=None, help='also write all results to this file')
+    args = parser.parse_args(argv)
+
+    designs = [design(soas, nReps, nBlocks) for soas, nReps, nBlocks in itertools.product(args.soas, args.reps,
+                                                                                          args.blocks)]
+    observers = [observer(width, bias, lapse) for width, bias, lapse in itertools.product(args.widths, args.biases,
+                                                                                          args.lapses)]
+    results = simulateDesigns(designs, observers, nSessions=args.sessions, model=args.model, workers=args.workers,
+                              firstSeed=args.seed)
+
+    print('%d sessions per design and observer, %s fit; errors in frames (fitted - true)' % (args.sessions, args.model))
+    print('%-12s %4s %6s %6s %7s | %5s %5s %5s | %9s %9s %9s %9s %7s'
+          % ('SOAs', 'reps', 'blocks', 'trials', 'minutes', 'width', 'bias', 'lapse',
+             'width RMSE', 'width err', 'PSS RMSE', 'PSS err', 'failed'))
+    for result in results:
+        d, o, length, r = result['design'], result['observer'], result['length'], result['recovery']
+        print('%-12s %4d %6d %6d %7.1f | %5.1f %5.1f %5.2f | %10.3f %9.3f %9.3f %9.3f %6.1f%%'
+              % (formatSOAs(d['soas']), d['nReps'], d['nBlocks'], length['trials'], length['minutes'],
+                 o['width'], o['bias'], o['lapse'], r['width']['rmse'], r['width']['bias'],
+                 r['PSS']['rmse'], r['PSS']['bias'], 100 * r['width']['failed']))
+
+    summary = summarizeDesigns(results)
+    if args.target_width_rmse is not None:
+        good = [row for row in summary if row['widthRMSE'] <= args.target_width_rmse]
+        if good:
+            best = good[0]
+            print('shortest design with width RMSE <= %g for every observer: SOAs %s, %d reps, %d blocks '
+                  '(%d trials, %.1f min; worst width RMSE %.3f, PSS RMSE %.3f)'
+                  % (args.target_width_rmse, formatSOAs(best['design']['soas']), best['design']['nReps'],
+                     best['design']['nBlocks'], best['length']['trials'], best['length']['minutes'],
+                     best['widthRMSE'], best['PSSRMSE']))
+        else:
+            print('no design reaches a width RMSE of %g for every observer' % args.target_width_rmse)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': {name: value for name, value in vars(args).items() if name != 'json'},
+                       'results': results, 'summary': summary}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
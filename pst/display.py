@@ -0,0 +1,23 @@
+# Perceptual Simultaneity Task - display measurement
+###################################################################################
+# The refresh rate is measured from the timestamps of nFlips back-to-back flips of the
+# window (after nWarmUp flips). Flip intervals more than 4 robust SDs (1.4826 x the
+# median absolute deviation, at least 0.1 ms) from the median are missed vsyncs or
+# compositor hiccups and are left out; the rate is 1 / mean of the others. When fewer
+# than minInliers of the intervals are kept the display is reported as unstable.
+###################################################################################
+
+import numpy as np
+
+
+def measureRefreshRate(win, nFlips=120, nWarmUp=10, minInliers=0.8):
+    for i in range(nWarmUp):
+        win.flip()
+    intervals = np.diff([win.flip() for i in range(nFlips + 1)])
+    median = np.median(intervals)
+    robustSD = max(1.4826 * np.median(np.abs(intervals - median)), 1e-4)
+    inliers = np.abs(intervals - median) <= 4 * robustSD
+    period = intervals[inliers].mean()
+    return {'refreshRate': float(1 / period), 'framePeriodMs': float(period * 1000),
+            'flipJitterMs': float(intervals[inliers].std() * 1000), 'nFlips': nFlips,
+            'nOutliers': int((~inliers).sum()), 'stable': bool(inliers.mean() >= minInliers)}
@@ -0,0 +1,85 @@
+# Perceptual Simultaneity Task - structured event log
+###################################################################################
+# Session, block, trial, response and flip events are written as JSON lines to
+# <session>_events.jsonl. log() only checks the verbosity and appends a tuple to an
+# in-memory queue; a daemon thread drains the queue in batches, formats the records,
+# writes them and echoes the ones at or below the echo level to the console. So the
+# frame loop never formats strings or touches a stream.
+#
+# levels (verbosity / echo)
+#   block   session and block events, warnings, summaries
+#   trial   trial start, response and timing of every trial
+#   frame   every stimulus flip
+###################################################################################
+
+import atexit
+import json
+import queue
+import threading
+
+from pst.journal import jsonValue
+
+levels = {'none': 0, 'block': 1, 'trial': 2, 'frame': 3}
+BLOCK, TRIAL, FRAME = levels['block'], levels['trial'], levels['frame']
+
+
+class EventLog:
+
+    # clock: function returning the time stamped on every record (e.g. expClock.getTime)
+    def __init__(self, fileName, clock, verbosity='trial', echo='block'):
+        self.fileName = fileName
+        self.clock = clock
+        self.level = levels[verbosity]
+        self.echoLevel = levels[echo]
+        self._file = open(fileName, 'a', encoding='utf-8')
+        self._records = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='eventlog', daemon=True)
+        self._thread.start()
+        self._closed = False
+        atexit.register(self.close)  # core.quit() exits through sys.exit, which still drains the queue
+
+    # record an event of the given level (BLOCK, TRIAL or FRAME); returns at once
+    def log(self, level, event, **fields):
+        if level <= self.level:
+            self._records.put((self.clock(), level, event, fields))
+
+    def enabled(self, level):
+        return level <= self.level
+
+    def _run(self):
+        while True:
+            batch = [self._records.get()]
+            while True:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is None:
+                    self._file.flush()
+                    return
+                t, level, event, fields = record
+                try:
+                    line = json.dumps({'t': round(t, 6), 'event': event, **fields}, default=jsonValue)
+                except (TypeError, ValueError) as error:  # a bad record must not stop the thread
+                    line = json.dumps({'t': round(t, 6), 'event': 'eventLogError', 'error': repr(error)})
+                self._file.write(line + '\n')
+                if level <= self.echoLevel:
+                    print('%9.3f %-14s %s' % (t, event, ' '.join('%s=%s' % item for item in fields.items())))
+            self._file.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._records.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+# ------------------------------------------
+# Read an event log back as a list of dictionaries
+def readEvents(fileName):
+    with open(fileName, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
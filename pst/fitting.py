@@ -0,0 +1,175 @@
+# Perceptual Simultaneity Task - psychometric fitting of the simultaneity window
+###################################################################################
+# Fits P("c") as a function of the signed SOA (SOA x L_R, in frames; negative = L first)
+# with a binomial GLM solved by Newton-Raphson (IRLS), vectorized over bootstrap
+# resamples: every resample is a row of a (nBoot, nLevels) count matrix, all rows are
+# fitted together with batched NumPy linear algebra.
+#
+# models
+#   dualLogistic  separate logistic fall-off on the L-first and the R-first side
+#                 (simultaneous trials belong to both); thresholdL / thresholdR are the
+#                 SOAs where P("c") = 0.5, width = thresholdL + thresholdR and
+#                 PSS = (thresholdR - thresholdL) / 2 is the centre of the window
+#   gaussian      logit P("c") quadratic in the signed SOA (a Gaussian-shaped window);
+#                 PSS is the peak, width the full width at P("c") = 0.5
+#
+# Use as a library (fitWindow / fitFile) or from the command line:
+#   python -m pst.fitting data/<datafile>.csv [--model gaussian] [--boot 2000]
+###################################################################################
+
+import argparse
+import csv
+import json
+
+import numpy as np
+
+models = ('dualLogistic', 'gaussian')
+
+
+# ------------------------------------------
+# Read the experimental trials of a wide-text data file written by the ExperimentHandler
+# returns SOA, L_R and simultaneous (response 'c') arrays; trials with dropped frames are
+# left out unless excludeDropped is False
+def readTrials(fileName, excludeDropped=True):
+    soa, lr, simultaneous = [], [], []
+    with open(fileName, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            if not row.get('Trial Number') or row.get('subjResp') not in ('c', 'm'):
+                continue
+            if excludeDropped and row.get('timingQuality') == 'dropped':
+                continue
+            soa.append(int(float(row['SOA'])))
+            lr.append(int(float(row['L_R'])))
+            simultaneous.append(row['subjResp'] == 'c')
+    return np.array(soa, dtype=int), np.array(lr, dtype=int), np.array(simultaneous, dtype=bool)
+
+
+# ------------------------------------------
+# Count trials (n) and "c" responses (k) per signed SOA level
+def aggregate(soa, lr, simultaneous):
+    signed = np.asarray(lr) * np.asarray(soa)
+    levels, index = np.unique(signed, return_inverse=True)
+    n = np.bincount(index, minlength=levels.size).astype(float)
+    k = np.bincount(index, weights=np.asarray(simultaneous, dtype=float), minlength=levels.size)
+    return levels, n, k
+
+
+# ------------------------------------------
+# Binomial GLM with logit link for many count vectors at once
+# X: (nLevels, nParams) design matrix, n: (nLevels,) trials (or (nBoot, nLevels) when they differ per row),
+# k: (nBoot, nLevels) successes
+# a small ridge penalty on the non-intercept terms keeps separable data finite
+def fitLogistic(X, n, k, ridge=1e-2, nIter=50, tol=1e-8):
+    k = np.atleast_2d(k)
+    nParams = X.shape[1]
+    penalty = ridge * np.eye(nParams)
+    penalty[0, 0] = 0
+    beta = np.zeros((k.shape[0], nParams))
+    for i in range(nIter):
+        mu = 1 / (1 + np.exp(-(beta @ X.T)))
+        weight = n * mu * (1 - mu)
+        gradient = (k - n * mu) @ X - beta @ penalty
+        hessian = np.einsum('bl,li,lj->bij', weight, X, X) + penalty
+        step = np.linalg.solve(hessian, gradient[..., np.newaxis])[..., 0]
+        beta = beta + step
+        if np.abs(step).max() < tol:
+            break
+    return beta
+
+
+# ------------------------------------------
+# Window parameters for a (nBoot, nLevels) matrix of "c" counts (n: trials per level, shared by all
+# rows or one row each)
+def fitCounts(model, levels, n, k):
+    if model == 'dualLogistic':
+        params = {}
+        for side, name in ((-1, 'L'), (1, 'R')):
+            columns = side * levels >= 0
+            distance = np.abs(levels[columns]).astype(float)
+            X = np.column_stack([np.ones_like(distance), distance])
+            beta = fitLogistic(X, n[..., columns], k[:, columns])
+            params['threshold' + name] = -beta[:, 0] / beta[:, 1]
+            params['slope' + name] = -1 / beta[:, 1]
+        params['width'] = params['thresholdL'] + params['thresholdR']
+        params['PSS'] = (params['thresholdR'] - params['thresholdL']) / 2
+        return params
+    elif model == 'gaussian':
+        x = levels.astype(float)
+        X = np.column_stack([np.ones_like(x), x, x ** 2])
+        beta = fitLogistic(X, n, k)
+        b0, b1, b2 = beta[:, 0], beta[:, 1], beta[:, 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pss = np.where(b2 < 0, -b1 / (2 * b2), np.nan)
+            discriminant = b1 ** 2 - 4 * b0 * b2
+            width = np.where((b2 < 0) & (discriminant > 0), np.sqrt(discriminant) / np.abs(b2), np.nan)
+            peak = 1 / (1 + np.exp(-(b0 - b1 ** 2 / (4 * b2))))
+        return {'PSS': pss, 'width': width, 'peak': peak}
+    raise ValueError('unknown model %r, expected one of %s' % (model, ', '.join(models)))
+
+
+# ------------------------------------------
+# Fit the simultaneity window and bootstrap percentile confidence intervals
+# Resampling trials with replacement within each SOA level is drawn directly as
+# binomial counts, in chunks of at most chunkSize resamples.
+def fitWindow(soa, lr, simultaneous, model='dualLogistic', nBoot=2000, ci=0.95, seed=None, chunkSize=5000):
+    levels, n, k = aggregate(soa, lr, simultaneous)
+    if levels.size == 0:
+        raise ValueError('no trials to fit')
+    estimates = {name: float(value[0]) for name, value in fitCounts(model, levels, n, k[np.newaxis, :]).items()}
+
+    result = {'model': model, 'nTrials': int(n.sum()), 'estimates': estimates, 'ci': {}, 'ciLevel': ci,
+              'nBoot': nBoot, 'levels': levels.tolist(), 'pSimultaneous': (k / n).tolist()}
+    if nBoot:
+        rng = np.random.default_rng(seed)
+        samples = {name: [] for name in estimates}
+        for start in range(0, nBoot, chunkSize):
+            kBoot = rng.binomial(n.astype(int), k / n, size=(min(chunkSize, nBoot - start), levels.size))
+            for name, values in fitCounts(model, levels, n, kBoot.astype(float)).items():
+                samples[name].append(values)
+        alpha = (1 - ci) / 2
+        for name, values in samples.items():
+            values = np.concatenate(values)
+            low, high = np.nanquantile(values, [alpha, 1 - alpha]) if np.isfinite(values).any() else (np.nan, np.nan)
+            result['ci'][name] = [float(low), float(high)]
+    return result
+
+
+def fitFile(fileName, model='dualLogistic', nBoot=2000, ci=0.95, seed=None, excludeDropped=True):
+    soa, lr, simultaneous = readTrials(fileName, excludeDropped=excludeDropped)
+    result = fitWindow(soa, lr, simultaneous, model=model, nBoot=nBoot, ci=ci, seed=seed)
+    result['fileName'] = fileName
+    return result
+
+
+def formatResult(result):
+    lines = ['%s fit, %d trials (SOA in frames, %d%% bootstrap CI from %d resamples)'
+             % (result['model'], result['nTrials'], round(result['ciLevel'] * 100), result['nBoot'])]
+    for name, value in result['estimates'].items():
+        low, high = result['ci'].get(name, (np.nan, np.nan))
+        lines.append('  %-11s %8.3f  [%8.3f, %8.3f]' % (name, value, low, high))
+    return '\n'.join(lines)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Fit the simultaneity window of PST data files')
+    parser.add_argument('files', nargs='+', help='wide-text csv files written by the ExperimentHandler')
+    parser.add_argument('--model', choices=models, default='dualLogistic')
+    parser.add_argument('--boot', type=int, default=2000, help='number of bootstrap resamples')
+    parser.add_argument('--ci', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--include-dropped', action='store_true', help='keep trials with dropped frames')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = [fitFile(fileName, model=args.model, nBoot=args.boot, ci=args.ci, seed=args.seed,
+                       excludeDropped=not args.include_dropped) for fileName in args.files]
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        for result in results:
+            print(result['fileName'])
+            print(formatResult(result))
+
+
+if __name__ == '__main__':
+    main()
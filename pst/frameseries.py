@@ -0,0 +1,290 @@
+# Perceptual Simultaneity Task - frame series
+###################################################################################
+# Every stimulus frame is stored as one fixed-size binary record (frameDtype): the key
+# of its trial (block, trial, SOA, L_R, length of the luminance sequence), the frame
+# number, the time of the window flip and the luminance of both bars. <name>.bin holds
+# the frame records, <name>.idx one record per trial (trialDtype: the trial key, the
+# time of its first flip and the position of its frames in <name>.bin). Both files
+# start with a 16-byte header (magic, version, record size) followed by the raw records.
+# FrameSeries memory-maps the frames and loads the index, so the frames of any set of
+# trials are read without scanning the file.
+#
+# During the session frames are stored in a preallocated NumPy buffer. At safe points
+# (between trials or blocks) the filled buffer and the index records of the finished
+# trials are handed to a writer thread, which appends them to the files, so the flip
+# loop never touches the disk. Buffers are recycled, so memory stays flat.
+#
+# Frame series of earlier versions (csv rows nFrame, t, SOA, nFrames) are converted with
+#   pst frames convert data/frameseries/<session>_frameseries-exp.csv data/<session>.csv
+###################################################################################
+
+import argparse
+import atexit
+import os
+import queue
+
+import numpy as np
+
+from pst.writer import BackgroundWriter
+
+frameDtype = np.dtype([('block', '<i2'), ('trial', '<i4'), ('SOA', '<i2'), ('L_R', 'i1'), ('nFrames', '<i2'),
+                       ('nFrame', '<i2'), ('t', '<f8'), ('lumL', '<f4'), ('lumR', '<f4')])
+trialDtype = np.dtype([('block', '<i2'), ('trial', '<i4'), ('SOA', '<i2'), ('L_R', 'i1'), ('nFrames', '<i2'),
+                       ('t', '<f8'), ('offset', '<i8'), ('count', '<i4')])
+
+headerDtype = np.dtype([('magic', 'S8'), ('version', '<u4'), ('recordSize', '<u4')])
+magic = b'PSTFRAME'
+version = 1
+
+
+def indexFile(fileName):
+    return os.path.splitext(fileName)[0] + '.idx'
+
+
+def _header(dtype):
+    return np.array([(magic, version, dtype.itemsize)], dtype=headerDtype).tobytes()
+
+
+# ------------------------------------------
+# Records of a frame or index file; a torn record at the end (crash in the middle of a write) is ignored
+def readRecords(fileName, dtype, mmap=False):
+    with open(fileName, 'rb') as f:
+        header = np.frombuffer(f.read(headerDtype.itemsize), dtype=headerDtype)
+    if header.size == 0 or header['magic'][0] != magic:
+        raise ValueError('%s is not a frame-series file' % fileName)
+    if header['version'][0] != version or header['recordSize'][0] != dtype.itemsize:
+        raise ValueError('%s has version %d, records of %d bytes (expected version %d, %d bytes)'
+                         % (fileName, header['version'][0], header['recordSize'][0], version, dtype.itemsize))
+    n = (os.path.getsize(fileName) - headerDtype.itemsize) // dtype.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(fileName, dtype=dtype, mode='r', offset=headerDtype.itemsize, shape=(n,))
+    return np.fromfile(fileName, dtype=dtype, count=n, offset=headerDtype.itemsize)
+
+
+class FrameSeriesLogger:
+
+    # fileName: <name>.bin (the index goes to <name>.idx)
+    # resumeAt: keep the first resumeAt bytes of an existing frame file (and the trials indexed in them)
+    def __init__(self, fileName, capacity=1024, resumeAt=None):
+        os.makedirs(os.path.dirname(os.path.abspath(fileName)), exist_ok=True)
+        self.fileName = fileName
+        self.indexFileName = indexFile(fileName)
+        self._logged = 0  # frames handed to the writer thread
+        if resumeAt is None or not os.path.exists(fileName):
+            self._frames = open(fileName, 'wb')
+            self._frames.write(_header(frameDtype))
+            self._index = open(self.indexFileName, 'wb')
+            self._index.write(_header(trialDtype))
+        else:
+            self._logged = (resumeAt - headerDtype.itemsize) // frameDtype.itemsize
+            trials = readRecords(self.indexFileName, trialDtype)
+            keep = int((trials['offset'] + trials['count'] <= self._logged).sum())
+            self._frames = open(fileName, 'r+b')
+            self._frames.truncate(resumeAt)
+            self._frames.seek(resumeAt)
+            self._index = open(self.indexFileName, 'r+b')
+            self._index.truncate(headerDtype.itemsize + keep * trialDtype.itemsize)
+            self._index.seek(0, os.SEEK_END)
+        self._writer = BackgroundWriter(name='frameseries')
+        self._freeBuffers = queue.SimpleQueue()  # buffers handed back by the writer thread
+        self._buffer = np.zeros(capacity, dtype=frameDtype)
+        self._n = 0
+        self._trials = []  # index records of finished trials not yet handed over
+        self._key = (0, 0, 0, 0, 0)
+        self._trialStart = 0
+        self._trialT = None
+        self._closed = False
+        atexit.register(self.close)  # core.quit() exits through sys.exit, which still drains the buffer
+
+    # key of the trial whose frames follow (block 0 is the practice block)
+    def startTrial(self, block, trial, SOA, L_R, nFrames):
+        self._key = (block, trial, SOA, L_R, nFrames)
+        self._trialStart = self._logged + self._n
+        self._trialT = None
+
+    # store one frame (called right after each stimulus flip)
+    def log(self, nFrame, t, lumL, lumR):
+        if self._n == len(self._buffer):  # a trial longer than the buffer: hand it over and continue
+            self._handOff(False)
+        if self._trialT is None:
+            self._trialT = t
+        self._buffer[self._n] = self._key + (nFrame, t, lumL, lumR)
+        self._n = self._n + 1
+
+    # index the frames logged since startTrial
+    def endTrial(self):
+        count = self._logged + self._n - self._trialStart
+        self._trials.append(self._key + (np.nan if self._trialT is None else self._trialT, self._trialStart, count))
+
+    # hand the frames logged so far to the writer thread; sync=True also fsyncs the files
+    def flush(self, sync=False):
+        if self._n or self._trials or sync:
+            self._handOff(sync)
+
+    def _handOff(self, sync):
+        buffer, n = self._buffer, self._n
+        self._writer.submit(self._write, buffer, n, self._trials, sync)
+        try:
+            self._buffer = self._freeBuffers.get_nowait()
+        except queue.Empty:
+            self._buffer = np.zeros_like(buffer)
+        self._logged = self._logged + n
+        self._n = 0
+        self._trials = []
+
+    # runs on the writer thread; the frames of a trial always reach the disk before its index record
+    def _write(self, buffer, n, trials, sync):
+        self._frames.write(buffer[:n].tobytes())
+        self._frames.flush()
+        if trials:
+            self._index.write(np.array(trials, dtype=trialDtype).tobytes())
+            self._index.flush()
+        if sync:
+            os.fsync(self._frames.fileno())
+            os.fsync(self._index.fileno())
+        self._freeBuffers.put(buffer)
+
+    # size of the frame file once everything logged so far is written (recorded by the journal at the end of a block)
+    def size(self):
+        self.flush()
+        self._writer.wait()
+        return self._frames.tell()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        try:
+            self.flush(sync=True)
+            self._writer.close()
+        finally:
+            self._frames.close()
+            self._index.close()
+
+
+class FrameSeries:
+
+    # fileName: <name>.bin; the frames are memory-mapped, the trial index is loaded
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.frames = readRecords(fileName, frameDtype, mmap=True)
+        trials = readRecords(indexFile(fileName), trialDtype)
+        self.trials = trials[trials['offset'] + trials['count'] <= len(self.frames)]
+
+    # which trials match every given key (a value or a list of values)
+    def select(self, block=None, trial=None, SOA=None, L_R=None):
+        match = np.ones(len(self.trials), dtype=bool)
+        for name, value in (('block', block), ('trial', trial), ('SOA', SOA), ('L_R', L_R)):
+            if value is not None:
+                match &= np.isin(self.trials[name], value)
+        return match
+
+    # frames of the matching trials, e.g. read(SOA=3, L_R=1, block=2); only their records are read
+    def read(self, block=None, trial=None, SOA=None, L_R=None):
+        trials = self.trials[self.select(block, trial, SOA, L_R)]
+        counts = trials['count'].astype(np.int64)
+        if counts.sum() == 0:
+            return np.zeros(0, dtype=frameDtype)
+        starts = np.repeat(trials['offset'] - np.cumsum(counts) + counts, counts)
+        return np.asarray(self.frames[starts + np.arange(counts.sum())])
+
+    def __len__(self):
+        return len(self.trials)
+
+
+# ------------------------------------------
+# Frame records of a csv frame series of an earlier version (rows nFrame, t, SOA, nFrames).
+# Block, trial number and L_R come from the trial rows of the given phase ('exp' or 'practice')
+# of the data file, in order; the luminance from the condition table (the ramp has nFrames - SOA frames).
+def readFrameSeriesCSV(fileName, dataFile, phase='exp'):
+    from pst.conditions import buildConditionTable, resampleRamp
+    from pst.ingest import readDataFile
+    rows = np.loadtxt(fileName, delimiter=',', ndmin=2)
+    trials = readDataFile(dataFile)[0]
+    keys = [(block, trial, SOA, L_R) for trialPhase, block, trial, SOA, L_R in
+            zip(trials['phase'], trials['block'], trials['trial'], trials['SOA'], trials['L_R']) if trialPhase == phase]
+    frames = np.zeros(len(rows), dtype=frameDtype)
+    if frames.size == 0:
+        return frames
+    trialOfFrame = np.cumsum(rows[:, 0] == 1) - 1
+    if trialOfFrame[-1] + 1 != len(keys) or trialOfFrame[0] < 0:
+        raise ValueError('%s has %d trials, the %s trials of %s %d' % (fileName, trialOfFrame[-1] + 1, phase,
+                                                                          dataFile, len(keys)))
+    keys = np.array(keys, dtype=int).reshape(-1, 4)
+    frames['block'], frames['trial'], frames['L_R'] = keys[trialOfFrame, 0], keys[trialOfFrame, 1], keys[trialOfFrame, 3]
+    frames['nFrame'], frames['t'], frames['SOA'], frames['nFrames'] = rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+    if (frames['SOA'] != keys[trialOfFrame, 2]).any():
+        raise ValueError('the SOAs of %s do not match the %s trials of %s' % (fileName, phase, dataFile))
+
+    for nRamp in np.unique(frames['nFrames'] - frames['SOA']):
+        ofRamp = frames['nFrames'] - frames['SOA'] == nRamp
+        table = buildConditionTable(soas=np.unique(frames['SOA'][ofRamp]), ramp=resampleRamp(int(nRamp)))
+        row = {(SOA, L_R): n for n, (SOA, L_R) in enumerate(zip(table['SOA'].tolist(), table['L_R'].tolist()))}
+        conditions = np.array([row[key] for key in zip(frames['SOA'][ofRamp].tolist(), frames['L_R'][ofRamp].tolist())])
+        frames['lumL'][ofRamp] = table['lumL'][conditions, frames['nFrame'][ofRamp] - 1]
+        frames['lumR'][ofRamp] = table['lumR'][conditions, frames['nFrame'][ofRamp] - 1]
+    return frames
+
+
+# ------------------------------------------
+# Write frame records (frameDtype, ordered by trial) as <name>.bin and <name>.idx
+def writeFrameSeries(fileName, frames):
+    logger = FrameSeriesLogger(fileName, capacity=max(1, len(frames)))
+    newTrial = np.ones(len(frames), dtype=bool)
+    newTrial[1:] = (frames['nFrame'][1:] == 1) | (frames['trial'][1:] != frames['trial'][:-1]) | \
+                   (frames['block'][1:] != frames['block'][:-1])
+    for n, (frame, first) in enumerate(zip(frames.tolist(), newTrial.tolist())):
+        if first:
+            if n:
+                logger.endTrial()
+            logger.startTrial(*frame[:5])
+        logger.log(*frame[5:])
+    if len(frames):
+        logger.endTrial()
+    logger.close()
+
+
+def convert(args):
+    phase = args.phase or ('practice' if args.csv.endswith('-pract.csv') else 'exp')
+    frames = readFrameSeriesCSV(args.csv, args.dataFile, phase)
+    fileName = os.path.splitext(args.csv)[0] + '.bin'
+    writeFrameSeries(fileName, frames)
+    print('%s: %d frames of %d trials' % (fileName, len(frames), len(FrameSeries(fileName))))
+
+
+def show(args):
+    frameSeries = FrameSeries(args.file)
+    trials = frameSeries.trials[frameSeries.select(args.block, args.trial, args.soa, args.lr)]
+    frames = frameSeries.read(args.block, args.trial, args.soa, args.lr)
+    print('%d of %d trials, %d frames' % (len(trials), len(frameSeries), len(frames)))
+    print(','.join(frameDtype.names))
+    for frame in frames.tolist():
+        print(','.join(str(value) for value in frame))
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Read and convert frame-series files')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    command = commands.add_parser('convert', help='convert a csv frame series of an earlier version to .bin/.idx')
+    command.add_argument('csv', help='<session>_frameseries-exp.csv or -pract.csv')
+    command.add_argument('dataFile', help='data file of the session (<session>.csv)')
+    command.add_argument('--phase', choices=['exp', 'practice'], default=None,
+                         help='phase of the frame series (default: from the file name)')
+    command.set_defaults(handler=convert)
+    command = commands.add_parser('show', help='print the frames of selected trials as csv')
+    command.add_argument('file', help='<session>_frameseries-exp.bin')
+    command.add_argument('--block', type=int, nargs='+', default=None)
+    command.add_argument('--trial', type=int, nargs='+', default=None)
+    command.add_argument('--soa', type=int, nargs='+', default=None, help='SOA (frames)')
+    command.add_argument('--lr', type=int, nargs='+', default=None, help='-1 L first, 1 R first, 0 simultaneous')
+    command.set_defaults(handler=show)
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
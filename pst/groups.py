@@ -0,0 +1,256 @@
+# Perceptual Simultaneity Task - group comparison (TD vs ASD)
+###################################################################################
+# Compares the diagnosis groups on the trials table of an ingested store (pst ingest).
+# Every subject (all their sessions pooled) gets
+#   width, PSS         window fit of their experimental trials (pst.fitting, all subjects
+#                      fitted in one batch; trials with dropped frames left out)
+#   accuracy           share of correct responses, overall and per SOA
+# with the SOAs in ms (frames / refresh rate of each session), so sessions run at different
+# refresh rates are pooled on the same scale
+# and the groups are compared on the difference of the group means (second group minus
+# first, e.g. ASD - TD) with
+#   - a permutation test: the diagnosis labels are shuffled nPerm times, two-sided
+#     p = (1 + #|permuted difference| >= |observed|) / (1 + nPerm); for the accuracy per
+#     SOA also the family-wise p (maximum |difference| over the SOAs in every permutation)
+#   - a bootstrap percentile CI: subjects resampled with replacement within each group
+# Every resample is a row of a label (or resampling-weight) matrix, and the group means of
+# all rows are two matrix products with the subject values. Resamples are processed in
+# chunks of at most maxElements / nSubjects rows, so memory stays bounded however many
+# resamples or subjects there are. Subjects with a failed fit are left out of that measure.
+#
+#   python -m pst.groups store [--groups TD ASD] [--perm 10000] [--boot 10000] [--json out.json]
+###################################################################################
+
+import argparse
+import json
+
+import numpy as np
+
+from pst.conditions import designRefreshRate
+from pst.fitting import fitCounts
+from pst.ingest import loadTable
+
+
+# ------------------------------------------
+# Per-subject values from a trials table (column dictionary): the subjects, their diagnosis,
+# age, gender and handedness, the measure names and a (nSubjects, nMeasures) value matrix
+def subjectMeasures(trials, model='dualLogistic'):
+    keep = (trials['phase'] == 'exp') & np.isin(trials['subjResp'], ['c', 'm'])
+    fitKeep = keep & (trials['timingQuality'] != 'dropped')
+    subjects, subjectIndex = np.unique(trials['subject'], return_inverse=True)
+    if not keep.any():
+        raise ValueError('no experimental trials with a response in the trials table')
+    if 'refreshRate' not in trials:
+        raise ValueError('the trials table has no refreshRate column (written by an earlier pst ingest; run it again)')
+    nSubjects = subjects.size
+
+    # SOA frames -> ms; sessions whose data file has no refresh rate ran the original 120 Hz design.
+    # The fit runs on the frame scale of that design (frames at 120 Hz, so the ridge penalty of
+    # pst.fitting acts as it does in pst fit) and width and PSS are converted to ms.
+    rate = np.where(np.isnan(trials['refreshRate']), designRefreshRate, trials['refreshRate'])
+    soaMs = np.round(trials['SOA'] * 1000.0 / rate, 3)
+    designFrames = 1000.0 / designRefreshRate
+
+    # "c" counts per subject and signed SOA, fitted as one batch
+    signed = soaMs * trials['L_R'].astype(int) / designFrames
+    levels, levelIndex = np.unique(signed[fitKeep], return_inverse=True)
+    cells = subjectIndex[fitKeep] * levels.size + levelIndex
+    n = np.bincount(cells, minlength=nSubjects * levels.size).reshape(nSubjects, levels.size).astype(float)
+    k = np.bincount(cells, weights=(trials['subjResp'][fitKeep] == 'c'),
+                    minlength=nSubjects * levels.size).reshape(nSubjects, levels.size)
+    with np.errstate(all='ignore'):
+        fit = fitCounts(model, levels, n, k)
+    noTrials = (n.sum(axis=1) == 0)
+
+    # accuracy overall and per SOA
+    correct = (trials['subjResp'] == trials['corrResp'])[keep]
+    soas, soaIndex = np.unique(soaMs[keep], return_inverse=True)
+    cells = subjectIndex[keep] * soas.size + soaIndex
+    nSOA = np.bincount(cells, minlength=nSubjects * soas.size).reshape(nSubjects, soas.size)
+    hits = np.bincount(cells, weights=correct, minlength=nSubjects * soas.size).reshape(nSubjects, soas.size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        accuracy = hits.sum(axis=1) / nSOA.sum(axis=1)
+        accuracyBySOA = hits / nSOA
+
+    names = ['width', 'PSS', 'accuracy'] + ['accuracy SOA %.1f' % soa for soa in soas]
+    values = np.column_stack([np.where(noTrials, np.nan, fit['width'] * designFrames),
+                              np.where(noTrials, np.nan, fit['PSS'] * designFrames), accuracy, accuracyBySOA])
+    values[~np.isfinite(values)] = np.nan
+
+    # subject details (from their first row)
+    first = np.unique(subjectIndex, return_index=True)[1]
+    details = {name: trials[name][first] for name in ('diagnosis', 'age', 'gender', 'handedness') if name in trials}
+    return {'subjects': subjects, 'details': details, 'names': names, 'values': values,
+            'soaColumns': np.arange(3, len(names)), 'nTrials': np.bincount(subjectIndex[keep], minlength=nSubjects),
+            'refreshRates': np.unique(rate[keep])}
+
+
+def chunkRows(nRows, nSubjects, maxElements):
+    size = max(1, maxElements // max(1, nSubjects))
+    for start in range(0, nRows, size):
+        yield min(size, nRows - start)
+
+
+# ------------------------------------------
+# Group means of every row of a (nRows, nSubjects) weight matrix, per measure; NaN values carry no weight
+def weightedMeans(weights, values):
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(valid, values, 0.0)) / (weights @ valid)
+
+
+# ------------------------------------------
+# Permutation test of the difference of group means (inGroup2 minus the rest) for every measure;
+# familyColumns: measures whose family-wise p comes from the maximum |difference| among them
+def permutationTest(values, inGroup2, nPerm=10000, seed=None, maxElements=2 ** 22, familyColumns=None):
+    rng = np.random.default_rng(seed)
+    inGroup2 = np.asarray(inGroup2, dtype=bool)
+    observed = weightedMeans(inGroup2[np.newaxis].astype(float), values)[0] - \
+        weightedMeans((~inGroup2)[np.newaxis].astype(float), values)[0]
+    exceed = np.zeros(values.shape[1])
+    exceedFamily = np.zeros(values.shape[1])
+    familyColumns = np.asarray([] if familyColumns is None else familyColumns, dtype=int)
+    for size in chunkRows(nPerm, len(inGroup2), maxElements):
+        labels = rng.permuted(np.broadcast_to(inGroup2, (size, len(inGroup2))), axis=1).astype(float)
+        differences = weightedMeans(labels, values) - weightedMeans(1 - labels, values)
+        with np.errstate(invalid='ignore'):
+            exceed += (np.abs(differences) >= np.abs(observed) - 1e-12).sum(axis=0)
+            if familyColumns.size:
+                largest = np.nanmax(np.abs(differences[:, familyColumns]), axis=1)
+                exceedFamily[familyColumns] += (largest[:, np.newaxis] >= np.abs(observed[familyColumns]) - 1e-12).sum(axis=0)
+    p = (1 + exceed) / (1 + nPerm)
+    pFamily = np.where(np.isin(np.arange(values.shape[1]), familyColumns), (1 + exceedFamily) / (1 + nPerm), np.nan)
+    p[np.isnan(observed)] = np.nan
+    return observed, p, pFamily
+
+
+# ------------------------------------------
+# Bootstrap percentile CI of the difference of group means: subjects resampled with replacement
+# within each group (multinomial resampling weights)
+def bootstrapDifference(values, inGroup2, nBoot=10000, ci=0.95, seed=None, maxElements=2 ** 22):
+    rng = np.random.default_rng(seed)
+    inGroup2 = np.asarray(inGroup2, dtype=bool)
+    groups = [np.flatnonzero(~inGroup2), np.flatnonzero(inGroup2)]
+    differences = []
+    for size in chunkRows(nBoot, len(inGroup2), maxElements):
+        means = []
+        for members in groups:
+            weights = rng.multinomial(members.size, np.full(members.size, 1 / members.size), size=size).astype(float)
+            means.append(weightedMeans(weights, values[members]))
+        differences.append(means[1] - means[0])
+    differences = np.concatenate(differences)
+    alpha = (1 - ci) / 2
+    with np.errstate(invalid='ignore'):
+        low, high = (np.nanquantile(differences, [alpha, 1 - alpha], axis=0) if np.isfinite(differences).any()
+                     else (np.full(values.shape[1], np.nan),) * 2)
+    return low, high
+
+
+def _describe(values):
+    n = (~np.isnan(values)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(values, axis=0) / n
+        sd = np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (n - 1))
+    return n, mean, sd
+
+
+# ------------------------------------------
+# Compare two diagnosis groups on the trials table; returns one row per measure plus the group composition
+def compareGroups(trials, groups=('TD', 'ASD'), model='dualLogistic', nPerm=10000, nBoot=10000, ci=0.95, seed=None,
+                  maxElements=2 ** 22):
+    measures = subjectMeasures(trials, model=model)
+    diagnosis = measures['details']['diagnosis']
+    member = np.isin(diagnosis, groups)
+    inGroup2 = diagnosis[member] == groups[1]
+    counts = [int((diagnosis == group).sum()) for group in groups]
+    if min(counts) < 2:
+        raise ValueError('each group needs at least 2 subjects (%s)'
+                         % ', '.join('%s: %d' % item for item in zip(groups, counts)))
+    values = measures['values'][member]
+
+    seeds = np.random.SeedSequence(seed).spawn(2)
+    observed, p, pFamily = permutationTest(values, inGroup2, nPerm=nPerm, seed=seeds[0], maxElements=maxElements,
+                                           familyColumns=measures['soaColumns'])
+    low, high = bootstrapDifference(values, inGroup2, nBoot=nBoot, ci=ci, seed=seeds[1], maxElements=maxElements)
+    n1, mean1, sd1 = _describe(values[~inGroup2])
+    n2, mean2, sd2 = _describe(values[inGroup2])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooledSD = np.sqrt(((n1 - 1) * sd1 ** 2 + (n2 - 1) * sd2 ** 2) / (n1 + n2 - 2))
+        hedgesG = observed / pooledSD * (1 - 3 / (4 * (n1 + n2) - 9))
+
+    rows = []
+    for n, name in enumerate(measures['names']):
+        rows.append({'measure': name, 'n': [int(n1[n]), int(n2[n])], 'mean': [float(mean1[n]), float(mean2[n])],
+                     'sd': [float(sd1[n]), float(sd2[n])], 'difference': float(observed[n]),
+                     'ci': [float(low[n]), float(high[n])], 'p': float(p[n]), 'pFamily': float(pFamily[n]),
+                     'hedgesG': float(hedgesG[n])})
+
+    composition = {}
+    details = measures['details']
+    for group in groups:
+        inGroup = diagnosis == group
+        ages = np.array([float(age) if age.replace('.', '', 1).isdigit() else np.nan for age in details['age'][inGroup]])
+        composition[group] = {'subjects': int(inGroup.sum()),
+                              'age': [float(np.nanmean(ages)), float(np.nanstd(ages))] if np.isfinite(ages).any()
+                              else None,
+                              'gender': {value: int(count) for value, count in
+                                         zip(*np.unique(details['gender'][inGroup], return_counts=True))},
+                              'handedness': {value: int(count) for value, count in
+                                             zip(*np.unique(details['handedness'][inGroup], return_counts=True))},
+                              'trials': int(measures['nTrials'][member][diagnosis[member] == group].sum())}
+    return {'groups': list(groups), 'model': model, 'nPerm': nPerm, 'nBoot': nBoot, 'ciLevel': ci,
+            'refreshRates': [float(rate) for rate in measures['refreshRates']], 'composition': composition,
+            'measures': rows}
+
+
+def formatComparison(result):
+    group1, group2 = result['groups']
+    lines = []
+    for group in result['groups']:
+        c = result['composition'][group]
+        lines.append('%-4s %d subjects, %d trials, age %s, gender %s, handedness %s'
+                     % (group, c['subjects'], c['trials'], '%.1f (SD %.1f)' % tuple(c['age']) if c['age'] else '-',
+                        c['gender'], c['handedness']))
+    lines.append('%s - %s: %d permutations, %d%% bootstrap CI from %d resamples (%s fit, SOA in ms, sessions at %s Hz)'
+                 % (group2, group1, result['nPerm'], round(result['ciLevel'] * 100), result['nBoot'], result['model'],
+                    ', '.join('%g' % rate for rate in result['refreshRates'])))
+    lines.append('  %-18s %16s %16s %9s %19s %7s %7s %6s' % ('measure', group1 + ' mean (SD)', group2 + ' mean (SD)',
+                                                             'diff', 'CI', 'p', 'p FWE', 'g'))
+    for row in result['measures']:
+        lines.append('  %-18s %7.3f (%6.3f) %7.3f (%6.3f) %9.3f [%8.3f, %8.3f] %7.4f %7s %6.2f'
+                     % (row['measure'], row['mean'][0], row['sd'][0], row['mean'][1], row['sd'][1], row['difference'],
+                        row['ci'][0], row['ci'][1], row['p'],
+                        '%.4f' % row['pFamily'] if row['pFamily'] == row['pFamily'] else '', row['hedgesG']))
+    return '\n'.join(lines)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Compare diagnosis groups on an ingested store')
+    parser.add_argument('store', help='store directory written by pst ingest')
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz')
+    parser.add_argument('--groups', nargs=2, default=['TD', 'ASD'], metavar=('GROUP1', 'GROUP2'),
+                        help='diagnoses to compare (differences are GROUP2 - GROUP1)')
+    parser.add_argument('--model', choices=['dualLogistic', 'gaussian'], default='dualLogistic')
+    parser.add_argument('--perm', type=int, default=10000, help='number of permutations')
+    parser.add_argument('--boot', type=int, default=10000, help='number of bootstrap resamples')
+    parser.add_argument('--ci', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    trials = loadTable(args.store, 'trials', args.format)
+    if not trials:
+        parser.error('no trials table in %s (run pst ingest first)' % args.store)
+    try:
+        result = compareGroups(trials, groups=tuple(args.groups), model=args.model, nPerm=args.perm, nBoot=args.boot,
+                               ci=args.ci, seed=args.seed)
+    except ValueError as error:  # too few subjects in a group, no usable trials, store of an earlier ingest
+        parser.error(str(error))
+    print(formatComparison(result))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
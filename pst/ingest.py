@@ -0,0 +1,314 @@
+# Perceptual Simultaneity Task - batch ingestion of the data directory
+###################################################################################
+# Every session leaves files named by expName2_ID_Diagnosis_date:
+#   data/<session>.csv                                   wide-text trial data (ExperimentHandler)
+#   data/<session>.log                                   PsychoPy log
+#   data/<session>_timing.json                           flip timing summary (optional)
+#   data/frameseries/<session>_frameseries-pract.bin     frame series of the practice trials (and .idx)
+#   data/frameseries/<session>_frameseries-exp.bin       frame series of the experimental trials (and .idx)
+# (frame series written as .csv by earlier versions are read too)
+# Sessions are parsed in a process pool and normalized into three columnar tables
+# (trials, frames, sessions) with subject and diagnosis metadata, stored as .npz (or
+# .parquet when pyarrow is installed). The metadata includes the refresh rate and response
+# mode from ExpInfo (NaN and '' for data files that do not record them): the SOA column
+# counts frames, so its duration in ms depends on the refresh rate of the session.
+# A manifest records the size and modification time of every ingested file, so a rerun
+# only parses new or changed sessions; a store written by an earlier version of the
+# tables (storeVersion) is parsed again as a whole.
+#
+#   python -m pst.ingest data store [--format parquet] [--workers 4]
+###################################################################################
+
+import argparse
+import ast
+import csv
+import glob
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pst.frameseries import FrameSeries, readFrameSeriesCSV, frameDtype
+
+tableNames = ('trials', 'frames', 'sessions')
+manifestName = 'ingested.json'
+storeVersion = 2
+resumedSuffix = re.compile(r'(.+)_(\d+)$')
+frameSeriesSuffixes = {'_frameseries-pract': 'practice', '_frameseries-exp': 'exp'}
+
+
+# ------------------------------------------
+# Split a session name into its expName2, ID, Diagnosis and date parts
+def parseSessionName(session):
+    parts = session.split('_', 3)
+    if len(parts) < 4:
+        raise ValueError('not a session name (expName2_ID_Diagnosis_date): %r' % session)
+    return {'experiment': parts[0], 'subject': parts[1], 'diagnosis': parts[2], 'date': parts[3]}
+
+
+# ------------------------------------------
+# Find the files of every session in a data directory, keyed by session name
+def findSessions(dataDir):
+    dataFiles = {os.path.splitext(os.path.basename(path))[0]: path
+                 for path in glob.glob(os.path.join(dataDir, '*.csv'))}
+    # earlier versions saved a resumed session as <session>_1.csv (_2, ... after further resumes) next to the
+    # partial <session>.csv of the interrupted run; the last of them holds the whole session
+    resumed = sorted((int(match.group(2)), match.group(1), match.group(0))
+                     for match in map(resumedSuffix.match, dataFiles) if match)
+    for n, session, name in resumed:
+        if session in dataFiles:
+            dataFiles[session] = dataFiles.pop(name)
+    sessions = {}
+    for session, path in dataFiles.items():
+        files = {'trials': path}
+        for kind, suffix in (('log', '.log'), ('timing', '_timing.json')):
+            if os.path.exists(os.path.join(dataDir, session + suffix)):
+                files[kind] = os.path.join(dataDir, session + suffix)
+        for suffix, phase in frameSeriesSuffixes.items():
+            for extension in ('.bin', '.csv'):
+                path = os.path.join(dataDir, 'frameseries', session + suffix + extension)
+                if os.path.exists(path):
+                    files['frames-' + phase] = path
+                    break
+        sessions[session] = files
+    return sessions
+
+
+def _fileStamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _number(value, default=np.nan):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# ------------------------------------------
+# ExpInfo dictionary of a data file; NaN and inf (e.g. a failed display measurement) are written
+# as bare names that literal_eval does not accept, so they are read as None
+def _expInfo(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        try:
+            return ast.literal_eval(re.sub(r'-?\b(nan|inf)\b', 'None', text))
+        except (ValueError, SyntaxError):
+            return {}
+
+
+# ------------------------------------------
+# Trial rows (column lists in presentation order), subject details and accuracy of a data file
+def readDataFile(fileName):
+    subjectInfo = {'age': '', 'gender': '', 'handedness': '', 'refreshRate': np.nan, 'responses': ''}
+    trials = {name: [] for name in ('phase', 'block', 'trial', 'SOA', 'L_R', 'corrResp', 'subjResp', 'respRT',
+                                    'respDuringStimulus', 'timingQuality', 'droppedFrames')}
+    pendingRows = []  # experimental trial rows waiting for the block row that follows them
+    accuracy = np.nan
+
+    with open(fileName, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            if row.get('ExpInfo'):
+                expInfo = _expInfo(row['ExpInfo'])
+                subject = expInfo.get('subjectID', [])
+                for n, name in ((2, 'age'), (3, 'gender'), (4, 'handedness')):
+                    if len(subject) > n:
+                        subjectInfo[name] = str(subject[n])
+                subjectInfo['refreshRate'] = _number(expInfo.get('refreshRate'))
+                subjectInfo['responses'] = str(expInfo.get('responses', ''))
+            if row.get('Accuracy %'):
+                accuracy = _number(row['Accuracy %'])
+            if row.get('Practice Trial Number'):
+                pendingRows.append(('practice', 0, row))
+            elif row.get('Trial Number'):
+                pendingRows.append(('exp', None, row))
+            elif row.get('Block Number'):
+                block = int(_number(row['Block Number'], 0))
+                pendingRows = [(phase, block if phase == 'exp' else 0, trialRow)
+                               for phase, blockN, trialRow in pendingRows]
+                _addTrialRows(trials, pendingRows)
+                pendingRows = []
+    _addTrialRows(trials, [(phase, -1 if blockN is None else blockN, row) for phase, blockN, row in pendingRows])
+    return trials, subjectInfo, accuracy
+
+
+# ------------------------------------------
+# Parse all files of one session into columns (runs in a worker process)
+def parseSession(session, files):
+    meta = parseSessionName(session)
+    trials, subjectInfo, accuracy = readDataFile(files['trials'])
+    meta.update(subjectInfo)
+
+    phases, records = [], []
+    for phase in ('practice', 'exp'):
+        path = files.get('frames-' + phase)
+        if path is None:
+            continue
+        if path.endswith('.bin'):
+            records.append(FrameSeries(path).read())
+        else:
+            records.append(readFrameSeriesCSV(path, files['trials'], phase))
+        phases.append(np.full(len(records[-1]), phase))
+    records = np.concatenate(records) if records else np.zeros(0, dtype=frameDtype)
+    frames = {'phase': np.concatenate(phases) if phases else np.zeros(0, dtype=str)}
+    frames.update({name: records[name] for name in frameDtype.names})
+
+    nWarnings = nErrors = 0
+    if 'log' in files:
+        with open(files['log'], encoding='utf-8', errors='replace') as f:
+            for line in f:
+                fields = line.split('\t')
+                if len(fields) > 1:
+                    level = fields[1].strip()
+                    nWarnings = nWarnings + (level == 'WARNING')
+                    nErrors = nErrors + (level in ('ERROR', 'CRITICAL'))
+    droppedFrames = -1
+    if 'timing' in files:
+        with open(files['timing']) as f:
+            droppedFrames = json.load(f).get('droppedFrames', -1)
+
+    phases = trials['phase']
+    sessionRow = dict(meta, session=session, nPracticeTrials=phases.count('practice'),
+                      nTrials=phases.count('exp'), nFrames=len(frames['nFrame']), accuracy=accuracy,
+                      droppedFrames=droppedFrames, nWarnings=nWarnings, nErrors=nErrors)
+    return session, trials, frames, sessionRow
+
+
+def _addTrialRows(trials, rows):
+    for phase, block, row in rows:
+        trials['phase'].append(phase)
+        trials['block'].append(block)
+        trials['trial'].append(int(_number(row.get('Trial Number') or row.get('Practice Trial Number'), -1)))
+        trials['SOA'].append(int(_number(row.get('SOA'), -1)))
+        trials['L_R'].append(int(_number(row.get('L_R'), 0)))
+        trials['corrResp'].append(row.get('corrResp', ''))
+        trials['subjResp'].append(row.get('subjResp', ''))
+        trials['respRT'].append(_number(row.get('respRT')))
+        trials['respDuringStimulus'].append(int(_number(row.get('respDuringStimulus'), -1)))
+        trials['timingQuality'].append(row.get('timingQuality', ''))
+        trials['droppedFrames'].append(int(_number(row.get('droppedFrames'), -1)))
+
+
+# ------------------------------------------
+# Column dictionaries -> NumPy arrays, with the session metadata repeated on every row
+metaColumns = ('session', 'subject', 'diagnosis', 'age', 'gender', 'handedness', 'date', 'refreshRate', 'responses')
+columnTypes = {'block': np.int16, 'trial': np.int32, 'SOA': np.int16, 'L_R': np.int8, 'respRT': np.float64,
+               'respDuringStimulus': np.int8, 'droppedFrames': np.int32, 'nFrame': np.int16, 't': np.float64,
+               'lumL': np.float32, 'lumR': np.float32, 'nFrames': np.int32, 'nPracticeTrials': np.int32,
+               'nTrials': np.int32, 'accuracy': np.float64, 'nWarnings': np.int32, 'nErrors': np.int32,
+               'refreshRate': np.float64}
+
+
+def _toArrays(columns):
+    return {name: np.asarray(values, dtype=columnTypes.get(name, str)) for name, values in columns.items()}
+
+
+def _withMeta(columns, sessionRow):
+    n = len(next(iter(columns.values())))
+    table = {name: [sessionRow[name]] * n for name in metaColumns}
+    table.update(columns)
+    return table
+
+
+def _concat(tables):
+    tables = [table for table in tables if table]
+    if not tables:
+        return {}
+    return {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+
+
+def _tablePath(storeDir, name, fmt):
+    return os.path.join(storeDir, name + ('.parquet' if fmt == 'parquet' else '.npz'))
+
+
+def loadTable(storeDir, name, fmt='npz'):
+    path = _tablePath(storeDir, name, fmt)
+    if not os.path.exists(path):
+        return {}
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {column: table.column(column).to_numpy() for column in table.column_names}
+    with np.load(path) as npz:
+        return {column: npz[column] for column in npz.files}
+
+
+def saveTable(storeDir, name, table, fmt='npz'):
+    path = _tablePath(storeDir, name, fmt)
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table({column: values for column, values in table.items()}), path + '.tmp')
+    else:
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **table)
+    os.replace(path + '.tmp', path)
+
+
+# ------------------------------------------
+# Ingest new or changed sessions of dataDir into storeDir
+def ingest(dataDir, storeDir, fmt='npz', workers=None):
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError('the parquet format needs pyarrow (pip install pyarrow); use the npz format instead')
+    os.makedirs(storeDir, exist_ok=True)
+    manifestPath = os.path.join(storeDir, manifestName)
+    manifest = {}
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+        if manifest.get('format', fmt) != fmt:
+            raise ValueError('store %s was written as %s' % (storeDir, manifest['format']))
+    current = manifest.get('version', 1) == storeVersion  # tables of an earlier version are replaced
+
+    sessions = findSessions(dataDir)
+    ingested = manifest.get('sessions', {}) if current else {}
+    stamps = {session: {kind: _fileStamp(path) for kind, path in files.items()}
+              for session, files in sessions.items()}
+    todo = sorted(session for session in sessions if ingested.get(session) != stamps[session])
+    summary = {'sessions': len(sessions), 'parsed': len(todo), 'skipped': len(sessions) - len(todo)}
+    if not todo:
+        return summary
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(parseSession, todo, [sessions[session] for session in todo]))
+
+    new = {'trials': [], 'frames': [], 'sessions': []}
+    for session, trials, frames, sessionRow in results:
+        new['trials'].append(_toArrays(_withMeta(trials, sessionRow)))
+        new['frames'].append(_toArrays(_withMeta(frames, sessionRow)))
+        new['sessions'].append(_toArrays({name: [value] for name, value in sessionRow.items()}))
+
+    for name in tableNames:
+        old = loadTable(storeDir, name, fmt) if current else {}
+        if old:
+            keep = ~np.isin(old['session'], todo)  # re-parsed sessions replace their old rows
+            old = {column: values[keep] for column, values in old.items()}
+        saveTable(storeDir, name, _concat([old] + new[name]), fmt)
+
+    ingested.update({session: stamps[session] for session in todo})
+    with open(manifestPath + '.tmp', 'w') as f:
+        json.dump({'format': fmt, 'version': storeVersion, 'sessions': ingested}, f, indent=1)
+    os.replace(manifestPath + '.tmp', manifestPath)
+    return summary
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Ingest PST session files into a columnar store')
+    parser.add_argument('dataDir', help='data directory of the task (contains the csv/log files and frameseries/)')
+    parser.add_argument('storeDir', help='output directory for the trials, frames and sessions tables')
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+    summary = ingest(args.dataDir, args.storeDir, fmt=args.format, workers=args.workers)
+    print('%(sessions)d sessions: %(parsed)d parsed, %(skipped)d already ingested' % summary)
+
+
+if __name__ == '__main__':
+    main()
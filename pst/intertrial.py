@@ -0,0 +1,75 @@
+# Perceptual Simultaneity Task - frame-locked inter-trial interval
+###################################################################################
+# The fixation before every stimulus is shown for a whole number of frames (the ITI
+# in ms rounded to frames of the measured refresh rate, optionally with a seeded
+# uniform jitter of +- jitterMs), instead of sleeping with core.wait(), so the ITI
+# cannot drift. Work that does not have to happen right after a trial (handing the
+# frame series to its writer, setting the bar colours of the next trial, garbage
+# collection) is deferred to the fixation frames: the garbage collection runs after
+# the first flip, then one deferred task per frame, and whatever is still queued
+# after the last-but-one flip. Nothing is pending when the stimulus starts.
+#
+# Before the first ITI everything alive (PsychoPy, the stimuli, the session set-up) is
+# collected once and frozen (gc.freeze), so the collection in each ITI only scans the
+# objects created since and takes microseconds instead of a large part of a frame.
+# close() (at the end of the session) unfreezes them again.
+###################################################################################
+
+import collections
+import gc
+
+import numpy as np
+
+
+class InterTrialScheduler:
+
+    def __init__(self, win, refreshRate, durationMs=500.0, jitterMs=0.0, seed=None, collectGarbage=True):
+        self.win = win
+        self.nFrames = max(2, int(round(durationMs * refreshRate / 1000)))
+        self.jitterFrames = int(round(jitterMs * refreshRate / 1000))
+        self.collectGarbage = collectGarbage
+        self._rng = np.random.default_rng(seed)
+        self._tasks = collections.deque()
+        self._frozen = False
+
+    # run task(*args) during the next inter-trial interval
+    def defer(self, task, *args):
+        self._tasks.append((task, args))
+
+    def _runTask(self):
+        task, args = self._tasks.popleft()
+        task(*args)
+
+    # run every deferred task now (e.g. before the session ends)
+    def drain(self):
+        while self._tasks:
+            self._runTask()
+
+    # ------------------------------------------
+    # present the fixation for the next inter-trial interval and run the deferred work between its flips
+    # returns the time of the last fixation flip and the number of fixation frames
+    def run(self, drawFixation):
+        if self.collectGarbage and not self._frozen:
+            gc.collect()
+            gc.freeze()
+            self._frozen = True
+        nFrames = self.nFrames
+        if self.jitterFrames:
+            nFrames = max(2, nFrames + int(self._rng.integers(-self.jitterFrames, self.jitterFrames + 1)))
+        for frame in range(nFrames):
+            drawFixation()
+            t = self.win.flip()
+            if frame == 0 and self.collectGarbage:
+                gc.collect()
+            elif frame < nFrames - 2 and self._tasks:
+                self._runTask()
+            if frame == nFrames - 2:
+                self.drain()
+        return t, nFrames
+
+    # run what is still deferred and give the frozen objects back to the garbage collector
+    def close(self):
+        self.drain()
+        if self._frozen:
+            gc.unfreeze()
+            self._frozen = False
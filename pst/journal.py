@@ -0,0 +1,117 @@
+# Perceptual Simultaneity Task - crash-safe trial journal
+###################################################################################
+# Every entry passed to thisExp.nextEntry() is appended to <session>_journal.jsonl as
+# one JSON line and flushed to the OS right away, so a crash or core.quit() loses
+# nothing. fsync, which protects against a power cut, runs on a writer thread every
+# syncEvery entries and at the end of every block. mirror (e.g. CoordinatorClient.send
+# of pst.coordinator) gets every record as well.
+#
+# records
+#   {'record': 'session', ...}            session name, subject, expInfo, seed and design options
+#   {'record': 'entry', 'phase', 'block', 'entry'}   one row of the data file
+#   {'record': 'practiceDone'}            the practice block is complete
+#   {'record': 'blockDone', 'block', 'frameSeriesSize'}   experimental block is complete
+#   {'record': 'resumed', 'fromBlock'}    the session was resumed; entries of unfinished blocks before it are void
+###################################################################################
+
+import atexit
+import json
+import os
+
+from pst.writer import BackgroundWriter
+
+journalSuffix = '_journal.jsonl'
+
+
+# default of json.dumps for the values it cannot write: numpy scalars and arrays become numbers and lists,
+# anything else its str()
+def jsonValue(value):
+    if hasattr(value, 'tolist'):  # numpy arrays and scalars (.item() fails on arrays of more than one value)
+        return value.tolist()
+    return str(value)
+
+
+class TrialJournal:
+
+    def __init__(self, fileName, syncEvery=10, mirror=None):
+        os.makedirs(os.path.dirname(os.path.abspath(fileName)), exist_ok=True)
+        self.fileName = fileName
+        self.syncEvery = syncEvery
+        self.mirror = mirror
+        self._file = open(fileName, 'a', encoding='utf-8')
+        self._writer = BackgroundWriter(name='journal')
+        self._unsynced = 0
+        self._closed = False
+        atexit.register(self.close)
+
+    def write(self, record):
+        self._file.write(json.dumps(record, default=jsonValue) + '\n')
+        self._file.flush()
+        if self.mirror is not None:
+            self.mirror(record)
+        self._unsynced = self._unsynced + 1
+        if self._unsynced >= self.syncEvery:
+            self.sync()
+
+    # fsync on the writer thread
+    def sync(self):
+        self._writer.submit(os.fsync, self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        try:
+            self.sync()
+            self._writer.close()
+        finally:
+            self._file.close()
+
+
+# ------------------------------------------
+# Read a journal; a torn last line (crash in the middle of a write) is ignored
+def readJournal(fileName):
+    records = []
+    with open(fileName, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+# ------------------------------------------
+# What a resumed session needs from the journal: the session record, the entries of every
+# completed unit (session rows, practice block, experimental blocks), whether the practice
+# is done, the completed blocks and the frame-series size at the end of the last one.
+# Session rows written after the trials started (the end-of-session summary) are left out:
+# the resumed session writes its summary again when it ends.
+def resumeState(records):
+    if not records or records[0].get('record') != 'session':
+        raise ValueError('not a session journal')
+    state = {'session': records[0], 'entries': [], 'practiceDone': False, 'blocksDone': 0, 'frameSeriesSize': None}
+    pending = []  # entries of the unit that is still running
+    started = False  # a practice or experimental trial was recorded
+    for record in records[1:]:
+        kind = record.get('record')
+        if kind == 'entry':
+            if record['phase'] != 'session':
+                pending.append(record)
+                started = True
+            elif not started:
+                state['entries'].append(record)
+        elif kind == 'practiceDone':
+            state['entries'].extend(pending)
+            state['practiceDone'] = True
+            pending = []
+        elif kind == 'blockDone':
+            state['entries'].extend(pending)
+            state['blocksDone'] = record['block']
+            state['frameSeriesSize'] = record['frameSeriesSize']
+            pending = []
+        elif kind == 'resumed':
+            pending = []
+    return state
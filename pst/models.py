@@ -0,0 +1,13 @@
+# Perceptual Simultaneity Task - observer model
+###################################################################################
+# The simultaneity window shared by the adaptive procedure and the simulated
+# participant: probability of answering "c" (simultaneous) for a signed SOA
+# (negative = L first), a Gaussian window around the bias with a lapse rate.
+###################################################################################
+
+import numpy as np
+
+
+def windowProbability(signedSOA, width, bias=0.0, lapse=0.0):
+    window = np.exp(-0.5 * ((np.asarray(signedSOA, dtype=float) - bias) / width) ** 2)
+    return lapse / 2 + (1 - lapse) * window
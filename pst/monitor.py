@@ -0,0 +1,145 @@
+# Perceptual Simultaneity Task - live session monitor
+###################################################################################
+# Serves a small page on http://127.0.0.1:<port>/ that shows, while the session runs,
+# the current phase / block / trial, the time since the last trial, accuracy per block
+# (with a flag when it is within 2 SE of chance), the RT distribution and the frame
+# timing (dropped frames, trials with timing problems).
+#
+# The session thread only appends one tuple per trial and rebinds the status dict
+# between trials; it never takes a lock, formats anything or waits for the server.
+# Everything else runs on the daemon threads of the HTTP server: summaries are
+# computed on request and cached for minInterval seconds, so clients polling faster
+# (the page polls every 2 s) cannot add load. The standard library has no WebSocket
+# server, so the page polls /state (JSON) instead.
+###################################################################################
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+rtBinEdges = [0.0, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.5, 2.0, 3.0]  # s; the last bin collects the rest
+
+page = b'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>PST monitor</title>
+<style>body{font-family:sans-serif;margin:2em}td,th{padding:2px 10px;text-align:right}
+.warn{color:#b00;font-weight:bold}pre{font-size:14px}</style></head>
+<body><h2>Perceptual Simultaneity Task</h2><div id="status">waiting for the session...</div>
+<h3>Blocks</h3><table id="blocks"></table><h3>RT distribution</h3><pre id="rt"></pre>
+<script>
+function row(cells, tag){return '<tr>' + cells.map(c => '<' + tag + '>' + c + '</' + tag + '>').join('') + '</tr>';}
+async function poll(){
+  try{
+    const s = await (await fetch('/state')).json();
+    const st = s.status;
+    const idle = st.time ? (Date.now() / 1000 - st.time).toFixed(0) : '-';
+    document.getElementById('status').innerHTML =
+      'phase <b>' + (st.phase || '-') + '</b>, block <b>' + (st.block || '-') + '</b>, trial <b>' + (st.trial || '-') +
+      '</b>, last trial <b class="' + (idle > 10 ? 'warn' : '') + '">' + idle + ' s</b> ago<br>' +
+      'accuracy ' + (st.accuracy == null ? '-' : st.accuracy.toFixed(1) + ' %') + ' over ' + (st.trialsDone || 0) +
+      ' trials; <span class="' + (st.droppedFrames ? 'warn' : '') + '">' + (st.droppedFrames || 0) +
+      ' dropped frames</span> in ' + (st.badTrials || 0) + ' trials (last: ' + (st.timingQuality || '-') + ')';
+    document.getElementById('blocks').innerHTML = row(['block', 'trials', 'accuracy %', '"c" %', 'median RT', ''], 'th') +
+      s.blocks.map(b => row([b.block, b.trials, b.accuracy.toFixed(1), b.simultaneous.toFixed(1),
+                             b.medianRT == null ? '-' : b.medianRT.toFixed(3), b.nearChance ? '<span class="warn">near chance</span>' : ''], 'td')).join('');
+    const most = Math.max(1, ...s.rt.counts);
+    document.getElementById('rt').textContent = s.rt.counts.map((n, i) =>
+      s.rt.labels[i].padStart(11) + ' ' + '#'.repeat(Math.round(40 * n / most)) + ' ' + n).join('\\n');
+  }catch(e){document.getElementById('status').textContent = 'session not reachable';}
+}
+poll(); setInterval(poll, 2000);
+</script></body></html>
+'''
+
+
+# non-finite numbers (NaN, inf) become None, which JSON.parse on the page reads as null
+def _finite(value):
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+class SessionMonitor:
+
+    def __init__(self, port=8765, host='127.0.0.1', minInterval=1.0):
+        self.minInterval = minInterval
+        self._trials = []  # (phase, block, correct, simultaneous, rt), appended by the session thread
+        self._status = {}  # rebound (never changed in place) by the session thread
+        self._cache = (0.0, b'{}')
+        self._cacheLock = threading.Lock()  # only taken by server threads
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/state':
+                    body, contentType = monitor.stateJSON(), 'application/json'
+                elif self.path == '/':
+                    body, contentType = page, 'text/html; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', contentType)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # no stderr output during the session
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = 'http://%s:%d/' % self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='monitor', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------
+    # called by the session between trials
+    def recordTrial(self, phase, block, correct, simultaneous, rt):
+        self._trials.append((phase, block, bool(correct), bool(simultaneous), rt))
+
+    def setStatus(self, **status):
+        status['time'] = time.time()
+        self._status = status
+
+    # ------------------------------------------
+    # summary of the session so far (server threads)
+    def state(self):
+        trials = self._trials[:]
+        blocks = {}
+        for phase, block, correct, simultaneous, rt in trials:
+            key = 'practice' if phase == 'practice' else block
+            blocks.setdefault(key, []).append((correct, simultaneous, rt))
+        blockRows = []
+        for key, rows in blocks.items():
+            n = len(rows)
+            accuracy = sum(row[0] for row in rows) / n
+            rts = sorted(row[2] for row in rows if row[2] is not None)
+            blockRows.append({'block': key, 'trials': n, 'accuracy': 100 * accuracy,
+                              'simultaneous': 100 * sum(row[1] for row in rows) / n,
+                              'medianRT': rts[len(rts) // 2] if rts else None,
+                              'nearChance': n >= 20 and abs(accuracy - 0.5) < 2 * math.sqrt(0.25 / n)})
+        counts = [0] * len(rtBinEdges)
+        for phase, block, correct, simultaneous, rt in trials:
+            if rt is not None:
+                counts[sum(rt >= edge for edge in rtBinEdges[1:])] += 1
+        labels = ['%.1f-%.1f s' % edges for edges in zip(rtBinEdges, rtBinEdges[1:])] + ['>%.1f s' % rtBinEdges[-1]]
+        return {'status': self._status, 'blocks': blockRows, 'rt': {'labels': labels, 'counts': counts}}
+
+    def stateJSON(self):
+        with self._cacheLock:
+            cachedAt, body = self._cache
+            if time.monotonic() - cachedAt >= self.minInterval:
+                body = json.dumps(_finite(self.state()), allow_nan=False).encode()  # fails on a missed NaN
+                self._cache = (time.monotonic(), body)
+            return body
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,70 @@
+# Perceptual Simultaneity Task - real-time presentation mode
+###################################################################################
+# A bar sequence lasts only 5-25 frames (42-208 ms at 120 Hz); a garbage collection or
+# a preemption by another process in that time delays a flip and changes the SOA on
+# screen. With --realtime the session, before the refresh rate is measured,
+#   - turns the automatic (cyclic) garbage collection off: garbage is then collected
+#     only in the first frame of every inter-trial interval (pst.intertrial) and never
+#     while the bars are on screen or a response is timed
+#   - raises the priority of the process with core.rush
+#   - on Linux, pins the process to the CPUs given with --cpus (os.sched_setaffinity)
+# core.rush does not raise an error without the permission to raise the priority, it
+# returns False; what was actually applied goes to expInfo['realtime'], and everything
+# is restored when the session ends.
+###################################################################################
+
+import gc
+import os
+import sys
+
+
+def cpuPinningAvailable():
+    return hasattr(os, 'sched_setaffinity')
+
+
+class RealtimeMode:
+
+    # core: psychopy.core (or the simulated one); cpus: CPU numbers to pin the process to, or None
+    def __init__(self, core, cpus=None):
+        self.core = core
+        self.cpus = sorted(set(cpus)) if cpus else None
+        self.applied = None
+        self._gcWasEnabled = None
+        self._oldCpus = None
+
+    # ------------------------------------------
+    # apply the settings; returns what was applied (for expInfo)
+    def apply(self):
+        applied = {}
+        if self.cpus is not None:
+            if not cpuPinningAvailable():
+                raise ValueError('--cpus needs Linux (os.sched_setaffinity is not available on %s)' % sys.platform)
+            available = os.sched_getaffinity(0)
+            if not set(self.cpus) <= available:
+                raise ValueError('CPUs %s are not available to this process (available: %s)'
+                                 % (sorted(set(self.cpus) - available), sorted(available)))
+            self._oldCpus = available
+            os.sched_setaffinity(0, self.cpus)
+        applied['cpus'] = sorted(os.sched_getaffinity(0)) if cpuPinningAvailable() else None
+        applied['pinned'] = self.cpus is not None
+        applied['rush'] = bool(self.core.rush(True))
+
+        self._gcWasEnabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        applied['gcDisabled'] = True
+        self.applied = applied
+        return applied
+
+    # ------------------------------------------
+    # undo apply (at the end of the session)
+    def restore(self):
+        if self.applied is None:
+            return
+        if self._gcWasEnabled:
+            gc.enable()
+        if self.applied['rush']:
+            self.core.rush(False)
+        if self._oldCpus is not None:
+            os.sched_setaffinity(0, self._oldCpus)
+        self.applied = None
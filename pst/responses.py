@@ -0,0 +1,39 @@
+# Perceptual Simultaneity Task - response collection
+###################################################################################
+# Collects the 'c' / 'm' response with psychopy.hardware.keyboard while the stimulus
+# is still on screen. The keyboard clock is reset by the flip that shows the first
+# stimulus frame, so RTs are measured from stimulus onset with the key's hardware
+# timestamp (psychtoolbox backend), and polling never blocks the frame loop.
+###################################################################################
+
+
+class ResponseCollector:
+
+    # keyboard: the module providing Keyboard (psychopy.hardware.keyboard unless a simulated backend is used)
+    def __init__(self, win, keyList=('c', 'm'), keyboard=None):
+        if keyboard is None:
+            from psychopy.hardware import keyboard
+        self.win = win
+        self.keyList = list(keyList)
+        self.kb = keyboard.Keyboard()
+        self.key = None
+        self.rt = None
+
+    # call right before the flip of the first stimulus frame
+    def start(self):
+        self.key = None
+        self.rt = None
+        self.win.callOnFlip(self._onset)
+
+    def _onset(self):
+        self.kb.clock.reset()  # RTs are relative to the stimulus onset flip
+        self.kb.clearEvents(eventType='keyboard')
+
+    # non-blocking; returns True once a response has been recorded
+    def poll(self):
+        if self.key is None:
+            keys = self.kb.getKeys(keyList=self.keyList, waitRelease=False)
+            if keys:
+                self.key = keys[0].name
+                self.rt = keys[0].rt
+        return self.key is not None
@@ -0,0 +1,119 @@
+# Perceptual Simultaneity Task - session schedule
+###################################################################################
+# The whole trial order of a session (practice and every experimental block) is built
+# up front from one seed and stored as integer arrays of condition indices (rows of
+# the condition table):
+#   practice  (nPractice,)                     distinct conditions (SOA, L_R), no duplicates
+#   blocks    (nBlocks, nReps * nConditions)   every condition nReps times per block
+# Candidate orders are drawn as whole batches of permutations (argsort of a random
+# matrix) and checked with vectorized run-length and balance tests; the first valid
+# candidate of each batch is kept. Thousands of candidates take a few milliseconds.
+#
+# constraints
+#   maxSOARun         most trials in a row with the same SOA
+#   maxSideRun        most trials in a row with the same leading bar (L_R, SOA 0 breaks a run)
+#   maxHalfImbalance  most |L first - R first| within each half of a block (whole practice block)
+###################################################################################
+
+import numpy as np
+
+defaultConstraints = {'maxSOARun': 2, 'maxSideRun': 4, 'maxHalfImbalance': 2}
+
+
+# ------------------------------------------
+# Longest run of equal values in each row of a 2D array; where breaks is True the run
+# is broken even if the values are equal
+def longestRun(values, breaks=None):
+    same = values[:, 1:] == values[:, :-1]
+    if breaks is not None:
+        same = same & ~breaks[:, 1:] & ~breaks[:, :-1]
+    n = same.shape[1]
+    if n == 0:
+        return np.ones(values.shape[0], dtype=int)
+    position = np.arange(n)
+    lastBreak = np.maximum.accumulate(np.where(same, -1, position), axis=1)
+    return (position - lastBreak).max(axis=1) + 1
+
+
+# ------------------------------------------
+# Which candidate orders (rows of condition indices) satisfy the constraints
+def validOrders(table, orders, maxSOARun=None, maxSideRun=None, maxHalfImbalance=None, halves=True):
+    orders = np.atleast_2d(orders)
+    soa = table['SOA'][orders]
+    side = table['L_R'][orders].astype(int)
+    valid = np.ones(orders.shape[0], dtype=bool)
+    if maxSOARun is not None:
+        valid &= longestRun(soa) <= maxSOARun
+    if maxSideRun is not None:
+        valid &= longestRun(side, breaks=side == 0) <= maxSideRun
+    if maxHalfImbalance is not None:
+        parts = np.array_split(side, 2, axis=1) if halves else [side]
+        for part in parts:
+            valid &= np.abs(part.sum(axis=1)) <= maxHalfImbalance
+    return valid
+
+
+# Row of the first occurrence of every distinct (SOA, L_R) condition (SOA 0 has a row for
+# L_R 0 in both halves of the table)
+def distinctConditions(table):
+    pairs = np.stack([table['SOA'], table['L_R']], axis=1)
+    return np.sort(np.unique(pairs, axis=0, return_index=True)[1]).astype(np.int16)
+
+
+def _draw(rng, base, nCandidates, length, table, constraints, halves, batchSize):
+    for attempt in range(nCandidates // batchSize + 1):
+        orders = base[rng.random((batchSize, base.size)).argsort(axis=1)[:, :length]]
+        valid = np.flatnonzero(validOrders(table, orders, halves=halves, **constraints))
+        if valid.size:
+            return orders[valid[0]]
+    raise ValueError('no order out of %d candidates satisfies %s' % (nCandidates, constraints))
+
+
+# ------------------------------------------
+# Build the schedule of a session from the condition table and a seed
+def buildSchedule(table, seed, nBlocks=5, nReps=2, nPractice=10, batchSize=256, maxCandidates=100000,
+                  **constraints):
+    constraints = dict(defaultConstraints, **constraints)
+    distinct = distinctConditions(table)
+    if nPractice > distinct.size:
+        raise ValueError('the practice block cannot have more distinct conditions (%d) than there are (%d)'
+                         % (nPractice, distinct.size))
+    rng = np.random.default_rng(seed)
+    conditions = np.arange(len(table), dtype=np.int16)
+    practice = _draw(rng, distinct, maxCandidates, nPractice, table,
+                     dict(constraints, maxHalfImbalance=1), False, batchSize)
+    blockBase = np.repeat(conditions, nReps)
+    blocks = np.stack([_draw(rng, blockBase, maxCandidates, blockBase.size, table, constraints, True, batchSize)
+                       for block in range(nBlocks)])
+    return {'seed': np.int64(seed), 'practice': practice, 'blocks': blocks}
+
+
+# ------------------------------------------
+# Raise ValueError if a schedule does not fit the condition table or breaks a constraint
+def checkSchedule(table, schedule, nReps=2, **constraints):
+    constraints = dict(defaultConstraints, **constraints)
+    practice, blocks = schedule['practice'], schedule['blocks']
+    problems = []
+    pairs = np.stack([table['SOA'][practice], table['L_R'][practice]], axis=1)
+    if np.unique(pairs, axis=0).shape[0] != practice.size:
+        problems.append('practice conditions repeat')
+    expected = np.repeat(np.arange(len(table)), nReps)
+    for n, block in enumerate(blocks):
+        if not np.array_equal(np.sort(block), expected):
+            problems.append('block %d does not contain every condition %d times' % (n + 1, nReps))
+    if not validOrders(table, practice, halves=False, **dict(constraints, maxHalfImbalance=1))[0]:
+        problems.append('practice order breaks %s' % constraints)
+    for n in np.flatnonzero(~validOrders(table, blocks, **constraints)):
+        problems.append('block %d order breaks %s' % (n + 1, constraints))
+    if problems:
+        raise ValueError('invalid schedule: ' + '; '.join(problems))
+
+
+def saveSchedule(fileName, schedule):
+    with open(fileName, 'wb') as f:
+        np.savez(f, **schedule)
+
+
+def loadSchedule(fileName):
+    with np.load(fileName) as npz:
+        return {name: npz[name] for name in npz.files}
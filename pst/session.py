@@ -0,0 +1,823 @@
+# Perceptual Simultaneity Task - session
+###################################################################################
+# One run of the task: dialog, instructions, practice block, 5 experimental blocks and
+# the end-of-session summary. All state lives on the Session object, so nothing runs
+# at import time; PsychoPy is imported when the session is created (pst.backend).
+#
+#   from pst.cli import runParser
+#   Session(runParser().parse_args(['--simulate', '--seed', '1'])).run()
+###################################################################################
+
+import os
+import random
+import socket
+
+import numpy as np
+
+from pst.backend import loadBackend
+from pst.conditions import (buildConditionTable, conditionDicts, checkLegacyConditions, compileTimeline,
+                            defaultSOAs, defaultSOAsMs, rampLevels, designRefreshRate)
+from pst.display import measureRefreshRate
+from pst.stimuli import StimulusEngine
+from pst.frameseries import FrameSeriesLogger
+from pst.timing import FlipMonitor
+from pst.intertrial import InterTrialScheduler
+from pst.realtime import RealtimeMode
+from pst.responses import ResponseCollector
+from pst.adaptive import PsiModel, PsiHandler, signedSOAs
+from pst.fitting import fitWindow
+from pst.journal import TrialJournal, readJournal, resumeState, journalSuffix
+from pst.schedule import buildSchedule, checkSchedule, saveSchedule, loadSchedule
+from pst.events import EventLog, BLOCK, TRIAL, FRAME
+from pst.monitor import SessionMonitor
+from pst.coordinator import CoordinatorClient, parseAddress
+from pst.aggregates import TrialAggregates, StoppingRules
+
+expName = 'Perceptual Simultaneity Task'
+expName2 = 'INSERT-PROJ-NAME'  # abbreviation of full experiment name for file label - full exp name within file
+psychopyVersion = '2020.2.5'
+
+# options that change the design of a session; a resumed session takes them from its journal
+designOptions = ('adaptive', 'adaptive_trials', 'requeue_dropped', 'responses', 'end_on_response',
+                 'soas', 'soa_tolerance', 'skip_unshowable', 'stop_catch_accuracy', 'stop_catch_blocks',
+                 'stop_settled_width', 'iti', 'iti_jitter')
+
+# texts shown to the participant; each is built once per session (Session.textStim) and drawn during the warm-up
+instructionTexts = ('- Fixieren Sie mit Ihren Augen während der gesamten Aufgabe das Kreuz in der Mitte.\n'
+                    '- Auf dem Bildschirm werden zwei Balken erscheinen.\n '
+                    '- Ihre Aufgabe ist festzustellen, ob die Balken gleichzeitig erscheinen. \n '
+                    '- Drücken Sie „c“ für „gleichzeitig“ oder „m“ für „nicht gleichzeitig“.',
+                    'Bitte antworten Sie so schnell und akkurat wie möglich. \n'
+                    'Drücken Sie die Leertaste, um den Übungsblockzu  beginnen. ')
+practiceEndText = ('Ende Übungsblock. Drücken Sie die Leertaste, um den Aufgabenblock zu beginnen.\n'
+                   'Drücken Sie „c“ für „gleichzeitig“ oder „m“ für „nicht gleichzeitig“.')
+blockEndText = ('Ende Aufgabenblock. Drücken Sie die Leertaste, um fortzufahren.\n'
+                'Drücken Sie „c“ für „gleichzeitig“ oder „m“ für „nicht gleichzeitig“.')
+endText = 'Der „Perceptual Simultaneity Task“ ist beendet.'
+
+
+# ------------------------------------------
+# Define method to start/check/end the routine (instructions)
+def initialize(i):
+    from psychopy.constants import NOT_STARTED
+    for thisComponent in i:
+        thisComponent.tStart = None
+        thisComponent.tStop = None
+        if hasattr(thisComponent, 'status'):
+            thisComponent.status = NOT_STARTED
+
+
+def finalize(i):
+    from psychopy.constants import FINISHED
+    for thisComponent in i:
+        if hasattr(thisComponent, "status") and thisComponent.status != FINISHED:
+            trial_still_running = True
+            break  # at least one component of the trial has not finished running
+
+
+def endTrial(i):
+    for thisComponent in i:
+        if hasattr(thisComponent, "setAutoDraw"):
+            thisComponent.setAutoDraw(False)
+
+
+class Session:
+
+    # options: the parsed arguments of `pst run` (see pst.cli.runParser)
+    def __init__(self, options, backend=None):
+        self.options = options
+        self.backend = backend if backend is not None else loadBackend(options)
+        self.visual = self.backend.visual
+        self.core = self.backend.core
+        self.event = self.backend.event
+        self.gui = self.backend.gui
+        self.data = self.backend.data
+        self.logging = self.backend.logging
+        self.dataDir = os.path.abspath(options.data_dir or 'data')
+        self.monitor = None
+        self.textStimuli = {}
+        self.coordinator = None
+        self.realtime = None
+        self.psi = None
+        self.accuracyCounter = 0
+        self.expTrialCounter = 0
+
+    def run(self):
+        self.setup()
+        self.runInstructionsBlock()
+        self.runPractice()
+        self.runBlocks()
+        self.finish()
+
+    # ------------------------------------------
+    # Dialog, session info, data files, conditions and the window
+    def setup(self):
+        data, logging = self.data, self.logging
+
+        # optional coordinator of the lab's stations: it assigns the subject ID and seed and gets every
+        # journal record; when it does not answer, the ID is typed in and the seed drawn here as before
+        assignment = None
+        if self.options.coordinator:
+            station = self.options.station or socket.gethostname()
+            self.coordinator = CoordinatorClient(parseAddress(self.options.coordinator), station)
+            if not self.options.resume:
+                assignment = self.coordinator.assign()
+
+        self.resume = None
+        if self.options.resume:
+            # a resumed session keeps its subject, file names, seed and design, and skips the dialog
+            self.resume = resumeState(readJournal(self.journalFile(self.options.resume)))
+            sessionRecord = self.resume['session']
+            subject = sessionRecord['subject']
+            expInfo = sessionRecord['expInfo']
+            self.sessionName = sessionRecord['sessionName']
+            for name, value in sessionRecord['options'].items():
+                setattr(self.options, name, value)
+        else:
+            # Setup GUI
+            myDlg = self.gui.Dlg(title='Perceptual Simultaneity Task')
+            myDlg.addField('ID', assignment['subjectID'] if assignment is not None else '')
+            myDlg.addField('Diagnosis', choices=["TD", "ASD"])  # TD = typically-developed ; ASD = Autism Spectrum Disorder
+            myDlg.addField('Age', )
+            myDlg.addField('Gender', choices=["M", "F", "NB"])  # M = male ; F = female; NB = non-binary
+            myDlg.addField('Handedness', choices=["R", "L", "B"])  # L = left ; R = right ; B = both
+            myDlg.show()  # show dialog and wait for OK or Cancel
+            if not myDlg.OK:
+                print('user cancelled')
+                self.core.quit()
+            subject = myDlg.data
+
+            # Write session info in the dictionary 'ExpInfo'
+            expInfo = {}
+            expInfo['date'] = data.getDateStr()  # gives a timestamp
+            expInfo['expName'] = expName
+            expInfo['PsychoPyVersion'] = psychopyVersion
+            expInfo['subjectID'] = subject[0:5]
+            # seed of the session schedule (trial order), recorded so that it can be rebuilt
+            expInfo['randomSeed'] = self.options.session_seed
+            if expInfo['randomSeed'] is None and assignment is not None:
+                expInfo['randomSeed'] = assignment['seed']
+            if expInfo['randomSeed'] is None:
+                expInfo['randomSeed'] = random.randrange(2 ** 31)
+            if self.coordinator is not None:
+                expInfo['station'] = self.coordinator.station
+                expInfo['assignedID'] = assignment['subjectID'] if assignment is not None else None
+            self.sessionName = '%s_%s_%s_%s' % (expName2, subject[0], subject[1], expInfo['date'])
+        self.subject = subject
+        self.expInfo = expInfo
+        self.seed = expInfo['randomSeed']
+
+        # Create path to export data files
+        self.fileName = os.path.join(self.dataDir, self.sessionName)
+
+        # save a log file of experiment action execution (logging.EXP)
+        os.makedirs(self.dataDir, exist_ok=True)
+        self.logFile = logging.LogFile(self.fileName + '.log', level=logging.EXP)
+        logging.console.setLevel(logging.WARNING)  # this outputs to the screen, not a file
+
+        # Initialize experiment properties (expClock and the expWindow)
+        self.experiment_window = self.visual.Window(size=(800, 600), winType='pyglet', fullscr=True,
+                                                    screen=0, monitor='testMonitor',
+                                                    color="black", colorSpace='rgb')
+        self.experiment_window.mouseVisible = False
+        self.expClock = self.core.Clock()
+
+        # session, block, trial (and with --verbosity frame, flip) events as JSON lines, written off the frame loop
+        self.events = EventLog(self.fileName + '_events.jsonl', self.expClock.getTime,
+                               verbosity=self.options.verbosity, echo=self.options.echo)
+        self.events.log(BLOCK, 'session', session=self.sessionName, resumed=self.resume is not None)
+
+        # optional live monitor page for the experimenter (served by its own threads)
+        if self.options.monitor_port is not None:
+            self.monitor = SessionMonitor(port=self.options.monitor_port)
+            self.events.log(BLOCK, 'monitor', url=self.monitor.url)
+        if self.coordinator is not None:
+            self.events.log(BLOCK, 'coordinator', address=self.options.coordinator, station=self.coordinator.station,
+                            assignment=assignment, error=None if assignment is not None else self.coordinator.lastError)
+            if assignment is None and self.resume is None:
+                logging.warning('Coordinator %s did not answer (%s), ID and seed were not assigned'
+                                % (self.options.coordinator, self.coordinator.lastError))
+            elif assignment is not None and subject[0] != assignment['subjectID']:
+                logging.warning('ID %s was entered instead of the assigned %s' % (subject[0], assignment['subjectID']))
+
+        # --realtime: no automatic garbage collection, a raised priority and (Linux) pinned CPUs from here
+        # on, so the refresh rate is measured under the same conditions as the trials
+        if self.options.realtime:
+            self.realtime = RealtimeMode(self.core, cpus=self.options.cpus)
+            realtime = self.realtime.apply()
+            if not realtime['rush']:
+                logging.warning('core.rush could not raise the process priority (missing permission?)')
+            expInfo['realtime'] = realtime
+            self.events.log(BLOCK, 'realtime', **realtime)
+
+        # measure the refresh rate (120 Hz if the flip intervals are too irregular to measure it)
+        display = measureRefreshRate(self.experiment_window)
+        refreshRate = display['refreshRate']
+        if not display['stable']:
+            logging.warning('Could not measure the refresh rate (%d of %d flip intervals are outliers), assuming %g Hz'
+                            % (display['nOutliers'], display['nFlips'], designRefreshRate))
+            refreshRate = designRefreshRate
+        expInfo['refreshRate'] = refreshRate
+        expInfo['display'] = display
+        # the response mode changes what respRT measures (see --responses), so it goes into the data file
+        expInfo['responses'] = self.options.responses
+        expInfo['endOnResponse'] = self.options.end_on_response
+        self.events.log(BLOCK, 'display', **display)
+        self.frameTolerance = 0.5 / refreshRate  # half a frame
+
+        # compile the SOAs (ms) and the luminance ramp into whole frames of this display
+        timeline = compileTimeline(refreshRate, soasMs=self.options.soas or defaultSOAsMs,
+                                   maxError=self.options.soa_tolerance)
+        if timeline['rejectedSOAsMs']:
+            message = 'SOAs of %s ms cannot be shown at %.2f Hz' % (timeline['rejectedSOAsMs'], refreshRate)
+            if not self.options.skip_unshowable:
+                raise ValueError(message + ' (pass --soas with SOAs this display can show, or --skip-unshowable)')
+            logging.warning(message + ', left out')
+        expInfo['timeline'] = timeline
+
+        # build the condition table (26 conditions at 120 Hz: SOA 0-12 frames, L first and R first) and its
+        # list of dictionary of condition specs (SOA, bar appearance, luminance setting)
+        self.conditionTable = buildConditionTable(soas=timeline['soaFrames'], ramp=timeline['ramp'])
+        self.stimuliOnsetList = conditionDicts(self.conditionTable)
+        if timeline['soaFrames'] == list(defaultSOAs) and timeline['ramp'] == list(rampLevels):
+            checkLegacyConditions(self.stimuliOnsetList)  # the generated design must match the original 26 conditions
+
+        # a resumed session rebuilds the whole data file from the journal; the partial .csv PsychoPy saved when the
+        # session was interrupted is kept as .csv.partial, so the complete file gets the session's own name
+        # (and not <session>_1.csv next to the partial one)
+        if self.resume is not None and os.path.exists(self.fileName + '.csv'):
+            os.replace(self.fileName + '.csv', self.fileName + '.csv.partial')
+
+        # Define the expHandler
+        self.thisExp = data.ExperimentHandler(name=expName, version=psychopyVersion,
+                                              originPath='/PATH/TO/OUTPUT/DIR',
+                                              savePickle=False, saveWideText=True,
+                                              dataFileName=self.fileName)
+
+        # every finished entry is also appended to the journal, for resuming after a crash
+        self.journal = TrialJournal(self.fileName + journalSuffix,
+                                    mirror=self.sendToCoordinator if self.coordinator is not None else None)
+        if self.resume is None:
+            self.journal.write({'record': 'session', 'sessionName': self.sessionName, 'subject': subject,
+                                'expInfo': expInfo, 'options': {name: getattr(self.options, name)
+                                                                for name in designOptions}})
+            # moved out of the expHandler, as not to record subject info for every trial
+            self.thisExp.addData('ExpInfo', expInfo)
+            self.nextEntry('session')
+        else:
+            # rebuild the data file from the completed part of the session
+            for record in self.resume['entries']:
+                for name, value in record['entry'].items():
+                    self.thisExp.addData(name, value)
+                self.thisExp.nextEntry()
+            self.events.log(BLOCK, 'resumed', blocksDone=self.resume['blocksDone'],
+                            practiceDone=self.resume['practiceDone'])
+            self.journal.write({'record': 'resumed', 'fromBlock': self.resume['blocksDone'] + 1,
+                                'practiceDone': self.resume['practiceDone'], 'display': display,
+                                'realtime': self.realtime.applied if self.realtime is not None else None})
+
+        # trial order of the whole session (10 distinct practice conditions, 5 blocks of all conditions
+        # twice), built from the seed and saved next to the data file; a resumed session reads it back
+        scheduleFile = self.fileName + '_schedule.npz'
+        if self.resume is not None and os.path.exists(scheduleFile):
+            self.schedule = loadSchedule(scheduleFile)
+        else:
+            self.schedule = buildSchedule(self.conditionTable, self.seed)
+            saveSchedule(scheduleFile, self.schedule)
+        checkSchedule(self.conditionTable, self.schedule)
+        self.trainingTrialsList = [self.stimuliOnsetList[n] for n in self.schedule['practice']]
+        self.nBlocks = len(self.schedule['blocks'])
+
+        # hit rate, "c" rate and RT mean / SD per block and condition, updated after every trial,
+        # and the optional rules to end a session early
+        self.aggregates = TrialAggregates(self.stimuliOnsetList, self.nBlocks)
+        self.stoppingRules = StoppingRules(catchAccuracy=self.options.stop_catch_accuracy,
+                                           catchBlocks=self.options.stop_catch_blocks,
+                                           settledWidth=self.options.stop_settled_width)
+        self.stopReason = None
+
+        # build the fixation cross, bars and per-condition colour table once for the whole session
+        self.stimulusEngine = StimulusEngine(self.experiment_window, self.stimuliOnsetList, self.visual)
+
+        # check every stimulus flip against the measured refresh period
+        self.flipMonitor = FlipMonitor(refreshRate)
+
+        # fixation before every stimulus for a whole number of frames; deferred work runs between its flips
+        self.iti = InterTrialScheduler(self.experiment_window, refreshRate, durationMs=self.options.iti,
+                                       jitterMs=self.options.iti_jitter, seed=self.seed)
+
+        # responses: 'keyboard' polls timestamped key presses from stimulus onset, 'waitKeys' is the original blocking wait
+        self.responseMode = self.options.responses
+        self.endOnResponse = self.options.end_on_response
+        self.responses = ResponseCollector(self.experiment_window, keyList=['c', 'm'], keyboard=self.backend.keyboard)
+        self.requeueBadTrials = self.options.requeue_dropped  # trials with dropped frames are presented again at the end of the block
+
+        self.warmUp()
+
+    # journal of a session, given its name or the file name of its journal (in the data directory)
+    def journalFile(self, session):
+        session = os.path.basename(session)
+        if session.endswith(journalSuffix):
+            session = session[:-len(journalSuffix)]
+        return os.path.join(self.dataDir, session + journalSuffix)
+
+    def sendToCoordinator(self, record):
+        self.coordinator.send(self.sessionName, record)
+
+    # thisExp.nextEntry(), and the finished entry goes to the journal
+    def nextEntry(self, phase, block=0):
+        self.thisExp.nextEntry()
+        self.journal.write({'record': 'entry', 'phase': phase, 'block': block, 'entry': self.thisExp.entries[-1]})
+
+    # response accuracy, window fit data and Psi posterior of one experimental trial
+    def countTrial(self, block, SOA, L_R, corrResp, kb_resp, rt, timingQuality):
+        self.aggregates.update(block, SOA, L_R, kb_resp == corrResp, kb_resp == 'c', rt)
+        self.expTrialCounter = self.expTrialCounter + 1
+        if kb_resp == corrResp:
+            self.accuracyCounter = self.accuracyCounter + 1
+        if timingQuality != 'dropped':
+            self.fitSOA.append(SOA)
+            self.fitL_R.append(L_R)
+            self.fitResp.append(kb_resp == 'c')
+            # a trial with dropped frames showed a different SOA, so it does not update the posterior
+            if self.psi is not None:
+                self.psi.update(L_R * SOA, kb_resp == 'c')
+
+    # one record per trial and the current status for the live monitor (between trials only)
+    def updateMonitor(self, phase, block, trial, correct, kb_resp, rt, timingQuality):
+        if self.monitor is None:
+            return
+        self.monitor.recordTrial(phase, block, correct, kb_resp == 'c', rt)
+        self.monitor.setStatus(phase=phase, block=block, trial=trial, trialsDone=self.expTrialCounter,
+                               accuracy=(self.accuracyCounter / self.expTrialCounter) * 100 if self.expTrialCounter else None,
+                               droppedFrames=self.flipMonitor.nDropped, badTrials=self.flipMonitor.nBadTrials,
+                               timingQuality=timingQuality)
+
+    # reason to end the session after this block (optional stopping rules), or None
+    def checkStopping(self, block):
+        windowFit = None
+        if self.stoppingRules.needsFit:
+            windowFit = self.fitSession(nBoot=500, seed=self.seed)
+        return self.stoppingRules.check(self.aggregates, block, windowFit)
+
+    # ------------------------------------------
+    # window fit of the experimental trials so far; None (and a warning event) when the responses
+    # cannot be fitted, e.g. a participant who pressed the same key throughout
+    def fitSession(self, nBoot, seed=None):
+        try:
+            return fitWindow(self.fitSOA, self.fitL_R, self.fitResp, model='dualLogistic', nBoot=nBoot, seed=seed)
+        except (ValueError, np.linalg.LinAlgError) as error:
+            self.events.log(BLOCK, 'windowFitFailed', trials=len(self.fitSOA), error=str(error))
+            return None
+
+    def frameSeriesFile(self, phase):
+        return os.path.join(self.dataDir, 'frameseries', '%s_frameseries-%s.bin' % (self.sessionName, phase))
+
+    # -----------------------------------------------
+    # Methods for stimulus visualization
+
+    def insertInstructionText(self, text):
+        return self.visual.TextStim(self.experiment_window, color='white',
+                                    text=text, units='norm', height=.1,
+                                    pos=[0, 0], anchorVert='center')
+
+    def insertText(self, text):
+        return self.visual.TextStim(self.experiment_window, color='white',
+                                    text=text, units='norm', height=.1,
+                                    pos=[0, 0], anchorHoriz='center')
+
+    # the text stimulus of a message, built on first use and reused for the rest of the session
+    def textStim(self, text, instruction=False):
+        key = (text, instruction)
+        if key not in self.textStimuli:
+            self.textStimuli[key] = self.insertInstructionText(text) if instruction else self.insertText(text)
+        return self.textStimuli[key]
+
+    # ------------------------------------------
+    # Draw every text and stimulus once at zero opacity before the first timed frame, so font
+    # rasterization, texture upload and shader compilation do not happen in the instructions or the
+    # first trials, then flip a few blank frames; the time it took goes to the events log
+    def warmUp(self, nFlips=10):
+        start = self.core.getTime()
+        texts = [self.textStim(text, instruction=True) for text in instructionTexts + (endText,)]
+        texts = texts + [self.textStim(text) for text in (practiceEndText, blockEndText)]
+        for stim in texts:
+            opacity = stim.opacity
+            stim.opacity = 0
+            stim.draw()
+            stim.opacity = opacity
+        nColors = self.stimulusEngine.warmUp()
+        for i in range(nFlips):
+            self.experiment_window.flip()
+        self.events.log(BLOCK, 'warmUp', seconds=self.core.getTime() - start, texts=len(texts), barColors=nColors,
+                        flips=nFlips)
+
+    # ------------------------------------------
+    # Show a text until the space bar is pressed (the two instructions and the end of experiment message)
+    def runInstructions(self, instructionsX):
+        instructionsX.draw()
+        self.experiment_window.flip()
+        self.event.clearEvents()
+        kb_resp_instructions = self.event.waitKeys(keyList=['space'])
+        if kb_resp_instructions:
+            self.core.wait(0.001)  # make sure event was processed
+
+    runEndExp = runInstructions
+
+    # ------------------------------------------
+    # Method to escape the experiment
+    def checkForEscape(self):
+        if self.event.getKeys(['escape']):
+            self.events.log(BLOCK, 'quit')
+            self.core.quit()
+
+    # ------------------------------------------
+    # Show a block end message, then wait for the space bar
+    def runBlockMessage(self, text, escapeBeforeWait):
+        blockMessage = self.textStim(text)
+        blockMessage.draw()
+        self.experiment_window.flip()
+        self.core.wait(5)
+        if escapeBeforeWait:
+            self.checkForEscape()
+        self.event.clearEvents()
+        kb_resp_continue = self.event.waitKeys(keyList=['space'])
+        if kb_resp_continue:
+            self.core.wait(0.001)  # make sure event was processed
+        if not escapeBeforeWait:
+            self.checkForEscape()
+        return bool(kb_resp_continue)
+
+    # ------------------------------------------
+    # Define method to present one trial (fixation, bar frames, response)
+    # returns the response, its RT, whether it came during the stimulus, the trial end time
+    # and the flip timing of the stimulus frames
+    def runTrial(self, trial, trialClock, block, number):
+        win, core, engine, responses = self.experiment_window, self.core, self.stimulusEngine, self.responses
+        label = 'block %d trial %d' % (block, number) if block else 'practice trial %d' % number
+        lumSeqL, lumSeqR = trial['lumSeqL'], trial['lumSeqR']
+        keyboardMode = self.responseMode == 'keyboard'
+        logFrames = self.events.enabled(FRAME)
+        trialClock.reset()
+        trial_still_running = True
+
+        while trial_still_running:
+            self.iti.defer(engine.prepare, trial)
+            t, itiFrames = self.iti.run(engine.drawFixation)
+
+            nFrame = 0
+            stimuliClock = core.Clock()
+            stimuliClock.reset()
+            self.flipMonitor.startTrial(t)
+            self.frameSeries.startTrial(block, number, trial['SOA'], trial['L_R'], len(lumSeqL))
+            if keyboardMode:
+                responses.start()  # the keyboard clock is reset by the flip of the first stimulus frame
+
+            for colorL, colorR in engine.frames(trial):
+                engine.drawFrame(colorL, colorR)
+                t = win.flip()
+                self.flipMonitor.record(t)
+                nFrame = nFrame + 1
+                self.frameSeries.log(nFrame, t, lumSeqL[nFrame - 1], lumSeqR[nFrame - 1])
+                if logFrames:
+                    self.events.log(FRAME, 'flip', nFrame=nFrame, flipTime=t)
+                if keyboardMode and responses.poll() and self.endOnResponse:
+                    break
+            timing = self.flipMonitor.endTrial(label)
+            timing['itiFrames'] = itiFrames
+            self.frameSeries.endTrial()
+
+            if keyboardMode:
+                # keep the last stimulus frame on screen and poll once per frame until a response arrives
+                duringStimulus = responses.poll()
+                while not responses.poll():
+                    engine.drawFrame(colorL, colorR)
+                    win.flip()
+                    self.checkForEscape()
+                kb_resp = [responses.key]
+                kb_resp_RT = responses.rt
+            else:
+                duringStimulus = False
+                self.event.clearEvents()
+                kb_resp = self.event.waitKeys(keyList=['c', 'm'])  # m = anderes ; c = gleich
+                kb_resp_RT = stimuliClock.getTime()
+            if kb_resp:
+                kb_resp = kb_resp[0]  # key not a list of them
+                self.events.log(TRIAL, 'response', key=kb_resp, rt=kb_resp_RT, duringStimulus=bool(duringStimulus),
+                                **timing)
+                core.wait(0.001)  # make sure event was processed
+                trial_still_running = False
+                end_time = trialClock.getTime()
+
+            self.checkForEscape()
+            win.flip()
+
+        return kb_resp, kb_resp_RT, duringStimulus, end_time, timing
+
+    # -------------------------------------------------------
+    # Instructions: two texts, each shown until the space bar is pressed
+    def runInstructionsBlock(self):
+        from psychopy.constants import NOT_STARTED
+        instructions1 = self.textStim(instructionTexts[0], instruction=True)
+        instructions2 = self.textStim(instructionTexts[1], instruction=True)
+
+        instructionsClock = self.core.Clock()
+        instructionsTimer = self.core.CountdownTimer()
+        instructionsClock.reset()
+        instructionsTimer.reset()
+        instructionsTimer.add(15)
+
+        instructionsComponents = [instructions1, instructions2]
+        initialize(instructionsComponents)
+
+        # Run instructions sequence
+        if instructionsTimer.getTime() > 0 - self.frameTolerance:
+            nextComponent = 0
+            if instructionsClock.getTime() > 0 - self.frameTolerance and instructions1.status == NOT_STARTED:
+                instructions1.tStart = instructionsClock.getTime()
+                self.runInstructions(instructions1)
+                instructionEnd = instructionsClock.getTime()
+                instructions1.tStop = instructions1.tStart + instructionEnd
+
+                self.experiment_window.flip()
+                nextComponent = instructions1.tStart + instructionEnd
+
+            if instructionsClock.getTime() >= nextComponent - self.frameTolerance and instructions2.status == NOT_STARTED:
+                instructions2.tStart = instructionsClock.getTime()
+                self.runInstructions(instructions2)
+                instructionEnd = instructionsClock.getTime()
+                instructions2.tStop = instructions2.tStart + instructionEnd
+
+                self.experiment_window.flip()
+
+            self.checkForEscape()
+            self.experiment_window.flip()
+            finalize(instructionsComponents)
+
+        endTrial(instructionsComponents)
+
+    # -------------------------------------------------------
+    # ------------------ PRACTICE BLOCK ---------------------
+    # -------------------------------------------------------
+    def runPractice(self):
+        data, core, thisExp = self.data, self.core, self.thisExp
+        if self.resume is not None and self.resume['practiceDone']:
+            return
+        practiceBlocks = data.TrialHandler(trialList=None, nReps=1)  # 1 block
+        thisExp.addLoop(practiceBlocks)
+
+        # Frame info for each PRACTICE stimuli is streamed to a binary frame series (.bin, trial index in .idx)
+        # ---- includes the trial key (block, trial, SOA, L_R, length of the luminance sequence), the frame
+        # ---- number (nFrame), time of the window flip based on a global clock (t) and the bar luminances
+        # ---- frames are buffered during the trial and written by a background thread between trials
+        self.frameSeries = FrameSeriesLogger(self.frameSeriesFile('pract'))
+
+        for practiceBlock in practiceBlocks:
+            practiceBlock_still_running = True
+
+            while practiceBlock_still_running:
+                practiceTrials = data.TrialHandler(trialList=self.trainingTrialsList, nReps=1,
+                                                   method='sequential')  # list of 10 dictionaries of trial conditions for practice trials
+                thisExp.addLoop(practiceTrials)
+
+                practiceTrialClock = core.Clock()
+                counter = 0  # counter of trials in block
+
+                for practiceTrial in practiceTrials:
+                    counter = counter + 1
+                    self.events.log(TRIAL, 'trial', phase='practice', trial=counter, SOA=practiceTrial['SOA'],
+                                    L_R=practiceTrial['L_R'], corrResp=practiceTrial['corrResp'])
+
+                    kb_resp, kb_resp_RT, duringStimulus, end_time, timing = self.runTrial(
+                        practiceTrial, practiceTrialClock, 0, counter)
+
+                    practiceTrials.addData('Practice Trial Number', counter)
+                    practiceTrials.addData('subjResp', kb_resp)
+                    practiceTrials.addData('respRT', kb_resp_RT)
+                    practiceTrials.addData('respDuringStimulus', int(duringStimulus))
+                    practiceTrials.addData('Correct', int(kb_resp == practiceTrial['corrResp']))
+                    self.aggregates.update(0, practiceTrial['SOA'], practiceTrial['L_R'],
+                                           kb_resp == practiceTrial['corrResp'], kb_resp == 'c', kb_resp_RT)
+                    for name, value in timing.items():
+                        practiceTrials.addData(name, value)
+                    self.updateMonitor('practice', 0, counter, kb_resp == practiceTrial['corrResp'], kb_resp,
+                                       kb_resp_RT, timing['timingQuality'])
+                    self.nextEntry('practice')
+                    self.iti.defer(self.frameSeries.flush)
+
+                if counter == len(self.trainingTrialsList):
+                    self.events.log(BLOCK, 'practiceDone', trials=counter)
+                    if self.runBlockMessage(practiceEndText, escapeBeforeWait=True):
+                        practiceBlock_still_running = False
+
+            for name, value in self.aggregates.blockData(0).items():
+                practiceBlocks.addData(name, value)
+            self.nextEntry('practice')
+            self.iti.drain()
+            self.frameSeries.flush(sync=True)
+
+        self.frameSeries.close()
+        self.journal.write({'record': 'practiceDone'})
+        self.journal.sync()
+
+    # -------------------------------------------------------
+    # --------------- EXPERIMENTAL BLOCKS -------------------
+    # -------------------------------------------------------
+    def runBlocks(self):
+        data, core, thisExp = self.data, self.core, self.thisExp
+
+        # Frame info for each EXPERIMENTAL stimuli is streamed to its own frame series (same records as for practice)
+        # (a resumed session drops the frames of the unfinished block)
+        blocksDone = self.resume['blocksDone'] if self.resume is not None else 0
+        self.frameSeries = FrameSeriesLogger(self.frameSeriesFile('exp'),
+                                             resumeAt=self.resume['frameSeriesSize'] if blocksDone else None)
+
+        blocks = data.TrialHandler(trialList=None, nReps=self.nBlocks)  # 5 blocks
+        thisExp.addLoop(blocks)
+
+        blockClock = core.Clock()
+        blockCounter = 0
+
+        # adaptive mode: one Psi posterior over the simultaneity window (bias, width) for the whole session,
+        # each block presents adaptiveTrials trials chosen from it instead of the 26 conditions twice
+        if self.options.adaptive:
+            self.psi = PsiModel(signedSOAs(self.stimuliOnsetList))
+            trialsPerBlock = self.options.adaptive_trials
+        else:
+            self.psi = None
+            trialsPerBlock = len(self.schedule['blocks'][0])  # 52 at 120 Hz
+        psi = self.psi
+
+        # moved on 09.08.2021
+        self.accuracyCounter = 0  # tracks response accuracy
+        self.expTrialCounter = 0  # tracks the total trial number -- counter just tracks the BLOCK trial number
+        self.fitSOA, self.fitL_R, self.fitResp = [], [], []  # experimental trials without dropped frames, for the window fit
+        if blocksDone:
+            for record in self.resume['entries']:
+                entry = record['entry']
+                if record['phase'] == 'exp' and 'Trial Number' in entry:
+                    self.countTrial(record['block'], entry['SOA'], entry['L_R'], entry['corrResp'], entry['subjResp'],
+                                    entry['respRT'], entry['timingQuality'])
+
+        for block in blocks:
+            if blockCounter < blocksDone:  # completed before the session was resumed
+                blockCounter = blockCounter + 1
+                continue
+            blockClock.reset()
+            block_still_running = True
+
+            while block_still_running:
+                block_start = blockClock.getTime()
+                blockCounter = blockCounter + 1
+                self.events.log(BLOCK, 'block', block=blockCounter)
+
+                if psi is not None:
+                    trials = PsiHandler(psi, self.stimuliOnsetList, nTrials=trialsPerBlock,
+                                        seed=self.seed + blockCounter)
+                else:
+                    blockTrialsList = [self.stimuliOnsetList[n] for n in self.schedule['blocks'][blockCounter - 1]]
+                    trials = data.TrialHandler(trialList=blockTrialsList, nReps=1,
+                                               method='sequential')  # all conditions twice, in schedule order
+                thisExp.addLoop(trials)
+
+                trialClock = core.Clock()
+                counter = 0  # tracks trials
+                requeuedTrials = []  # trials with dropped frames, presented once more after the block's 52 trials
+                requeuePass = False
+
+                while trials is not None:
+                    for trial in trials:
+                        counter = counter + 1
+                        self.events.log(TRIAL, 'trial', phase='exp', block=blockCounter, trial=counter,
+                                        SOA=trial['SOA'], L_R=trial['L_R'], corrResp=trial['corrResp'])
+
+                        start_time = 0
+
+                        kb_resp, kb_resp_RT, duringStimulus, end_time, timing = self.runTrial(
+                            trial, trialClock, blockCounter, counter)
+                        # record total response accuracy
+                        self.countTrial(blockCounter, trial['SOA'], trial['L_R'], trial['corrResp'], kb_resp,
+                                        kb_resp_RT, timing['timingQuality'])
+
+                        trials.addData('Trial Number', counter)
+                        trials.addData('subjResp', kb_resp)
+                        trials.addData('respRT', kb_resp_RT)
+                        trials.addData('respDuringStimulus', int(duringStimulus))
+                        trials.addData('Trial Start', start_time)
+                        trials.addData('Trial End', end_time)
+                        trials.addData('Trial Duration', end_time - start_time)
+                        for name, value in timing.items():
+                            trials.addData(name, value)
+                        trials.addData('Requeued', int(requeuePass))
+                        self.updateMonitor('exp', blockCounter, counter, kb_resp == trial['corrResp'], kb_resp,
+                                           kb_resp_RT, timing['timingQuality'])
+                        if psi is not None and timing['timingQuality'] != 'dropped':
+                            for name, value in psi.estimate().items():
+                                trials.addData(name, value)
+                        self.nextEntry('exp', blockCounter)
+                        self.iti.defer(self.frameSeries.flush)
+
+                        if self.requeueBadTrials and not requeuePass and timing['timingQuality'] == 'dropped':
+                            requeuedTrials.append(trial)
+
+                    trials = None
+                    if requeuedTrials:
+                        self.events.log(BLOCK, 'requeued', block=blockCounter, trials=len(requeuedTrials))
+                        trials = data.TrialHandler(trialList=requeuedTrials, nReps=1, method='sequential',
+                                                   name='requeuedTrials')
+                        thisExp.addLoop(trials)
+                        requeuedTrials = []
+                        requeuePass = True
+
+                if counter >= trialsPerBlock:  # 52 trials per block (plus re-queued trials)
+                    self.events.log(BLOCK, 'blockDone', block=blockCounter, trials=counter)
+                    block_end = blockClock.getTime()
+                    self.stopReason = self.checkStopping(blockCounter)
+                    if self.stopReason is not None:
+                        block_still_running = False
+                    elif self.runBlockMessage(blockEndText, escapeBeforeWait=False):
+                        block_still_running = False
+
+                blocks.addData('Block Number', blockCounter)
+                blocks.addData('Block Start', block_start)
+                blocks.addData('Block End', block_end)
+                blocks.addData('Block Duration', block_end - block_start)
+                for name, value in self.aggregates.blockData(blockCounter).items():
+                    blocks.addData(name, value)
+                if self.stopReason is not None:
+                    blocks.addData('Stopped Early', self.stopReason)
+                    self.events.log(BLOCK, 'stopped', block=blockCounter, reason=self.stopReason)
+                    blocks.finished = True  # no further blocks
+                self.nextEntry('exp', blockCounter)
+                self.iti.drain()
+                self.frameSeries.flush(sync=True)  # synced once per block: a power cut loses at most the current block
+                self.journal.write({'record': 'blockDone', 'block': blockCounter,
+                                    'frameSeriesSize': self.frameSeries.size()})
+                self.journal.sync()
+
+        self.frameSeries.close()
+
+    # -------------------------------------------------------
+    # Timing summary, accuracy, window fit and the end of experiment message
+    def finish(self):
+        thisExp = self.thisExp
+
+        # Flip timing summary: inter-flip interval histogram, dropped frames and the worst trials
+        timingSummary = self.flipMonitor.summary()
+        self.events.log(BLOCK, 'timing', droppedFrames=timingSummary['droppedFrames'],
+                        badTrials=timingSummary['badTrials'])
+        thisExp.addData('Dropped Frames', timingSummary['droppedFrames'])
+        self.flipMonitor.saveSummary(self.fileName + '_timing.json')
+
+        # Preliminary Computations
+        # Calculate, print, and store the response accuracy for total trial and per trial condition
+        accuracyPercentage = (self.accuracyCounter / self.expTrialCounter) * 100  # should count the amount that is correct and divide by total trial number
+        self.events.log(BLOCK, 'accuracy', percent=accuracyPercentage, trials=self.expTrialCounter)
+        thisExp.addData('Accuracy %', accuracyPercentage)
+        # Fit the simultaneity window (dual logistic, SOA in frames) with bootstrap confidence intervals
+        windowFit = self.fitSession(nBoot=2000)
+        if windowFit is not None:
+            self.events.log(BLOCK, 'windowFit', model=windowFit['model'], trials=windowFit['nTrials'],
+                            **{name: round(value, 3) for name, value in windowFit['estimates'].items()})
+            for name, value in windowFit['estimates'].items():
+                thisExp.addData('fit ' + name, value)
+                thisExp.addData('fit ' + name + ' CI', windowFit['ci'][name])
+
+        if self.psi is not None:
+            psiEstimate = self.psi.estimate()
+            self.events.log(BLOCK, 'psiEstimate', **psiEstimate)
+            for name, value in psiEstimate.items():
+                thisExp.addData(name, value)
+
+        # Run end of experiment sequence
+        end_of_experiment = self.textStim(endText, instruction=True)
+        endExpClock = self.core.Clock()
+        endExpComponents = [end_of_experiment]
+        initialize(endExpComponents)
+
+        end_of_experiment.tStart = endExpClock.getTime()
+        self.runEndExp(end_of_experiment)
+        end_of_experiment.tStop = end_of_experiment.tStart + endExpClock.getTime()
+        self.experiment_window.flip()
+        finalize(endExpComponents)
+        endTrial(endExpComponents)
+
+        thisExp.addData('end_of_experiment.started', end_of_experiment.tStart)
+        thisExp.addData('end_of_experiment.stopped', end_of_experiment.tStop)
+        self.nextEntry('session')
+
+        thisExp.addData('Exp Duration', self.expClock.getTime())
+        self.events.log(BLOCK, 'end', duration=self.expClock.getTime())
+        self.journal.close()
+        if self.coordinator is not None:
+            unsent = self.coordinator.close()
+            self.events.log(BLOCK, 'coordinatorClosed', unsent=unsent, error=self.coordinator.lastError if unsent else None)
+        self.events.close()
+        if self.monitor is not None:
+            self.monitor.close()
+        self.iti.close()
+        if self.realtime is not None:
+            self.realtime.restore()
+
+        self.logging.flush()
+        self.experiment_window.close()
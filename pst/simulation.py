@@ -0,0 +1,343 @@
+# Perceptual Simultaneity Task - headless simulation backend
+###################################################################################
+# Stand-ins for psychopy.visual, core, event, gui and hardware.keyboard, so that the whole task can run
+# without a display, a GPU or a participant. All clocks read a virtual time that only
+# moves forward when the window flips (to the next vsync of the simulated refresh
+# rate) or when the task waits. The simulated window records the luminance of both
+# bars on every flip, and a responder (scripted key list or a model observer) answers
+# from what was actually shown. data and logging stay the real PsychoPy modules, so
+# the same data files and frame series are written as in a real session.
+###################################################################################
+
+import math
+import random
+import sys
+import types
+
+from psychopy.constants import NOT_STARTED
+
+from pst.models import windowProbability
+
+
+# Model observer: answers "c" with the probability given by its simultaneity window
+class ObserverResponder:
+
+    def __init__(self, width=3.0, bias=0.0, lapse=0.02, rtMean=0.55, rtSD=0.12, seed=None):
+        self.width = width
+        self.bias = bias
+        self.lapse = lapse
+        self.rtMean = rtMean
+        self.rtSD = rtSD
+        self.rng = random.Random(seed)
+
+    # returns (key, RT from stimulus onset in seconds)
+    def respond(self, signedSOA):
+        pSimultaneous = windowProbability(signedSOA, self.width, self.bias, self.lapse)
+        key = 'c' if self.rng.random() < pSimultaneous else 'm'
+        return key, max(0.15, self.rng.gauss(self.rtMean, self.rtSD))
+
+
+class ScriptedResponder:
+
+    def __init__(self, keys='cm', rt=0.5):
+        self.keys = list(keys)
+        self.rt = rt
+        self.n = 0
+
+    def respond(self, signedSOA):
+        key = self.keys[self.n % len(self.keys)]
+        self.n = self.n + 1
+        return key, self.rt
+
+
+class VirtualTime:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def advance(self, secs):
+        if secs > 0:
+            self.now = self.now + secs
+
+
+# -----------------------------------------------
+# psychopy.core stand-ins
+
+class Clock:
+
+    def __init__(self, time):
+        self._time = time
+        self._timeAtLastReset = time.now
+
+    def getTime(self):
+        return self._time.now - self._timeAtLastReset
+
+    def reset(self, newT=0.0):
+        self._timeAtLastReset = self._time.now + newT
+
+    def add(self, t):
+        self._timeAtLastReset = self._timeAtLastReset + t
+
+
+class CountdownTimer(Clock):
+
+    def __init__(self, time, start=0):
+        Clock.__init__(self, time)
+        self._countdown = start
+
+    def getTime(self):
+        return self._countdown - Clock.getTime(self)
+
+    def reset(self, t=None):
+        if t is not None:
+            self._countdown = t
+        Clock.reset(self)
+
+    def add(self, t):
+        self._countdown = self._countdown + t
+
+
+# -----------------------------------------------
+# psychopy.visual stand-ins
+
+class Window:
+
+    def __init__(self, sim, size=(800, 600), color='black', units='pix', **kwargs):
+        self.sim = sim
+        self.size = size
+        self.color = color
+        self.units = units
+        self.mouseVisible = True
+        self.lastFrameT = sim.time.now
+        self.nDroppedFrames = 0
+        self.nFlips = 0
+        self.stimulusFrames = []  # (t, lumL, lumR) of the bar frames of the current stimulus
+        self._drawn = []
+        self._callOnFlip = []
+        self._stimulusEnded = False
+
+    def getActualFrameRate(self, *args, **kwargs):
+        return self.sim.refreshRate
+
+    @property
+    def monitorFramePeriod(self):
+        return 1.0 / self.sim.refreshRate
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._callOnFlip.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        sim = self.sim
+        period = 1.0 / sim.refreshRate
+        vsync = (math.floor(sim.time.now / period + 1e-6) + 1) * period
+        if sim.dropRate and sim.rng.random() < sim.dropRate:
+            vsync = vsync + period  # missed vsync
+            self.nDroppedFrames = self.nDroppedFrames + 1
+        sim.time.now = vsync
+        self.lastFrameT = vsync
+        self.nFlips = self.nFlips + 1
+
+        bars = [stim for stim in self._drawn if isinstance(stim, ShapeStim) and stim.closeShape and stim.opacity > 0]
+        if bars:
+            if self._stimulusEnded:
+                self.stimulusFrames = []
+                self._stimulusEnded = False
+            lum = {-1: 0.0, 1: 0.0}
+            for stim in bars:
+                lum[stim.side] = stim.luminance()
+            self.stimulusFrames.append((vsync, lum[-1], lum[1]))
+        elif self.stimulusFrames:
+            self._stimulusEnded = True
+        if clearBuffer:
+            self._drawn = []
+
+        callbacks, self._callOnFlip = self._callOnFlip, []
+        for function, args, kwargs in callbacks:
+            function(*args, **kwargs)
+        return vsync
+
+    # signed SOA in frames of the last stimulus (negative = L first) and the time of its onset
+    def lastStimulus(self):
+        onsets = {}
+        for n, (t, lumL, lumR) in enumerate(self.stimulusFrames):
+            for side, lum in ((-1, lumL), (1, lumR)):
+                if side not in onsets and lum > 0:
+                    onsets[side] = (n, t)
+        if len(onsets) < 2:
+            return None, None
+        return onsets[-1][0] - onsets[1][0], min(onsets[-1][1], onsets[1][1])
+
+    def close(self):
+        pass
+
+
+class _Stim:
+
+    def __init__(self, win, name=None, autoLog=True, **kwargs):
+        self.win = win
+        self.name = name
+        self.autoDraw = False
+        self.opacity = 1.0
+        self.status = NOT_STARTED
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def draw(self, win=None):
+        self.win._drawn.append(self)
+
+    def setAutoDraw(self, value, log=None):
+        self.autoDraw = value
+
+
+class TextStim(_Stim):
+
+    def __init__(self, win, text='', **kwargs):
+        _Stim.__init__(self, win, **kwargs)
+        self.text = text
+
+
+class ShapeStim(_Stim):
+
+    def __init__(self, win, vertices=((0, 0),), closeShape=True, fillColor=None, fillColorSpace='rgb', **kwargs):
+        _Stim.__init__(self, win, **kwargs)
+        self.vertices = vertices
+        self.closeShape = closeShape
+        self.fillColor = fillColor
+        self.fillColorSpace = fillColorSpace
+        self.side = -1 if sum(x for x, y in vertices) < 0 else 1
+
+    def setFillColor(self, color, colorSpace=None, operation='', log=None):
+        self.fillColor = color
+        if colorSpace is not None:
+            self.fillColorSpace = colorSpace
+
+    # grey level of the fill in rgb255
+    def luminance(self):
+        if self.fillColor is None:
+            return 0.0
+        value = self.fillColor[0] if isinstance(self.fillColor, (tuple, list)) else self.fillColor
+        if self.fillColorSpace == 'rgb255':
+            return float(value)
+        return (value + 1) * 127.5
+
+
+# -----------------------------------------------
+# psychopy.hardware.keyboard stand-in: the responder's key is pressed at stimulus onset + RT
+
+class Keyboard:
+
+    def __init__(self, sim, **kwargs):
+        self.sim = sim
+        self.clock = Clock(sim.time)
+        self._stimulus = None  # frame list of the stimulus the pending press belongs to
+        self._press = None  # (key, time of the press)
+
+    def clearEvents(self, eventType=None):
+        pass
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        if not self.sim.windows:
+            return []
+        win = self.sim.windows[-1]
+        if win.stimulusFrames is not self._stimulus:
+            signedSOA, onset = win.lastStimulus()
+            if signedSOA is None:
+                return []
+            key, rt = self.sim.responder.respond(signedSOA)
+            self._stimulus = win.stimulusFrames
+            self._press = (key, onset + rt)
+        if self._press is None or self.sim.time.now < self._press[1]:
+            return []
+        key, tDown = self._press
+        self._press = None
+        if keyList is not None and key not in keyList:
+            return []
+        return [types.SimpleNamespace(name=key, tDown=tDown, rt=tDown - self.clock._timeAtLastReset)]
+
+
+# -----------------------------------------------
+# psychopy.gui stand-in
+
+class Dlg:
+
+    def __init__(self, sim, title='', **kwargs):
+        self.sim = sim
+        self.title = title
+        self.fields = []
+        self.OK = False
+        self.data = []
+
+    def addField(self, label, initial='', choices=None, **kwargs):
+        self.fields.append((label, initial, choices))
+
+    def show(self):
+        self.data = []
+        for n, (label, initial, choices) in enumerate(self.fields):
+            if initial and not choices:  # a prefilled field (e.g. an ID from the coordinator) is accepted
+                self.data.append(initial)
+            elif n < len(self.sim.subject):
+                self.data.append(self.sim.subject[n])
+            elif choices:
+                self.data.append(choices[0])
+            else:
+                self.data.append(initial)
+        self.OK = True
+        return self.data
+
+
+class Simulation:
+
+    def __init__(self, refreshRate=120.0, responder=None, subject=('SIM01', 'TD', '30', 'F', 'R'),
+                 dropRate=0.0, seed=None):
+        self.refreshRate = refreshRate
+        self.responder = responder if responder is not None else ObserverResponder(seed=seed)
+        self.subject = list(subject)
+        self.dropRate = dropRate
+        self.rng = random.Random(seed)
+        self.time = VirtualTime()
+        self.windows = []
+
+        self.visual = types.SimpleNamespace(Window=self._window, TextStim=TextStim, ShapeStim=ShapeStim)
+        self.core = types.SimpleNamespace(Clock=lambda: Clock(self.time),
+                                          CountdownTimer=lambda start=0: CountdownTimer(self.time, start),
+                                          getTime=lambda: self.time.now, wait=self.wait, quit=self.quit,
+                                          rush=lambda value=True, realtime=False: True)
+        self.event = types.SimpleNamespace(waitKeys=self.waitKeys, getKeys=self.getKeys,
+                                           clearEvents=self.clearEvents)
+        self.gui = types.SimpleNamespace(Dlg=lambda title='', **kwargs: Dlg(self, title, **kwargs))
+        self.keyboard = types.SimpleNamespace(Keyboard=lambda **kwargs: Keyboard(self, **kwargs))
+
+    def _window(self, *args, **kwargs):
+        win = Window(self, *args, **kwargs)
+        self.windows.append(win)
+        return win
+
+    def wait(self, secs, hogCPUperiod=0.2):
+        self.time.advance(secs)
+
+    def quit(self):
+        sys.exit(0)
+
+    def clearEvents(self, eventType=None):
+        pass
+
+    def getKeys(self, keyList=None, modifiers=False, timeStamped=False):
+        return []
+
+    # Response keys are answered by the responder from the last stimulus shown;
+    # any other key list (instructions, block ends) is answered with its first key after 1 s.
+    def waitKeys(self, maxWait=float('inf'), keyList=None, modifiers=False, timeStamped=False, clearEvents=True):
+        signedSOA, onset = (None, None)
+        if self.windows and keyList and set(keyList) >= {'c', 'm'}:
+            signedSOA, onset = self.windows[-1].lastStimulus()
+        if signedSOA is None:
+            key, rt = (keyList[0] if keyList else 'space'), 1.0
+            self.time.advance(min(rt, maxWait))
+        else:
+            key, rt = self.responder.respond(signedSOA)
+            self.time.advance(onset + rt - self.time.now)
+        if hasattr(timeStamped, 'getTime'):
+            return [(key, timeStamped.getTime())]
+        elif timeStamped:
+            return [(key, self.time.now)]
+        return [key]
@@ -0,0 +1,107 @@
+# Perceptual Simultaneity Task - stimulus engine
+###################################################################################
+# The fixation cross and both bars are built once per session. During a trial only
+# the fill luminance of the bars changes, looked up from a colour table that is
+# precomputed for every condition before the first trial starts.
+###################################################################################
+
+fixationCross_coordinates = [(0, .1), (0, 0), (.1, 0), (-.1, 0), (0, 0), (0, -.1)]
+barL_coordinates = [(-5.75, -2.05), (-5.75, 2.05), (-5.35, 2.05), (-5.35, -2.05)]
+barR_coordinates = [(5.35, -2.05), (5.35, 2.05), (5.75, 2.05), (5.75, -2.05)]
+
+
+# ------------------------------------------
+# Convert a luminance step (rgb255 grey level) to PsychoPy's 'rgb' space (-1 to 1)
+def lumToRGB(lum):
+    value = lum / 127.5 - 1
+    return (value, value, value)
+
+
+# ------------------------------------------
+# Precompute the per-frame bar colours of every condition, keyed by (SOA, L_R).
+# Equal luminance values share one colour tuple, so unchanged frames can be
+# detected with an identity check instead of a comparison.
+def buildColorTable(conditions):
+    colorCache = {}
+    colorTable = {}
+    for condition in conditions:
+        frames = []
+        for i, j in zip(condition['lumSeqL'], condition['lumSeqR']):
+            if i not in colorCache:
+                colorCache[i] = lumToRGB(i)
+            if j not in colorCache:
+                colorCache[j] = lumToRGB(j)
+            frames.append((colorCache[i], colorCache[j]))
+        colorTable[(condition['SOA'], condition['L_R'])] = tuple(frames)
+    return colorTable
+
+
+class StimulusEngine:
+
+    # visual: the module providing ShapeStim (psychopy.visual unless a simulated backend is used)
+    def __init__(self, win, conditions, visual=None):
+        if visual is None:
+            from psychopy import visual
+        self.win = win
+        self.colorTable = buildColorTable(conditions)
+
+        self.fixationCross = visual.ShapeStim(win, vertices=fixationCross_coordinates, name='fixationCross',
+                                              units='cm', size=4, closeShape=False, lineWidth=2, pos=(0, 0),
+                                              autoLog=False)
+        self.barL = visual.ShapeStim(win, vertices=barL_coordinates, name='barL', units='cm',
+                                     size=1, closeShape=True, lineWidth=2, pos=(0, 0), lineColor=None,
+                                     fillColor=lumToRGB(0), fillColorSpace='rgb', autoLog=False)
+        self.barR = visual.ShapeStim(win, vertices=barR_coordinates, name='barR', units='cm',
+                                     size=1, closeShape=True, lineWidth=2, pos=(0, 0), lineColor=None,
+                                     fillColor=lumToRGB(0), fillColorSpace='rgb', autoLog=False)
+        self._colorL = None
+        self._colorR = None
+
+    # per-frame colour pairs (colorL, colorR) of a trial's condition
+    def frames(self, trial):
+        return self.colorTable[(trial['SOA'], trial['L_R'])]
+
+    def drawFixation(self):
+        self.fixationCross.draw()
+
+    # set the bar colours of the first frame of a trial ahead of time (the bars are not drawn
+    # during the fixation), so the first stimulus frame has no colour to change
+    def prepare(self, trial):
+        colorL, colorR = self.frames(trial)[0]
+        if colorL is not self._colorL:
+            self.barL.setFillColor(colorL, log=False)
+            self._colorL = colorL
+        if colorR is not self._colorR:
+            self.barR.setFillColor(colorR, log=False)
+            self._colorR = colorR
+
+    # draw the fixation cross and both bars in every colour of the session once at zero opacity (nothing
+    # shows), so the first trial does not pay for the first use of a colour; returns the number of colours
+    def warmUp(self):
+        colors = sorted({color for frames in self.colorTable.values() for frame in frames for color in frame})
+        stimuli = (self.fixationCross, self.barL, self.barR)
+        opacities = [stim.opacity for stim in stimuli]
+        for stim in stimuli:
+            stim.opacity = 0
+        self.fixationCross.draw()
+        for color in colors:
+            self.barL.setFillColor(color, log=False)
+            self.barR.setFillColor(color, log=False)
+            self.barL.draw()
+            self.barR.draw()
+        for stim, opacity in zip(stimuli, opacities):
+            stim.opacity = opacity
+        self._colorL = self._colorR = None  # the next frame sets its colours again
+        return len(colors)
+
+    # draw one stimulus frame; the fill colour is only set when it differs from the last frame
+    def drawFrame(self, colorL, colorR):
+        if colorL is not self._colorL:
+            self.barL.setFillColor(colorL, log=False)
+            self._colorL = colorL
+        if colorR is not self._colorR:
+            self.barR.setFillColor(colorR, log=False)
+            self._colorR = colorR
+        self.fixationCross.draw()
+        self.barL.draw()
+        self.barR.draw()
@@ -0,0 +1,92 @@
+# Perceptual Simultaneity Task - flip timing
+###################################################################################
+# Checks every stimulus flip against the measured refresh period while the trial runs.
+# An inter-flip interval of 1.5 periods or more means at least one missed vsync (a
+# dropped frame, so the SOA on screen was longer than planned); an interval more than
+# lateTolerance above one period counts as a late frame. Each trial gets a timing
+# quality, and the session keeps an interval histogram and the worst trials.
+###################################################################################
+
+import heapq
+import json
+
+
+class FlipMonitor:
+
+    def __init__(self, refreshRate, lateTolerance=0.2, binWidth=0.25, maxPeriods=4, nWorst=10):
+        self.refreshRate = refreshRate
+        self.period = 1.0 / refreshRate
+        self.lateLimit = self.period * (1 + lateTolerance)
+        self.dropLimit = self.period * 1.5
+        self.binWidth = binWidth  # histogram bin width in ms
+        self.histogram = [0] * (int(maxPeriods * self.period * 1000 / binWidth) + 1)  # last bin collects the rest
+        self.nWorst = nWorst
+        self.worstTrials = []  # heap of (maxFlipInterval, label, droppedFrames)
+        self.nFlips = 0
+        self.nDropped = 0
+        self.nLate = 0
+        self.nBadTrials = 0
+        self._startTrial(None)
+
+    def _startTrial(self, t):
+        self._lastT = t
+        self._trialDropped = 0
+        self._trialLate = 0
+        self._trialMaxInterval = 0.0
+
+    # t: timestamp of the flip right before the first stimulus frame
+    def startTrial(self, t):
+        self._startTrial(t)
+
+    # called with the timestamp returned by every stimulus flip
+    def record(self, t):
+        if self._lastT is not None:
+            interval = t - self._lastT
+            if interval > self._trialMaxInterval:
+                self._trialMaxInterval = interval
+            if interval >= self.dropLimit:
+                self._trialDropped = self._trialDropped + int(round(interval / self.period)) - 1
+            elif interval > self.lateLimit:
+                self._trialLate = self._trialLate + 1
+            binIndex = int(interval * 1000 / self.binWidth)
+            self.histogram[min(binIndex, len(self.histogram) - 1)] += 1
+            self.nFlips = self.nFlips + 1
+        self._lastT = t
+
+    # timing data of the trial, recorded with trials.addData
+    def endTrial(self, label=''):
+        if self._trialDropped:
+            quality = 'dropped'
+        elif self._trialLate:
+            quality = 'late'
+        else:
+            quality = 'ok'
+        maxInterval = self._trialMaxInterval * 1000
+        self.nDropped = self.nDropped + self._trialDropped
+        self.nLate = self.nLate + self._trialLate
+        if quality != 'ok':
+            self.nBadTrials = self.nBadTrials + 1
+        entry = (maxInterval, label, self._trialDropped)
+        if len(self.worstTrials) < self.nWorst:
+            heapq.heappush(self.worstTrials, entry)
+        elif entry > self.worstTrials[0]:
+            heapq.heapreplace(self.worstTrials, entry)
+        timing = {'timingQuality': quality, 'droppedFrames': self._trialDropped,
+                  'lateFrames': self._trialLate, 'maxFlipInterval': round(maxInterval, 3)}
+        self._startTrial(None)
+        return timing
+
+    def summary(self):
+        return {'refreshRate': self.refreshRate,
+                'nFlips': self.nFlips,
+                'droppedFrames': self.nDropped,
+                'lateFrames': self.nLate,
+                'badTrials': self.nBadTrials,
+                'histogramBinWidthMs': self.binWidth,
+                'intervalHistogram': self.histogram,
+                'worstTrials': [{'trial': label, 'maxFlipInterval': round(maxInterval, 3), 'droppedFrames': dropped}
+                                for maxInterval, label, dropped in sorted(self.worstTrials, reverse=True)]}
+
+    def saveSummary(self, fileName):
+        with open(fileName, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
@@ -0,0 +1,461 @@
+# Perceptual Simultaneity Task - video timing validation
+###################################################################################
+# Checks the presented SOAs on a high-speed recording of the screen instead of stepping
+# through the video by hand. The video is read in chunks: a .npy frame stack (frames x
+# height x width, optionally x 3 for RGB) is memory-mapped, so only the bar regions are
+# read from disk; other video files are decoded chunk by chunk with OpenCV (optional).
+#
+# The mean luminance of the barL and barR regions is computed with one vectorized
+# reduction per chunk. A trial is a run of video frames in which a bar is lit (dark gaps
+# shorter than minGapMs are bridged); the onset of a bar is the frame where it crosses
+# threshold x its plateau luminance, interpolated between frames. Both bars run through
+# the same ramp, so the SOA (lagging minus leading onset) does not depend on the threshold.
+#
+# The measured trials are matched by onset time to the trials of the frame series
+# (the video and the experiment clock differ by an unknown offset and a small drift) and
+# their SOAs are compared with the logged SOA and leading bar and with the SOAs of
+# the condition table compiled for the refresh rate.
+#
+#   pst video check <video> [--frame-series <session>_frameseries-exp.bin]
+#   pst video synth <out>.npy --session-seed 1 --trials 20     synthetic recording for testing
+###################################################################################
+
+import argparse
+import json
+
+import numpy as np
+
+from pst.journal import jsonValue
+
+lumaWeights = np.array([0.299, 0.587, 0.114], dtype=np.float32)  # Rec. 601 luma of RGB frames
+
+trialDtype = np.dtype([('start', np.int64), ('stop', np.int64), ('onsetL', np.float64), ('onsetR', np.float64)])
+
+
+class VideoFrames:
+
+    # fps: frame rate of the recording (read from the file by OpenCV; required for .npy stacks)
+    def __init__(self, fileName, fps=None, chunkSize=256):
+        self.fileName = fileName
+        self.chunkSize = chunkSize
+        self.fps = fps
+        self._frames = None
+        if fileName.endswith('.npy'):
+            self._frames = np.load(fileName, mmap_mode='r')
+            if self._frames.ndim not in (3, 4):
+                raise ValueError('%s is not a frame stack (frames x height x width [x 3])' % fileName)
+            self.nFrames = len(self._frames)
+            self.shape = self._frames.shape[1:3]
+        else:
+            try:
+                import cv2
+            except ImportError:
+                raise ImportError('reading %s needs OpenCV (pip install opencv-python); '
+                                  'or convert the video to a .npy frame stack' % fileName)
+            capture = cv2.VideoCapture(fileName)
+            if not capture.isOpened():
+                raise ValueError('cannot open %s' % fileName)
+            self.fps = fps or capture.get(cv2.CAP_PROP_FPS)
+            self.nFrames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.shape = (int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)))
+            capture.release()
+        if not self.fps:
+            raise ValueError('the frame rate of %s is unknown, pass fps' % fileName)
+
+    # frames in chunks of at most chunkSize (memory-mapped views of a .npy stack)
+    def chunks(self):
+        if self._frames is not None:
+            for start in range(0, self.nFrames, self.chunkSize):
+                yield self._frames[start:start + self.chunkSize]
+            return
+        import cv2
+        capture = cv2.VideoCapture(self.fileName)
+        try:
+            while True:
+                chunk = []
+                while len(chunk) < self.chunkSize:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    chunk.append(frame[..., ::-1])  # BGR -> RGB
+                if chunk:
+                    yield np.stack(chunk)
+                if len(chunk) < self.chunkSize:
+                    return
+        finally:
+            capture.release()
+
+
+def luminance(pixels):
+    pixels = np.asarray(pixels, dtype=np.float32)
+    return pixels @ lumaWeights if pixels.ndim == 4 else pixels
+
+
+# ------------------------------------------
+# Mean luminance of each region (x0, y0, x1, y1 in pixels) in every frame: (nFrames, nRegions)
+def regionLuminance(video, rois):
+    parts = [np.stack([luminance(chunk[:, y0:y1, x0:x1]).mean(axis=(1, 2)) for x0, y0, x1, y1 in rois], axis=1)
+             for chunk in video.chunks()]
+    return np.concatenate(parts) if parts else np.zeros((0, len(rois)))
+
+
+# ------------------------------------------
+# Find the two bars: the pixels whose luminance range over the video is at least half the
+# largest range, split into the left and the right half of the image; the bounding box of
+# each is shrunk by margin so that blurred edges are left out
+def findBars(video, margin=0.2):
+    low = high = None
+    for chunk in video.chunks():
+        lum = luminance(chunk)
+        low = lum.min(axis=0) if low is None else np.minimum(low, lum.min(axis=0))
+        high = lum.max(axis=0) if high is None else np.maximum(high, lum.max(axis=0))
+    if low is None:
+        raise ValueError('%s has no frames' % video.fileName)
+    span = high - low
+    lit = span >= 0.5 * span.max()
+    half = lit.shape[1] // 2
+    rois = []
+    for side, offset, columns in (('left', 0, slice(None, half)), ('right', half, slice(half, None))):
+        ys, xs = np.nonzero(lit[:, columns])
+        if ys.size == 0 or span.max() == 0:
+            raise ValueError('no bar found on the %s half of %s, give its region' % (side, video.fileName))
+        x0, y0, x1, y1 = xs.min() + offset, ys.min(), xs.max() + 1 + offset, ys.max() + 1
+        dx, dy = int((x1 - x0) * margin / 2), int((y1 - y0) * margin / 2)
+        rois.append((int(x0 + dx), int(y0 + dy), int(x1 - dx), int(y1 - dy)))
+    return rois
+
+
+# ------------------------------------------
+# Trials in the bar luminance (nFrames x 2: barL, barR): first and last + 1 video frame of
+# every trial and the onset of each bar in fractional video frames (NaN if a bar did not
+# light up). A trial that is already running in the first frame is left out.
+def detectTrials(lum, threshold=0.1, minGap=10):
+    base = np.percentile(lum, 5, axis=0)
+    top = np.percentile(lum, 99.5, axis=0)
+    if (top - base <= 0).any():
+        raise ValueError('a bar region does not change its luminance')
+    level = (lum - base) / (top - base)
+    lit = level > threshold
+    edges = np.diff(np.concatenate([[False], lit.any(axis=1), [False]]).astype(np.int8))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if starts.size:
+        newTrial = np.concatenate([[True], starts[1:] - stops[:-1] >= minGap])
+        starts, stops = starts[newTrial], stops[np.concatenate([newTrial[1:], [True]])]
+    running = starts == 0
+    starts, stops = starts[~running], stops[~running]
+
+    trials = np.zeros(starts.size, dtype=trialDtype)
+    trials['start'], trials['stop'] = starts, stops
+    for n, name in enumerate(('onsetL', 'onsetR')):
+        litFrames = np.flatnonzero(lit[:, n])
+        if litFrames.size == 0:
+            trials[name] = np.nan
+            continue
+        first = litFrames[np.minimum(np.searchsorted(litFrames, starts), litFrames.size - 1)]
+        before, after = level[first - 1, n], level[first, n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            onset = first - 1 + (threshold - before) / (after - before)
+        trials[name] = np.where((first >= starts) & (first < stops), onset, np.nan)
+    return trials
+
+
+# ------------------------------------------
+# Onset (s, video clock, leading bar), SOA (ms and display frames) and leading side
+# (-1 L first, 1 R first, 0 within half a display frame) of every detected trial
+def measureSOAs(trials, fps, refreshRate):
+    difference = (trials['onsetR'] - trials['onsetL']) * 1000 / fps  # > 0: L first
+    soaMs = np.abs(difference)
+    soaFrames = soaMs * refreshRate / 1000
+    complete = np.isfinite(difference)
+    return {'onset': np.fmin(trials['onsetL'], trials['onsetR']) / fps, 'soaMs': soaMs, 'soaFrames': soaFrames,
+            'L_R': np.where(~complete | (soaFrames < 0.5), 0, np.where(difference > 0, -1, 1)),
+            'complete': complete}
+
+
+# ------------------------------------------
+# Logged trials of a frame series (flip time of the first stimulus frame, SOA, L_R, number of
+# stimulus frames) and the refresh rate estimated from the flip intervals within trials. A csv
+# frame series of an earlier version has no L_R; it is taken from the data file, if given.
+def readLoggedTrials(fileName, dataFile=None, phase='exp'):
+    from pst.frameseries import FrameSeries, readFrameSeriesCSV, frameDtype
+    sides = True
+    if fileName.endswith('.bin'):
+        frames = FrameSeries(fileName).read()
+    elif dataFile is not None:
+        frames = readFrameSeriesCSV(fileName, dataFile, phase)
+    else:
+        rows = np.loadtxt(fileName, delimiter=',', ndmin=2)
+        frames = np.zeros(len(rows), dtype=frameDtype)
+        if rows.size:
+            frames['nFrame'], frames['t'], frames['SOA'], frames['nFrames'] = rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+        sides = False
+    if frames.size == 0:
+        raise ValueError('no frames in %s' % fileName)
+    first = frames['nFrame'] == 1
+    intervals = np.diff(frames['t'])[~first[1:]]
+    refreshRate = 1 / np.median(intervals) if intervals.size else np.nan
+    expected = {name: frames[name][first].astype(float if name == 't' else int) for name in ('t', 'SOA', 'nFrames')}
+    if sides:
+        expected['L_R'] = frames['L_R'][first].astype(int)
+    return expected, refreshRate
+
+
+# ------------------------------------------
+# Map the video onsets to the experiment clock: every pairing of one of the first nPairs
+# measured onsets with an expected onset proposes an offset; the offset that brings the most
+# onsets within tolerance (s) of an expected one with the same SOA (frames, when given; trial
+# spacing alone is too regular to tell neighbouring offsets apart) wins, and a straight line
+# fitted to those pairs adds the drift. returns the index of the matched expected trial
+# (-1: none), the offset (s) and the drift (ppm)
+def alignOnsets(videoOnsets, flipTimes, tolerance=0.2, nPairs=20, videoSOAs=None, flipSOAs=None):
+    matched = np.full(videoOnsets.size, -1)
+    if videoOnsets.size == 0 or flipTimes.size == 0:
+        return matched, np.nan, np.nan
+
+    def nearest(times):
+        right = np.minimum(np.searchsorted(flipTimes, times), flipTimes.size - 1)
+        left = np.maximum(right - 1, 0)
+        index = np.where(np.abs(times - flipTimes[left]) < np.abs(times - flipTimes[right]), left, right)
+        return index, np.abs(times - flipTimes[index])
+
+    offsets = (videoOnsets[:nPairs, np.newaxis] - flipTimes[np.newaxis, :]).ravel()
+    index, distance = nearest(videoOnsets[np.newaxis, :] - offsets[:, np.newaxis])
+    close = distance <= tolerance
+    score = close.sum(axis=1)
+    if videoSOAs is not None:
+        agree = close & (np.abs(videoSOAs[np.newaxis, :] - flipSOAs[index]) <= 0.5)
+        score = agree.sum(axis=1) * (videoOnsets.size + 1) + score
+    offset = offsets[np.argmax(score)]
+    index, distance = nearest(videoOnsets - offset)
+    close = distance <= tolerance
+    drift = 0.0
+    if close.sum() >= 3:
+        slope, offset = np.polyfit(flipTimes[index[close]], videoOnsets[close], 1)
+        drift = (slope - 1) * 1e6
+        index, distance = nearest((videoOnsets - offset) / slope)
+        close = distance <= tolerance
+    matched[close] = index[close]
+    return matched, float(offset), float(drift)
+
+
+# ------------------------------------------
+# Check the measured trials against the expected ones (frame series: t, SOA; L_R optional)
+# and the SOAs of the design (frames). Every measured trial gets a status:
+#   ok          SOA within tolerance (display frames) of the logged one, same leading bar
+#   soa         SOA off (without a frame series: not within tolerance of a design SOA)
+#   side        the other bar led
+#   unmatched   no logged trial at this time
+#   incomplete  a bar did not light up
+def compareTrials(measured, designSOAs, expected=None, tolerance=0.5, alignTolerance=0.2):
+    n = measured['onset'].size
+    designSOAs = np.asarray(sorted(designSOAs))
+    nearestDesign = designSOAs[np.abs(measured['soaFrames'][:, np.newaxis] - designSOAs[np.newaxis, :]).argmin(axis=1)] \
+        if n and designSOAs.size else np.full(n, -1)
+    result = {'onset': measured['onset'], 'soaMs': measured['soaMs'], 'soaFrames': measured['soaFrames'],
+              'L_R': measured['L_R'], 'designSOA': nearestDesign, 'trial': np.full(n, -1),
+              'expectedSOA': np.full(n, -1), 'expectedL_R': np.full(n, -2), 'error': np.full(n, np.nan)}
+    status = np.full(n, 'ok', dtype='U10')
+    summary = {'detected': n, 'incomplete': int((~measured['complete']).sum())}
+    if expected is None:
+        result['error'] = measured['soaFrames'] - nearestDesign
+    else:
+        matched, offset, drift = alignOnsets(measured['onset'], expected['t'], alignTolerance,
+                                             videoSOAs=measured['soaFrames'], flipSOAs=expected['SOA'])
+        found = matched >= 0
+        result['trial'] = np.where(found, matched + 1, -1)
+        result['expectedSOA'] = np.where(found, expected['SOA'][matched], -1)
+        result['error'] = np.where(found, measured['soaFrames'] - result['expectedSOA'], np.nan)
+        status[~found] = 'unmatched'
+        covered = (expected['t'] * (1 + drift * 1e-6) + offset >= measured['onset'].min() - alignTolerance) & \
+                  (expected['t'] * (1 + drift * 1e-6) + offset <= measured['onset'].max() + alignTolerance) \
+            if n else np.zeros(expected['t'].size, dtype=bool)
+        summary.update({'expected': int(expected['t'].size), 'matched': int(found.sum()),
+                        'missed': int(covered.sum() - np.unique(matched[found]).size),
+                        'clockOffset': offset, 'clockDriftPpm': drift})
+    status[(np.abs(result['error']) > tolerance) & (status == 'ok')] = 'soa'
+    if expected is not None and 'L_R' in expected:
+        result['expectedL_R'] = np.where(found, expected['L_R'][matched], -2)
+        status[(result['L_R'] != result['expectedL_R']) & (result['expectedSOA'] > 0) & (status == 'ok')] = 'side'
+    status[~measured['complete']] = 'incomplete'
+    result['status'] = status
+    errors = result['error'][np.isfinite(result['error'])]
+    summary.update({'ok': int((status == 'ok').sum()),
+                    'soaErrorMean': float(errors.mean()) if errors.size else np.nan,
+                    'soaErrorMax': float(np.abs(errors).max()) if errors.size else np.nan})
+    return result, summary
+
+
+# ------------------------------------------
+# Whole check of a recording; expected trials come from a frame series (the data file is
+# only needed for the L_R of a csv frame series), the design SOAs from the condition table
+# compiled for the refresh rate (from the frame series unless given)
+def checkVideo(fileName, fps=None, rois=None, frameSeries=None, dataFile=None, phase='exp', refreshRate=None,
+               soasMs=None, soaTolerance=1.0, tolerance=0.5, threshold=0.1, minGapMs=50, chunkSize=256):
+    from pst.conditions import compileTimeline, defaultSOAsMs, designRefreshRate
+    video = VideoFrames(fileName, fps=fps, chunkSize=chunkSize)
+    if rois is None:
+        rois = findBars(video)
+    expected = None
+    if frameSeries is not None:
+        expected, loggedRate = readLoggedTrials(frameSeries, dataFile, phase)
+        refreshRate = refreshRate or loggedRate
+    refreshRate = refreshRate or designRefreshRate
+    timeline = compileTimeline(refreshRate, soasMs or defaultSOAsMs, maxError=soaTolerance)
+
+    lum = regionLuminance(video, rois)
+    trials = detectTrials(lum, threshold, minGap=max(1, int(round(minGapMs * video.fps / 1000))))
+    result, summary = compareTrials(measureSOAs(trials, video.fps, refreshRate), timeline['soaFrames'], expected,
+                                    tolerance)
+    summary = dict({'video': fileName, 'fps': float(video.fps), 'videoFrames': int(lum.shape[0]),
+                    'refreshRate': float(refreshRate), 'rois': rois}, **summary)
+    return result, summary
+
+
+# ------------------------------------------
+# Render a synthetic recording of a trial sequence (condition table rows in order) as a .npy
+# frame stack: black screen with a fixation cross, each trial a blank inter-trial interval
+# followed by the stimulus frames of its condition (pixel value = rgb255 luminance) held for
+# hold s. The camera integrates the screen over every frame period, starting phase camera
+# frames after the first display frame, and adds Gaussian noise. In the trials listed in
+# dropped the first stimulus frame is shown twice (a missed flip).
+# returns the regions of the bars and the frame-series records the session would have logged
+# (all trials in block 1)
+def syntheticVideo(fileName, table, order, fps=240.0, refreshRate=120.0, size=(48, 64), iti=0.6, hold=0.4,
+                   phase=0.3, noise=2.0, dropped=(), clockOffset=12.5, seed=None, chunkSize=256):
+    from pst.frameseries import frameDtype
+    rng = np.random.default_rng(seed)
+    nBlank, nHold = int(round(iti * refreshRate)), int(round(hold * refreshRate))
+    lumL, lumR, frameRows = [], [], []
+    displayFrames = 0
+    for n, row in enumerate(table[np.asarray(order)]):
+        nFrames = int(row['nFrames'])
+        shown = np.arange(nFrames)
+        if n in dropped:
+            shown = np.concatenate([[0], shown])
+        shown = np.concatenate([shown, np.full(nHold, nFrames - 1)])
+        lumL.extend([np.zeros(nBlank), row['lumL'][shown]])
+        lumR.extend([np.zeros(nBlank), row['lumR'][shown]])
+        onset = displayFrames + nBlank
+        flips = onset + np.arange(nFrames) + (n in dropped) * (np.arange(nFrames) > 0)
+        frameRows.extend((1, n + 1, row['SOA'], row['L_R'], nFrames, frame + 1, flip / refreshRate + clockOffset,
+                          row['lumL'][frame], row['lumR'][frame]) for frame, flip in enumerate(flips.tolist()))
+        displayFrames = onset + shown.size
+    lumL.append(np.zeros(nBlank))
+    lumR.append(np.zeros(nBlank))
+    screen = np.stack([np.concatenate(lumL), np.concatenate(lumR)], axis=1)
+
+    # integral of the screen luminance at the display frame boundaries; the mean over an exposure
+    # is the difference of the (piecewise linear) integral at its ends
+    boundaries = np.arange(screen.shape[0] + 1) / refreshRate
+    integral = np.concatenate([np.zeros((1, 2)), np.cumsum(screen, axis=0) / refreshRate])
+    nCamera = int((boundaries[-1] * fps) - phase) - 1
+    starts = (np.arange(nCamera) + phase) / fps
+    values = np.stack([(np.interp(starts + 1 / fps, boundaries, integral[:, n]) - np.interp(starts, boundaries, integral[:, n]))
+                       * fps for n in range(2)], axis=1)
+
+    height, width = size
+    barHeight, barWidth = height // 2, max(2, width // 16)
+    top = (height - barHeight) // 2
+    rois = [(int(width * 0.2), top, int(width * 0.2) + barWidth, top + barHeight),
+            (int(width * 0.8) - barWidth, top, int(width * 0.8), top + barHeight)]
+    background = np.zeros(size, dtype=np.float32)
+    background[height // 2, width // 2 - 2:width // 2 + 3] = 255
+    background[height // 2 - 2:height // 2 + 3, width // 2] = 255
+    frames = np.lib.format.open_memmap(fileName, mode='w+', dtype=np.uint8, shape=(nCamera, height, width))
+    for start in range(0, nCamera, chunkSize):
+        chunk = values[start:start + chunkSize]
+        image = background + rng.normal(0, noise, (len(chunk), height, width)).astype(np.float32)
+        for (x0, y0, x1, y1), value in zip(rois, chunk.T):
+            image[:, y0:y1, x0:x1] += value[:, np.newaxis, np.newaxis]
+        frames[start:start + len(chunk)] = np.clip(np.rint(image), 0, 255)
+    frames.flush()
+    del frames
+    return rois, np.array(frameRows, dtype=frameDtype)
+
+
+def _region(text):
+    values = [int(value) for value in text.split(',')]
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError('a region is x0,y0,x1,y1 (pixels)')
+    return tuple(values)
+
+
+def formatSummary(summary):
+    lines = ['%(videoFrames)d frames at %(fps).1f fps, display %(refreshRate).2f Hz, bars %(rois)s' % summary,
+             '%(detected)d trials detected (%(incomplete)d incomplete), %(ok)d ok' % summary]
+    if 'expected' in summary:
+        lines.append('%(matched)d of %(expected)d logged trials matched, %(missed)d missed in the recorded span; '
+                     'clock offset %(clockOffset).4f s, drift %(clockDriftPpm).1f ppm' % summary)
+    lines.append('SOA error (display frames): mean %(soaErrorMean).3f, largest %(soaErrorMax).3f' % summary)
+    return '\n'.join(lines)
+
+
+def check(args):
+    result, summary = checkVideo(args.video, fps=args.fps, rois=[args.roi_left, args.roi_right] if args.roi_left else None,
+                                 frameSeries=args.frame_series, dataFile=args.data_file, phase=args.phase,
+                                 refreshRate=args.refresh_rate, tolerance=args.tolerance, threshold=args.threshold)
+    if args.json:
+        print(json.dumps({'summary': summary, 'trials': result}, default=jsonValue, indent=1))
+        return
+    print(formatSummary(summary))
+    problems = np.flatnonzero(result['status'] != 'ok')
+    if problems.size:
+        print('%8s %6s %8s %9s %4s %9s %4s  %s' % ('onset', 'trial', 'SOA ms', 'frames', 'L_R', 'expected', 'L_R', 'status'))
+    for n in problems:
+        print('%8.3f %6d %8.2f %9.2f %4d %9d %4d  %s' % tuple(result[name][n] for name in (
+            'onset', 'trial', 'soaMs', 'soaFrames', 'L_R', 'expectedSOA', 'expectedL_R', 'status')))
+
+
+def synth(args):
+    from pst.conditions import buildConditionTable, compileTimeline
+    from pst.frameseries import writeFrameSeries
+    from pst.schedule import buildSchedule
+    timeline = compileTimeline(args.refresh_rate)
+    table = buildConditionTable(soas=timeline['soaFrames'], ramp=timeline['ramp'])
+    order = buildSchedule(table, args.session_seed)['blocks'].ravel()[:args.trials]
+    rois, frameRows = syntheticVideo(args.out, table, order, fps=args.fps, refreshRate=args.refresh_rate,
+                                     phase=args.phase, noise=args.noise, dropped=set(args.drop), seed=args.session_seed)
+    stem = args.out[:-4] if args.out.endswith('.npy') else args.out
+    writeFrameSeries(stem + '_frameseries.bin', frameRows)
+    print('%s: %d trials, bars at %s; logged frames in %s_frameseries.bin' % (args.out, len(order), rois, stem))
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Check the SOAs on a high-speed recording of the screen')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    command = commands.add_parser('check', help='measure the SOAs of a recording and compare them with the session')
+    command.add_argument('video', help='.npy frame stack (memory-mapped) or a video file (needs OpenCV)')
+    command.add_argument('--fps', type=float, default=None, help='frame rate of the recording (required for .npy)')
+    command.add_argument('--frame-series', default=None, help='frame series (.bin) of the recorded session')
+    command.add_argument('--data-file', default=None,
+                         help='data file of the session (L_R of the trials of a csv frame series of an earlier version)')
+    command.add_argument('--phase', choices=['exp', 'practice'], default='exp', help='phase of the frame series')
+    command.add_argument('--refresh-rate', type=float, default=None,
+                         help='display refresh rate (default: from the frame series, else 120 Hz)')
+    command.add_argument('--roi-left', type=_region, default=None, metavar='X0,Y0,X1,Y1',
+                         help='pixel region of barL (default: found from the luminance changes)')
+    command.add_argument('--roi-right', type=_region, default=None, metavar='X0,Y0,X1,Y1')
+    command.add_argument('--tolerance', type=float, default=0.5, help='largest SOA error (display frames)')
+    command.add_argument('--threshold', type=float, default=0.1, help='onset level (fraction of the plateau)')
+    command.add_argument('--json', action='store_true', help='print the summary and every trial as JSON')
+    command.set_defaults(handler=check)
+    command = commands.add_parser('synth', help='render a synthetic recording of a session for testing')
+    command.add_argument('out', help='output .npy frame stack')
+    command.add_argument('--session-seed', type=int, default=1, help='seed of the trial order')
+    command.add_argument('--trials', type=int, default=20, help='number of trials (from the first block on)')
+    command.add_argument('--fps', type=float, default=240.0)
+    command.add_argument('--refresh-rate', type=float, default=120.0)
+    command.add_argument('--phase', type=float, default=0.3, help='camera phase (fraction of a camera frame)')
+    command.add_argument('--noise', type=float, default=2.0, help='sensor noise SD (pixel values)')
+    command.add_argument('--drop', type=lambda text: [int(n) for n in text.split(',')], default=[],
+                         metavar='N,N', help='trials (0-based) with a missed flip on the first stimulus frame')
+    command.set_defaults(handler=synth)
+    args = parser.parse_args(argv)
+    if args.command == 'check' and (args.roi_left is None) != (args.roi_right is None):
+        parser.error('give both --roi-left and --roi-right, or neither')
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Perceptual Simultaneity Task - background writer
+###################################################################################
+# A daemon thread that runs file-writing jobs handed over from the presentation
+# thread, so that formatting and disk I/O never happen inside the flip loop.
+###################################################################################
+
+import queue
+import threading
+
+
+class BackgroundWriter:
+
+    def __init__(self, name='writer'):
+        self.error = None  # first exception raised by a job, re-raised by wait() and close()
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # queue a job; only a queue append on the calling thread
+    def submit(self, job, *args):
+        self._jobs.put((job, args))
+
+    def _run(self):
+        while True:
+            job, args = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                job(*args)
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+            finally:
+                self._jobs.task_done()
+
+    def _raiseError(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    # block until every queued job has been written
+    def wait(self):
+        self._jobs.join()
+        self._raiseError()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.submit(None)
+            self._thread.join()
+        self._raiseError()